@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+""" Contacts/sec of GoogleContactImporter.parse_contacts on a large feed
+
+Compares the tag-filtered extraction against the previous getchildren()
+based if/elif walk, on the same decoded tree::
+
+    python benchmarks/google_parse.py --contacts 20000
+"""
+import argparse
+import time
+
+from lxml import etree
+
+from contact_importer.fakeserver import fake_contacts, google_feed
+from contact_importer.providers.google import GoogleContactImporter
+
+
+def legacy_extract_contacts(root):
+    """ Field mapping as it was before the tag-filtered rewrite """
+    elms = root.findall("{http://www.w3.org/2005/Atom}entry")
+    contacts = []
+    for elm in elms:
+        contact = {}
+        children = elm.getchildren()
+        for child in children:
+            if child.tag == "{http://schemas.google.com/g/2005}email":
+                if not 'email' in contact or child.attrib.get('primary'):
+                    contact['email'] = child.attrib.get('address')
+            elif child.tag == "{http://schemas.google.com/g/2005}phoneNumber":
+                if not 'phone' in contact:
+                    contact['phone'] = "".join([x for x in child.itertext()])
+            elif child.tag == "{http://schemas.google.com/g/2005}name":
+                for namechild in child.getchildren():
+                    if namechild.tag == "{http://schemas.google.com/g/2005}fullName":
+                        contact['full_name'] = "".join([x for x in namechild.itertext()])
+                    elif namechild.tag == "{http://schemas.google.com/g/2005}givenName":
+                        contact['first_name'] = "".join([x for x in namechild.itertext()])
+                    elif namechild.tag == "{http://schemas.google.com/g/2005}familyName":
+                        contact['last_name'] = "".join([x for x in namechild.itertext()])
+        contacts.append(contact)
+    return contacts
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contacts", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    feed = google_feed(fake_contacts(args.contacts))
+    importer = GoogleContactImporter("client-id", "client-secret", "http://localhost/")
+    root = etree.fromstring(feed.encode("utf-8"), etree.XMLParser(ns_clean=True, recover=True, encoding="utf-8"))
+
+    legacy, expected = best_of(args.repeat, legacy_extract_contacts, root)
+    current, contacts = best_of(args.repeat, importer.extract_contacts, root)
+    # the legacy walk predates the photo link mapping, compare the fields both map
+    mapped = [dict((k, v) for k, v in contact.items() if not k.startswith("photo")) for contact in contacts]
+    assert mapped == expected, "extraction results differ"
+    total, _ = best_of(args.repeat, importer.parse_contacts, feed)
+
+    print("%d contacts, %.1f MB feed" % (args.contacts, len(feed) / 1048576.0))
+    print("field mapping, legacy:  %10.0f contacts/sec" % (args.contacts / legacy))
+    print("field mapping, current: %10.0f contacts/sec (%.1fx)" % (args.contacts / current, legacy / current))
+    print("parse_contacts total:   %10.0f contacts/sec" % (args.contacts / total))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+""" End-to-end import latency and throughput, replayed from a cassette
+
+Records the token exchange and contact import of every provider against the
+local stand-in server into a cassette (once), then replays the whole flow
+repeatedly without the network::
+
+    python benchmarks/import_replay.py --cassette /tmp/imports.json --runs 50 --latency 1.0
+
+--latency replays the recorded response times (scaled), 0 measures the
+client side alone.
+"""
+import argparse
+import time
+
+from contact_importer.cassette import Cassette
+from contact_importer.fakeserver import FakeProviderServer
+from contact_importer.providers import GoogleContactImporter, LiveContactImporter, YahooContactImporter
+
+
+def run_flows(transport, endpoints):
+    """ One full import per provider, returning {provider: (seconds, contacts)} """
+    results = {}
+
+    google = GoogleContactImporter("id", "secret", "http://localhost/cb", transport=transport, **endpoints["google"])
+    start = time.time()
+    contacts = google.import_contacts(google.request_access_token("code"))
+    results["google"] = (time.time() - start, len(contacts))
+
+    live = LiveContactImporter("id", "secret", "http://localhost/cb", transport=transport, **endpoints["live"])
+    start = time.time()
+    contacts = live.import_contacts(live.request_access_token("code"))
+    results["live"] = (time.time() - start, len(contacts))
+
+    yahoo = YahooContactImporter("id", "secret", "http://localhost/cb", transport=transport, **endpoints["yahoo"])
+    start = time.time()
+    flow = yahoo.start_flow()
+    flow.oauth_verifier = "fakeverifier"
+    yahoo.get_token(flow)
+    contacts = yahoo.import_contacts(flow)
+    results["yahoo"] = (time.time() - start, len(contacts))
+    return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cassette", default="import_replay.json")
+    parser.add_argument("--port", type=int, default=8765, help="fake server port")
+    parser.add_argument("--contacts", type=int, default=2000, help="contacts per feed when recording")
+    parser.add_argument("--server-latency", type=float, default=0.05, help="fake server latency when recording")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="factor applied to the recorded latencies")
+    args = parser.parse_args()
+
+    # the cassette matches on URLs, record and replay use the same server address
+    server = FakeProviderServer(port=args.port, contacts=args.contacts, latency=args.server_latency)
+    endpoints = dict((provider, server.endpoints(provider)) for provider in ("google", "live", "yahoo"))
+    recorder = Cassette(args.cassette, mode="once")
+    if recorder.mode == "record":
+        server.start()
+        with recorder:
+            run_flows(recorder, endpoints)
+        server.stop()
+        print("Recorded %d interactions to %s" % (len(recorder.interactions), args.cassette))
+    else:
+        server.server_close()
+
+    timings = {}
+    for _ in range(args.runs):
+        for provider, (seconds, contacts) in run_flows(Cassette(args.cassette, latency=args.latency),
+                                                       endpoints).items():
+            timings.setdefault(provider, []).append((seconds, contacts))
+
+    for provider, runs in sorted(timings.items()):
+        seconds = [run[0] for run in runs]
+        contacts = sum(run[1] for run in runs)
+        print("%-6s p50 %7.1f ms  p95 %7.1f ms  %9.0f contacts/s" % (
+            provider, percentile(seconds, 0.5) * 1000, percentile(seconds, 0.95) * 1000, contacts / sum(seconds)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+""" Resident memory of a large parsed contact batch, with and without interning
+
+Every run parses a whole batch page by page in a fresh process, keeps the
+contacts and reports how much the resident set grew::
+
+    python benchmarks/intern_memory.py --contacts 500000 --providers live,yahoo,google
+
+Names, companies and places are drawn from long-tailed vocabularies rather
+than the few values of the stand-in server, close to a real address book.
+"""
+import argparse
+import gc
+import random
+import subprocess
+import sys
+import time
+
+from contact_importer.fakeserver import fake_contacts, google_feed, live_feed, yahoo_feed
+from contact_importer.providers.registry import registry
+
+FEEDS = {
+    "google": (google_feed, "_parse_feed"),
+    "live": (live_feed, "_parse_document"),
+    "yahoo": (yahoo_feed, "_parse_document"),
+}
+
+# everything but Live's raw user objects, which dwarf the mapped fields
+DEFAULT_FIELDS = ("name,full_name,first_name,last_name,email,phone,company,title,birthday,birth_date,"
+                  "addr_city,addr_country")
+
+PAGE_SIZE = 1000
+
+
+def rss():
+    """ Resident set size of this process in bytes """
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    import resource
+
+    return pages * resource.getpagesize()
+
+
+def vocabulary(prefix, size, rnd):
+    return ["%s%d" % (prefix, rnd.randrange(10 ** 6)) for _ in range(size)]
+
+
+def realistic(contacts, rnd, vocabularies):
+    """ Replace the stand-in values by long-tailed draws from `vocabularies` """
+    def draw(words):
+        # Zipf-like: a few very common values, a long tail of rare ones
+        return words[min(len(words) - 1, int(rnd.paretovariate(1.1)) - 1)]
+
+    first_names, last_names, companies, cities = vocabularies
+    for contact in contacts:
+        contact["first_name"] = draw(first_names)
+        contact["last_name"] = draw(last_names)
+        contact["company"] = draw(companies)
+        contact["city"] = draw(cities)
+    return contacts
+
+
+def child(provider, interning, contacts, fields):
+    """ Parse the batch and print the resident set growth, in a fresh process """
+    feed, parse = FEEDS[provider]
+    importer = registry.get_class(provider)(None, None, None, interning=interning)
+    rnd = random.Random(0)
+    vocabularies = (vocabulary("First", 3000, rnd), vocabulary("Last", 30000, rnd),
+                    vocabulary("Company", 20000, rnd), vocabulary("City", 5000, rnd))
+    pool = importer._intern_pool(fields)
+
+    gc.collect()
+    before = rss()
+    start = time.time()
+    batch = []
+    for offset in range(0, contacts, PAGE_SIZE):
+        page = realistic(fake_contacts(min(PAGE_SIZE, contacts - offset), seed=offset), rnd, vocabularies)
+        body = feed(page, None, offset, contacts)
+        batch.extend(getattr(importer, parse)(body, fields, pool)[0])
+    elapsed = time.time() - start
+    del body, page
+    gc.collect()
+    print("%d %d %f %d" % (len(batch), rss() - before, elapsed, len(pool) if pool is not None else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--contacts", type=int, default=500000)
+    parser.add_argument("--providers", default="live,yahoo,google")
+    parser.add_argument("--fields", default=DEFAULT_FIELDS, help="comma separated fields, empty for all")
+    parser.add_argument("--child", nargs=2, metavar=("PROVIDER", "INTERNING"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    fields = args.fields.split(",") if args.fields else None
+
+    if args.child:
+        return child(args.child[0], args.child[1] == "on", args.contacts, fields)
+
+    for provider in args.providers.split(","):
+        results = {}
+        for interning in ("off", "on"):
+            output = subprocess.check_output([sys.executable, __file__, "--contacts", str(args.contacts),
+                                              "--fields", args.fields, "--child", provider, interning])
+            count, grown, elapsed, pooled = output.split()
+            results[interning] = int(grown)
+            print("%-6s interning %-3s %7d contacts  %8.1f MB  %6.1f s  %6d pooled values" % (
+                provider, interning, int(count), int(grown) / 1024.0 / 1024, float(elapsed), int(pooled)))
+        print("%-6s resident set %.0f%% smaller" % (provider, 100.0 * (1 - float(results["on"]) / results["off"])))
+
+
+if __name__ == "__main__":
+    main()
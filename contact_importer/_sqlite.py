@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+""" SQLite databases shared by the threads of a process """
+import threading
+
+
+class ThreadLocalConnection(object):
+    """ Mixin giving every thread its own connection to one SQLite database
+
+    Subclasses call _open_database(path) from __init__ and create their
+    tables in _create_schema(connection), which runs in a transaction.
+    """
+
+    def _open_database(self, path):
+        self._database = path
+        # sqlite3 connections can not be shared between threads
+        self._local = threading.local()
+        with self._connection() as connection:
+            self._create_schema(connection)
+
+    def _create_schema(self, connection):
+        pass
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3
+
+            connection = self._local.connection = sqlite3.connect(self._database, timeout=30)
+        return connection
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+""" Archive of raw contact feed responses
+
+Importers given an archive append the (decompressed) body of every contact
+feed they fetch to it, so the contacts can be derived again later with an
+updated parser, without calling the providers (see contact_importer.replay)::
+
+    archive = ResponseArchive("/var/lib/app/feeds")
+    importer = LiveContactImporter(client_id, client_secret, redirect_url, archive=archive)
+
+The archive is a directory of append-only segment files. Every body is
+zlib-compressed on its own and every segment has an index file with one
+JSON line per body (offset, length, provider, url, ...), so any body can be
+read without decompressing the others. Each process writes its own
+segments, several processes can share the directory. Credentials in the
+URLs (Live's access_token, Yahoo's OAuth parameters) are not stored.
+"""
+import json
+import os
+import threading
+import zlib
+from time import time
+from urllib import urlencode
+from urlparse import parse_qsl, urlsplit, urlunsplit
+
+# segments are closed once they reach this size
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+# query parameters left out of the archived URLs
+CREDENTIAL_PARAMS = frozenset(["access_token", "oauth_token", "oauth_signature"])
+
+
+def scrub_url(url):
+    """ `url` without its credential query parameters """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    pairs = parse_qsl(query, keep_blank_values=True)
+    kept = [(name, value) for name, value in pairs if name not in CREDENTIAL_PARAMS]
+    if len(kept) == len(pairs):
+        return url
+    return urlunsplit((scheme, netloc, path, urlencode(kept), fragment))
+
+
+class _Recorder(object):
+    """ Compresses one body as it is read """
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level)
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self.parts.append(compressed)
+
+    def finish(self):
+        self.parts.append(self._compressor.flush())
+        return "".join(self.parts)
+
+
+class ResponseArchive(object):
+    """ Directory of compressed, indexed response bodies
+
+    segment_size -- bytes after which a new segment file is started
+    level -- zlib compression level
+    """
+
+    def __init__(self, path, segment_size=SEGMENT_SIZE, level=6):
+        self.path = path
+        self.segment_size = segment_size
+        self.level = level
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        self._pid = None
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def recorder(self):
+        """ Object the body of one response is written to, chunk by chunk """
+        return _Recorder(self.level)
+
+    def append(self, provider, phase, response, recorder):
+        """ Store the body written to `recorder`, with the details of `response` """
+        data = recorder.finish()
+        entry = {
+            "provider": provider,
+            "phase": phase,
+            "url": scrub_url(response.url),
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type"),
+            "time": time(),
+            "size": recorder.size,
+            "length": len(data),
+        }
+        with self._lock:
+            self._open()
+            entry["offset"] = self._segment.tell()
+            self._segment.write(data)
+            self._segment.flush()
+            # the index line is written last, a body without one is ignored
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+            if self._segment.tell() >= self.segment_size:
+                self._close()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _open(self):
+        if self._segment is not None and self._pid == os.getpid():
+            return
+        # after a fork the child starts segments of its own
+        self._segment = self._index = None
+        self._pid = os.getpid()
+        number = 0
+        while True:
+            number += 1
+            name = os.path.join(self.path, "%d-%d-%06d.seg" % (int(time()), self._pid, number))
+            try:
+                fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except OSError:
+                continue
+            break
+        self._segment = os.fdopen(fd, "ab")
+        self._index = open(name[:-len(".seg")] + ".idx", "a")
+
+    def _close(self):
+        if self._segment is not None and self._pid == os.getpid():
+            self._segment.close()
+            self._index.close()
+        self._segment = self._index = None
+
+    def segments(self):
+        """ Paths of the segment files, oldest first """
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".seg"))
+
+    def entries(self, segment, provider=None):
+        """ Index entries of a segment, of one provider when given """
+        return read_index(segment, provider)
+
+    def __iter__(self):
+        """ (entry, body) of every archived response """
+        for segment in self.segments():
+            with open(segment, "rb") as segment_file:
+                for entry in read_index(segment):
+                    yield entry, read_body(segment_file, entry)
+
+
+def read_index(segment, provider=None):
+    """ Index entries of the segment file at `segment` """
+    entries = []
+    index = segment[:-len(".seg")] + ".idx"
+    if not os.path.exists(index):
+        return entries
+    with open(index) as index_file:
+        for line in index_file:
+            if not line.endswith("\n"):
+                # being written right now
+                break
+            entry = json.loads(line)
+            if provider is None or entry["provider"] == provider:
+                entries.append(entry)
+    return entries
+
+
+def read_body(segment_file, entry):
+    """ Body of an index entry, read from the open segment file """
+    segment_file.seek(entry["offset"])
+    return zlib.decompress(segment_file.read(entry["length"]))
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+""" Record/replay transport for the importers' HTTP calls
+
+A Cassette passed as `transport` to an importer either records the requests
+it sends and the responses it gets to a JSON file, or answers them from
+that file without touching the network::
+
+    with Cassette("google-import.json", mode="record") as cassette:
+        importer = GoogleContactImporter(..., transport=cassette)
+        importer.import_contacts(importer.request_access_token(code))
+
+    cassette = Cassette("google-import.json", latency=1.0)  # replay
+    importer = GoogleContactImporter(..., transport=cassette)
+
+Requests are matched on method, URL, query and form parameters. OAuth1
+nonces, timestamps and signatures change on every call, they are left out
+of the match so signed Yahoo calls replay too. Repeated identical requests
+get the recorded responses in order.
+
+Cassettes are safe to commit: client secrets, authorization codes, tokens
+and signatures are left out of the recorded requests and URLs, and the
+tokens in recorded token responses are replaced by "REDACTED" (the requests
+made with them still match, as tokens are not part of the match).
+"""
+import base64
+import json
+import threading
+import time
+from io import BytesIO
+from urllib import urlencode
+from urlparse import parse_qsl, urlsplit, urlunsplit
+
+# parameters that differ between two runs of the same flow
+VOLATILE_PARAMS = frozenset(["oauth_nonce", "oauth_timestamp", "oauth_signature"])
+# parameters carrying credentials, never written to a cassette
+SECRET_PARAMS = frozenset(["client_secret", "code", "access_token", "refresh_token", "oauth_token",
+                           "oauth_verifier", "oauth_signature"])
+IGNORED_PARAMS = VOLATILE_PARAMS | SECRET_PARAMS
+# fields of token responses replaced before recording
+SECRET_FIELDS = frozenset(["access_token", "refresh_token", "id_token", "oauth_token", "oauth_token_secret",
+                           "oauth_session_handle"])
+REDACTED = "REDACTED"
+
+CASSETTE_VERSION = 2
+
+
+class UnmatchedRequest(LookupError):
+    """ Raised when replaying a request the cassette has no (more) responses for """
+
+
+def _pairs(value):
+    if not value:
+        return []
+    if isinstance(value, basestring):
+        return parse_qsl(value, keep_blank_values=True)
+    if isinstance(value, dict):
+        return list(value.items())
+    return list(value)
+
+
+def _encode(pairs):
+    return urlencode([(k, v.encode("utf-8")) for k, v in pairs])
+
+
+def normalize_url(url, params=None):
+    """ `url` with `params` added, sorted, and without volatile or secret parameters """
+    scheme, netloc, path, query, _ = urlsplit(url)
+    pairs = sorted((str(name), unicode(value)) for name, value in _pairs(query) + _pairs(params)
+                   if name not in IGNORED_PARAMS)
+    return urlunsplit((scheme, netloc, path, _encode(pairs), ""))
+
+
+def request_key(method, url, params=None, data=None):
+    """ Normalized form of a request, without its volatile or secret parameters """
+    normalized = normalize_url(url, params)
+    form = sorted((str(name), unicode(value)) for name, value in _pairs(data)
+                  if name not in IGNORED_PARAMS)
+    if form:
+        normalized += " " + _encode(form)
+    return "%s %s" % (method.upper(), normalized)
+
+
+def _redact(name, value):
+    if name in SECRET_FIELDS:
+        return REDACTED
+    if isinstance(value, basestring) and value.startswith(("http://", "https://")) and "?" in value:
+        # e.g. Yahoo's xoauth_request_auth_url carrying the request token
+        scheme, netloc, path, query, fragment = urlsplit(value)
+        query = urlencode([(key, REDACTED if key in SECRET_PARAMS else item)
+                           for key, item in parse_qsl(query, keep_blank_values=True)])
+        return urlunsplit((scheme, netloc, path, query, fragment))
+    return value
+
+
+def redact_body(body, headers):
+    """ `body` of a response with the values of SECRET_FIELDS, and tokens in URLs, replaced """
+    if not body or headers.get("content-encoding"):
+        return body
+    content_type = headers.get("content-type", "")
+    if "json" in content_type:
+        try:
+            document = json.loads(body)
+        except ValueError:
+            return body
+        if isinstance(document, dict):
+            redacted = dict((name, _redact(name, value)) for name, value in document.items())
+            if redacted != document:
+                return json.dumps(redacted)
+    elif "x-www-form-urlencoded" in content_type or "text/plain" in content_type:
+        pairs = parse_qsl(body, keep_blank_values=True)
+        redacted = [(name, _redact(name, value)) for name, value in pairs]
+        if redacted != pairs:
+            return urlencode(redacted)
+    return body
+
+
+def _build_response(interaction, stream):
+    """ requests.Response for a recorded interaction """
+    from requests.models import Response
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+    try:
+        from requests.packages.urllib3.response import HTTPResponse
+    except ImportError:
+        from urllib3.response import HTTPResponse
+
+    headers = interaction["headers"]
+    body = base64.b64decode(interaction["body"])
+    response = Response()
+    response.status_code = interaction["status"]
+    response.reason = interaction.get("reason")
+    response.url = interaction["url"]
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    # the body is kept as transferred, requests decompresses it like a live one
+    response.raw = HTTPResponse(body=BytesIO(body), headers=headers, status=response.status_code,
+                                preload_content=False, decode_content=False)
+    if not stream:
+        response.content
+    return response
+
+
+class Cassette(object):
+    """ Transport recording to or replaying from the cassette file at `path`
+
+    mode -- "replay" (default), "record" (always send, overwrite the file on
+            save) or "once" (record when the file does not exist yet)
+    latency -- when replaying, sleep for the recorded time to the response
+               headers multiplied by `latency`, None to answer right away
+    """
+
+    def __init__(self, path, mode="replay", latency=None):
+        import os
+
+        if mode == "once":
+            mode = "replay" if os.path.exists(path) else "record"
+        if mode not in ("replay", "record"):
+            raise ValueError("Unknown cassette mode: %s" % mode)
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.interactions = []
+        self._lock = threading.Lock()
+        self._queues = {}
+        if mode == "replay":
+            with open(path) as cassette_file:
+                cassette = json.load(cassette_file)
+            if cassette.get("version") != CASSETTE_VERSION:
+                raise ValueError("Cassette %s is from an older version, record it again" % path)
+            self.interactions = cassette["interactions"]
+            for interaction in self.interactions:
+                self._queues.setdefault(interaction["key"], []).append(interaction)
+            for queue in self._queues.values():
+                queue.reverse()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == "record":
+            self.save()
+        return False
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as cassette_file:
+                json.dump({"version": CASSETTE_VERSION, "interactions": self.interactions}, cassette_file, indent=1)
+
+    def request(self, method, url, **kwargs):
+        """ Same signature as requests.request, which the importers call otherwise """
+        key = request_key(method, url, kwargs.get("params"), kwargs.get("data"))
+        stream = kwargs.get("stream", False)
+        if self.mode == "record":
+            return self._record(key, method, url, stream, kwargs)
+
+        with self._lock:
+            queue = self._queues.get(key)
+            interaction = queue.pop() if queue else None
+        if interaction is None:
+            raise UnmatchedRequest(key)
+        if self.latency:
+            time.sleep(interaction["elapsed"] * self.latency)
+        return _build_response(interaction, stream)
+
+    def _record(self, key, method, url, stream, kwargs):
+        import requests
+
+        kwargs["stream"] = True
+        start = time.time()
+        response = requests.request(method, url, **kwargs)
+        elapsed = time.time() - start
+        try:
+            body = response.raw.read(decode_content=False)
+        finally:
+            response.close()
+        headers = dict(response.headers)
+        redacted = redact_body(body, response.headers)
+        if redacted is not body:
+            body = redacted
+            headers = dict((name, value) for name, value in headers.items() if name.lower() != "content-length")
+            headers["Content-Length"] = str(len(body))
+        interaction = {
+            "key": key,
+            "url": normalize_url(response.url),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": headers,
+            "body": base64.b64encode(body),
+            "elapsed": elapsed,
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+        return _build_response(interaction, stream)
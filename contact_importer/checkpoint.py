@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+""" Checkpoints of long running imports
+
+With a checkpoint, import_contacts records after every page the cursor of
+the next page and how many contacts were delivered, in an SQLite file. When
+the import fails (or the process dies) the next call with the same job key
+resumes from the last page fetched instead of starting over::
+
+    checkpoints = CheckpointStore("/var/lib/app/imports.db")
+    contacts = importer.import_contacts(access_token, checkpoint=checkpoints.job("account-42"))
+
+Without a sink the contacts of every page are stored too, so the resumed
+import returns the whole address book; with a sink only the new contacts
+are written. The checkpoint is removed once the import is complete.
+"""
+import json
+from time import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from ._sqlite import ThreadLocalConnection
+
+
+class CheckpointStore(ThreadLocalConnection):
+    """ Checkpoints of all import jobs, in the SQLite database at `path` """
+
+    def __init__(self, path):
+        self.path = path
+        self._open_database(path)
+
+    def _create_schema(self, connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS checkpoints "
+                           "(provider TEXT, job TEXT, cursor TEXT NOT NULL, emitted INTEGER NOT NULL, "
+                           "updated REAL NOT NULL, PRIMARY KEY (provider, job))")
+        connection.execute("CREATE TABLE IF NOT EXISTS checkpoint_pages "
+                           "(provider TEXT, job TEXT, page INTEGER, contacts BLOB NOT NULL, "
+                           "PRIMARY KEY (provider, job, page))")
+
+    def job(self, key):
+        """ Checkpoint of the import job `key`, e.g. an account id """
+        return Checkpoint(self, key)
+
+    def purge(self, max_age):
+        """ Remove the checkpoints not updated for `max_age` seconds """
+        oldest = time() - max_age
+        with self._connection() as connection:
+            connection.execute("DELETE FROM checkpoint_pages WHERE EXISTS (SELECT 1 FROM checkpoints c "
+                               "WHERE c.provider = checkpoint_pages.provider AND c.job = checkpoint_pages.job "
+                               "AND c.updated < ?)", (oldest,))
+            return connection.execute("DELETE FROM checkpoints WHERE updated < ?", (oldest,)).rowcount
+
+
+class Checkpoint(object):
+    """ Checkpoint of one import job, used by BaseProvider._paginate """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def load(self, provider):
+        """ (cursor, emitted) of the last page saved, None when there is none """
+        row = self.store._connection().execute(
+            "SELECT cursor, emitted FROM checkpoints WHERE provider = ? AND job = ?",
+            (provider, self.key)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def contacts(self, provider):
+        """ Contacts of the pages saved so far, in order """
+        rows = self.store._connection().execute(
+            "SELECT contacts FROM checkpoint_pages WHERE provider = ? AND job = ? ORDER BY page",
+            (provider, self.key))
+        for row in rows:
+            for contact in pickle.loads(str(row[0])):
+                yield contact
+
+    def save(self, provider, cursor, emitted, page=None):
+        """ Record that the import continues at `cursor`, storing the contacts of `page` """
+        with self.store._connection() as connection:
+            if page:
+                connection.execute(
+                    "INSERT INTO checkpoint_pages (provider, job, page, contacts) "
+                    "SELECT ?, ?, COALESCE(MAX(page), 0) + 1, ? FROM checkpoint_pages WHERE provider = ? AND job = ?",
+                    (provider, self.key, buffer(pickle.dumps(page, pickle.HIGHEST_PROTOCOL)), provider, self.key))
+            connection.execute("INSERT OR REPLACE INTO checkpoints (provider, job, cursor, emitted, updated) "
+                               "VALUES (?, ?, ?, ?, ?)", (provider, self.key, json.dumps(cursor), emitted, time()))
+
+    def clear(self, provider):
+        with self.store._connection() as connection:
+            connection.execute("DELETE FROM checkpoint_pages WHERE provider = ? AND job = ?", (provider, self.key))
+            connection.execute("DELETE FROM checkpoints WHERE provider = ? AND job = ?", (provider, self.key))
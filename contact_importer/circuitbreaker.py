@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+""" Circuit breakers for provider endpoints
+
+A breaker watches the outcome of the requests going to every endpoint of a
+provider ("token" and "fetch") over a sliding window of calls. When too many
+of them fail or are too slow it opens and requests fail fast with CircuitOpen
+instead of tying up a worker. After `reset_timeout` seconds a few trial
+requests are let through (half open); if they succeed the circuit closes,
+otherwise it opens again.
+
+One breaker is meant to be shared by all importers of a process::
+
+    breaker = CircuitBreaker(failure_rate=0.5, slow_call=5.0)
+    importer = LiveContactImporter(client_id, client_secret, redirect_url, breaker=breaker)
+"""
+import threading
+from collections import deque
+from time import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """ Raised instead of sending a request to an endpoint whose circuit is open """
+
+    def __init__(self, provider, endpoint, retry_after):
+        message = "%s %s circuit open, retry in %.1fs" % (provider, endpoint, retry_after)
+        super(CircuitOpen, self).__init__(message)
+        self.message = message
+        self.provider = provider
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class _Circuit(object):
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.calls = deque(maxlen=window)
+        self.opened_at = None
+        self.trials = 0
+        self.successes = 0
+
+
+class CircuitBreaker(object):
+    """ Per provider and endpoint circuit breaker
+
+    failure_rate -- share (0..1) of failed calls in the window opening the circuit
+    slow_call -- seconds after which a successful call counts as failed, None
+                 to ignore latency
+    window -- number of most recent calls considered
+    min_calls -- calls needed in the window before the circuit may open
+    reset_timeout -- seconds an open circuit waits before letting trials through
+    trial_calls -- successful trial calls needed to close a half open circuit
+    """
+
+    def __init__(self, failure_rate=0.5, slow_call=None, window=20, min_calls=10, reset_timeout=30.0,
+                 trial_calls=1):
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.trial_calls = trial_calls
+        self._lock = threading.Lock()
+        self._circuits = {}
+
+    def _circuit(self, provider, endpoint):
+        circuit = self._circuits.get((provider, endpoint))
+        if circuit is None:
+            circuit = self._circuits[(provider, endpoint)] = _Circuit(self.window)
+        return circuit
+
+    def state(self, provider, endpoint):
+        """ State of an endpoint's circuit: CLOSED, OPEN or HALF_OPEN """
+        with self._lock:
+            circuit = self._circuit(provider, endpoint)
+            if circuit.state == OPEN and time() - circuit.opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return circuit.state
+
+    def states(self):
+        """ Mapping of (provider, endpoint) -> state of every circuit seen so far """
+        return dict((key, self.state(*key)) for key in list(self._circuits))
+
+    def before(self, provider, endpoint):
+        """ Called before a request, raises CircuitOpen when it must not be sent """
+        with self._lock:
+            circuit = self._circuit(provider, endpoint)
+            if circuit.state == OPEN:
+                retry_after = circuit.opened_at + self.reset_timeout - time()
+                if retry_after > 0:
+                    raise CircuitOpen(provider, endpoint, retry_after)
+                circuit.state = HALF_OPEN
+                circuit.trials = circuit.successes = 0
+            if circuit.state == HALF_OPEN:
+                if circuit.trials >= self.trial_calls:
+                    raise CircuitOpen(provider, endpoint, 0.0)
+                circuit.trials += 1
+
+    def after(self, provider, endpoint, ok, seconds):
+        """ Record the outcome of a request let through by before()
+
+        Returns True when this outcome opened the circuit.
+        """
+        failed = not ok or (self.slow_call is not None and seconds > self.slow_call)
+        with self._lock:
+            circuit = self._circuit(provider, endpoint)
+            if circuit.state == HALF_OPEN:
+                if failed:
+                    self._open(circuit)
+                    return True
+                circuit.successes += 1
+                if circuit.successes >= self.trial_calls:
+                    circuit.state = CLOSED
+                    circuit.calls.clear()
+                return False
+            if circuit.state == OPEN:
+                return False
+
+            circuit.calls.append(failed)
+            if len(circuit.calls) >= self.min_calls and \
+                    sum(circuit.calls) >= self.failure_rate * len(circuit.calls):
+                self._open(circuit)
+                return True
+            return False
+
+    def release(self, provider, endpoint):
+        """ Give back a trial slot taken by before() for a request without outcome """
+        with self._lock:
+            circuit = self._circuit(provider, endpoint)
+            if circuit.state == HALF_OPEN and circuit.trials > circuit.successes:
+                circuit.trials -= 1
+
+    def _open(self, circuit):
+        circuit.state = OPEN
+        circuit.opened_at = time()
+        circuit.calls.clear()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+""" Incremental decompression of HTTP response bodies
+
+gzip and deflate are always offered to the providers, brotli too when the
+brotli package is installed.
+"""
+import zlib
+
+_brotli = None
+
+
+def _brotli_module():
+    """ The brotli module, or None when it is not installed """
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli or None
+
+
+def accept_encoding():
+    """ Value of the Accept-Encoding header sent with every request """
+    if _brotli_module() is not None:
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+
+class Decompressor(object):
+    """ Decompresses a body chunk by chunk, passes unknown encodings through """
+
+    def __init__(self, content_encoding=None):
+        self.encoding = (content_encoding or "identity").strip().lower()
+        if self.encoding in ("gzip", "x-gzip"):
+            self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            # servers disagree whether deflate means zlib wrapped or raw,
+            # decide on the first chunk
+            self._obj = zlib.decompressobj()
+            self._first = True
+        elif self.encoding == "br" and _brotli_module() is not None:
+            self._obj = _brotli_module().Decompressor()
+        else:
+            self._obj = None
+
+    def decompress(self, data):
+        if self._obj is None or not data:
+            return data
+        if self.encoding == "br":
+            return self._obj.process(data)
+        if self.encoding == "deflate" and self._first:
+            self._first = False
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        if self._obj is None or self.encoding == "br":
+            return ""
+        return self._obj.flush()
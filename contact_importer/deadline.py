@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+""" Time budgets for imports """
+from time import time
+
+
+class DeadlineExceeded(RuntimeError):
+    """ Raised when a step cannot finish within the time budget """
+
+    def __init__(self, message="Deadline exceeded"):
+        super(DeadlineExceeded, self).__init__(message)
+        self.message = message
+
+
+class Deadline(object):
+    """ A point in time by which an import has to return
+
+    Importers pass the remaining budget as timeout to every request and check
+    it between pages, returning the contacts gathered so far once it is spent.
+    """
+
+    def __init__(self, seconds):
+        self.expires = time() + seconds
+
+    @classmethod
+    def coerce(cls, deadline):
+        """ Accept None, a number of seconds or a Deadline """
+        if deadline is None or isinstance(deadline, Deadline):
+            return deadline
+        return cls(deadline)
+
+    def remaining(self):
+        return max(0.0, self.expires - time())
+
+    @property
+    def expired(self):
+        return time() >= self.expires
+
+    def check(self):
+        """ Raise DeadlineExceeded once the budget is spent """
+        if self.expired:
+            raise DeadlineExceeded()
+
+    def timeout(self, timeout=None):
+        """ Request timeout fitting in the remaining budget (and `timeout`)
+
+        Raises DeadlineExceeded when nothing is left: requests rejects a
+        timeout of 0.
+        """
+        remaining = self.expires - time()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        if timeout is not None:
+            return min(timeout, remaining)
+        return remaining
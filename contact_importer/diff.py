@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+""" Changes between two imports of the same address book
+
+Every contact gets an identity key (its email, or phone or name when it has
+none) and a hash of its mapped fields. A snapshot maps the keys of an import
+to their hashes, and diffing the next import against it tells which
+contacts were added, changed or removed::
+
+    snapshots = SnapshotStore("/var/lib/app/snapshots.db")
+    changes = snapshots.diff("account-42", importer.import_contacts(access_token))
+    notify(changes.added, changes.changed, changes.removed)
+
+Contacts can be any iterable, e.g. FileContactImporter.iter_contacts, and
+only the changed ones are kept in memory besides the snapshots.
+"""
+import datetime
+import json
+import re
+import zlib
+from hashlib import sha1
+from time import time
+
+from ._sqlite import ThreadLocalConnection
+
+# fields left out of the content hash: Live's "raw" user object carries
+# volatile values such as updated_time
+IGNORED_FIELDS = frozenset(["raw"])
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def identity_key(contact):
+    """ Stable key of a contact: its email, else its phone number, else its name """
+    email = contact.get("email")
+    if email:
+        return u"email:" + email.strip().lower()
+    phone = contact.get("phone")
+    if phone:
+        digits = _NON_DIGITS.sub("", phone)
+        if digits:
+            return u"phone:" + digits
+    name = contact.get("full_name") or contact.get("name") or \
+        u" ".join(part for part in (contact.get("first_name"), contact.get("last_name")) if part)
+    return u"name:" + (name or u"").strip().lower()
+
+
+def _canonical(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def content_hash(contact):
+    """ Hex digest of the mapped fields of a contact, insensitive to their order """
+    parts = []
+    for field in sorted(contact):
+        if field in IGNORED_FIELDS:
+            continue
+        value = contact[field]
+        # most values are plain strings, skip the conversion call for them
+        if value.__class__ is not str:
+            value = _canonical(value)
+        parts.append(field)
+        parts.append(value)
+    # 64 bits are plenty to tell versions of one contact apart
+    return sha1("\x1f".join(parts)).hexdigest()[:16]
+
+
+class ContactDiff(object):
+    """ Result of diff: added and changed contacts, keys of the removed ones
+
+    snapshot -- the snapshot of the new import, to diff the next one against
+    """
+
+    def __init__(self, added, changed, removed, snapshot):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.snapshot = snapshot
+
+    def __nonzero__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return "<ContactDiff %d added, %d changed, %d removed>" % (
+            len(self.added), len(self.changed), len(self.removed))
+
+
+def diff(previous, contacts, key=identity_key):
+    """ Compare `contacts` with the snapshot of the previous import
+
+    previous -- snapshot dict (identity key -> content hash), None or {} for
+                a first import, where every contact is added
+    key -- function computing the identity key of a contact
+
+    Contacts sharing a key are told apart by their position ("#2", "#3", ...).
+    """
+    previous = previous or {}
+    snapshot = {}
+    added = []
+    changed = []
+    # key -> last position suffix given to it
+    seen = {}
+    for contact in contacts:
+        contact_key = key(contact)
+        if contact_key in snapshot:
+            duplicate = seen.get(contact_key, 1) + 1
+            # only a key that itself looks like "<key>#<n>" can be taken
+            while u"%s#%d" % (contact_key, duplicate) in snapshot:
+                duplicate += 1
+            seen[contact_key] = duplicate
+            contact_key = u"%s#%d" % (contact_key, duplicate)
+        digest = snapshot[contact_key] = content_hash(contact)
+        old_digest = previous.get(contact_key)
+        if old_digest is None:
+            added.append(contact)
+        elif old_digest != digest:
+            changed.append(contact)
+    removed = [contact_key for contact_key in previous if contact_key not in snapshot]
+    return ContactDiff(added, changed, removed, snapshot)
+
+
+class SnapshotStore(ThreadLocalConnection):
+    """ Snapshots of every account, compressed in the SQLite database at `path` """
+
+    def __init__(self, path):
+        self.path = path
+        self._open_database(path)
+
+    def _create_schema(self, connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS snapshots "
+                           "(account TEXT PRIMARY KEY, snapshot BLOB NOT NULL, updated REAL NOT NULL)")
+
+    def load(self, account):
+        """ Snapshot of the last import of `account`, None when there is none """
+        row = self._connection().execute("SELECT snapshot FROM snapshots WHERE account = ?",
+                                         (account,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(str(row[0])))
+
+    def save(self, account, snapshot):
+        data = buffer(zlib.compress(json.dumps(snapshot, separators=(",", ":")), 6))
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO snapshots (account, snapshot, updated) VALUES (?, ?, ?)",
+                               (account, data, time()))
+
+    def delete(self, account):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM snapshots WHERE account = ?", (account,))
+
+    def diff(self, account, contacts, key=identity_key, save=True):
+        """ Diff `contacts` against the last snapshot of `account`, then store theirs """
+        changes = diff(self.load(account), contacts, key)
+        if save:
+            self.save(account, changes.snapshot)
+        return changes
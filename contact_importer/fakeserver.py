@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+""" Local stand-in server for the Google, Live and Yahoo endpoints
+
+Implements the token exchange, the Yahoo OAuth1 request/get_token steps,
+the contact feeds and the contact photos of all three providers, so the whole import flow can be
+exercised (and load-tested) on a disconnected machine::
+
+    server = FakeProviderServer(contacts=5000, latency=0.05, error_rate=0.01)
+    server.start()
+    importer = GoogleContactImporter(client_id, client_secret, redirect_url,
+                                     **server.endpoints("google"))
+
+or from the command line::
+
+    python -m contact_importer.fakeserver --port 8000 --contacts 5000
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from gzip import GzipFile
+from StringIO import StringIO
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urllib import urlencode
+from urlparse import urlparse, parse_qs
+from xml.sax.saxutils import escape, quoteattr
+
+FIRST_NAMES = ["John", "Jane", "Alice", "Bob", "Carol", "Dave", "Eve", "Mallory", "Oscar", "Peggy"]
+LAST_NAMES = ["Smith", "Doe", "Johnson", "Brown", "Taylor", "Miller", "Wilson", "Moore"]
+DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "example.com", "example.org"]
+COMPANIES = ["Acme Inc.", "Globex", "Initech", "Umbrella", "Hooli", ""]
+TITLES = ["Engineer", "Manager", "Director", "Sales", ""]
+CITIES = ["Berlin", "London", "New York", "Paris", "Warsaw"]
+COUNTRIES = ["Germany", "United Kingdom", "United States", "France", "Poland"]
+
+GOOGLE_TOKEN = "fake-google-access-token"
+LIVE_TOKEN = "fake-live-access-token"
+YAHOO_GUID = "FAKEYAHOOGUID"
+
+
+def fake_contacts(count, seed=0):
+    """ Generate `count` deterministic contacts in a provider neutral shape """
+    rnd = random.Random(seed)
+    contacts = []
+    for i in range(count):
+        first_name = rnd.choice(FIRST_NAMES)
+        last_name = rnd.choice(LAST_NAMES)
+        city = rnd.randrange(len(CITIES))
+        contacts.append({
+            "id": "%08x" % i,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": "%s.%s%d@%s" % (first_name.lower(), last_name.lower(), i, rnd.choice(DOMAINS)),
+            "phone": "+1 555 %07d" % rnd.randrange(10 ** 7),
+            "company": rnd.choice(COMPANIES),
+            "title": rnd.choice(TITLES),
+            "street": "%d Main Street" % rnd.randrange(1, 1000),
+            "city": CITIES[city],
+            "country": COUNTRIES[city],
+            "postal_code": "%05d" % rnd.randrange(10 ** 5),
+            "birthday": (1950 + rnd.randrange(50), 1 + rnd.randrange(12), 1 + rnd.randrange(28)),
+            "photo": i % 3 != 2,
+        })
+    return contacts
+
+
+def fake_photo(key):
+    """ Deterministic image bytes of the photo `key`, a few kilobytes long """
+    digest = hashlib.md5("photo-%s" % key).digest()
+    return "\x89PNG\r\n\x1a\n" + digest * (128 + ord(digest[0]))
+
+
+def photo_etag(key):
+    return '"%s"' % hashlib.md5("photo-%s" % key).hexdigest()[:16]
+
+
+# partial response selector -> markup of that element in a Google entry
+GOOGLE_ELEMENTS = (
+    ("id", "<id>http://www.google.com/m8/feeds/contacts/default/base/%(id)s</id>"),
+    ("updated", "<updated>2014-01-01T00:00:00.000Z</updated>"),
+    ("category", "<category scheme='http://schemas.google.com/g/2005#kind'"
+                 " term='http://schemas.google.com/contact/2008#contact'/>"),
+    ("title", "<title>%(full_name)s</title>"),
+    ("link", "<link rel='http://schemas.google.com/contacts/2008/rel#photo' type='image/*'"
+             " href=%(photo_href)s%(photo_etag)s/>"
+             "<link rel='self' type='application/atom+xml'"
+             " href='https://www.google.com/m8/feeds/contacts/default/full/%(id)s'/>"),
+    ("gd:name", "<gd:name><gd:fullName>%(full_name)s</gd:fullName>"
+                "<gd:givenName>%(first_name)s</gd:givenName>"
+                "<gd:familyName>%(last_name)s</gd:familyName></gd:name>"),
+    ("gd:email", "<gd:email rel='http://schemas.google.com/g/2005#other' address=%(email)s primary='true'/>"),
+    ("gd:phoneNumber", "<gd:phoneNumber rel='http://schemas.google.com/g/2005#mobile'>%(phone)s</gd:phoneNumber>"),
+    ("gd:organization", "<gd:organization rel='http://schemas.google.com/g/2005#work'>"
+                        "<gd:orgName>%(company)s</gd:orgName><gd:orgTitle>%(title)s</gd:orgTitle>"
+                        "</gd:organization>"),
+)
+
+
+def google_feed(contacts, elements=None, start=0, total=None,
+                photo_url="https://www.google.com/m8/feeds/photos/media/default/%s"):
+    """ Render contacts as a Google Contacts API v3 Atom feed
+
+    elements -- selectors of the entry elements to include (partial
+                response), all of them by default
+    start, total -- offset of this page and size of the whole feed
+    photo_url -- URL of a contact's photo, given its id
+    """
+    entry = "<entry>%s</entry>" % "".join(
+        markup for selector, markup in GOOGLE_ELEMENTS if elements is None or selector in elements)
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>"
+        "<feed xmlns='http://www.w3.org/2005/Atom'"
+        " xmlns:openSearch='http://a9.com/-/spec/opensearch/1.1/'"
+        " xmlns:gContact='http://schemas.google.com/contact/2008'"
+        " xmlns:gd='http://schemas.google.com/g/2005'>"
+        "<title>Contacts</title>"
+        "<openSearch:totalResults>%d</openSearch:totalResults>"
+        "<openSearch:startIndex>%d</openSearch:startIndex>" % (len(contacts) if total is None else total, start + 1)
+    ]
+    for c in contacts:
+        full_name = "%s %s" % (c["first_name"], c["last_name"])
+        parts.append(entry % {
+            "id": c["id"],
+            "full_name": escape(full_name),
+            "first_name": escape(c["first_name"]),
+            "last_name": escape(c["last_name"]),
+            "email": quoteattr(c["email"]),
+            "phone": escape(c["phone"]),
+            "company": escape(c["company"]),
+            "title": escape(c["title"]),
+            "photo_href": quoteattr(photo_url % c["id"]),
+            "photo_etag": " gd:etag=%s" % quoteattr(photo_etag(c["id"])) if c["photo"] else "",
+        })
+    parts.append("</feed>")
+    return "".join(parts)
+
+
+def live_feed(contacts, projection=None, start=0, total=None, photo_url=None):
+    """ Render contacts as a Live Connect /me/contacts JSON document
+
+    start, total -- offset of this page and size of the whole list
+
+    Contacts with a photo are Live users, their picture is found by user_id.
+    """
+    data = []
+    for c in contacts:
+        year, month, day = c["birthday"]
+        data.append({
+            "id": "contact.%s" % c["id"],
+            "name": "%s %s" % (c["first_name"], c["last_name"]),
+            "first_name": c["first_name"],
+            "last_name": c["last_name"],
+            "is_friend": False,
+            "is_favorite": False,
+            "user_id": c["id"] if c["photo"] else None,
+            "emails": {
+                "preferred": c["email"],
+                "account": None,
+                "personal": c["email"],
+                "business": None,
+                "other": None,
+            },
+            "work": [{
+                "employer": {"name": c["company"]},
+                "position": {"name": c["title"]},
+            }],
+            "addresses": {
+                "personal": {
+                    "street": c["street"],
+                    "street_2": None,
+                    "city": c["city"],
+                    "state": None,
+                    "postal_code": c["postal_code"],
+                    "region": c["country"],
+                },
+                "business": {
+                    "street": None,
+                    "street_2": None,
+                    "city": None,
+                    "state": None,
+                    "postal_code": None,
+                    "region": None,
+                },
+            },
+            "phones": {"personal": None, "business": None, "mobile": c["phone"]},
+            "birth_day": day,
+            "birth_month": month,
+            "birth_year": year,
+            "updated_time": "2014-01-01T00:00:00+0000",
+        })
+    paging = {}
+    if total is not None and start + len(data) < total:
+        paging["next"] = "https://apis.live.net/v5.0/me/contacts?offset=%d&limit=%d" % (start + len(data), len(data))
+    return json.dumps({"data": data, "paging": paging})
+
+
+def yahoo_feed(contacts, types=None, start=0, total=None, photo_url="https://img.avatars.yahoo.com/%s.png"):
+    """ Render contacts as a Yahoo Social API contacts JSON document
+
+    types -- field types to include (out matrix parameter), all by default
+    start, total -- offset of this page and size of the whole list
+    photo_url -- URL of a contact's photo, given its id
+    """
+    contact_list = []
+    for c in contacts:
+        year, month, day = c["birthday"]
+        fields = [
+            {"type": "name", "value": {"givenName": c["first_name"], "familyName": c["last_name"]}},
+            {"type": "email", "value": c["email"]},
+            {"type": "phone", "value": c["phone"]},
+            {"type": "birthday", "value": {"day": str(day), "month": str(month), "year": str(year)}},
+        ]
+        if c["company"]:
+            fields.append({"type": "company", "value": c["company"]})
+        if c["title"]:
+            fields.append({"type": "jobTitle", "value": c["title"]})
+        if c["photo"]:
+            fields.append({"type": "image", "value": {"imageUrl": photo_url % c["id"]}})
+        if types is not None:
+            fields = [field for field in fields if field["type"] in types]
+        contact_list.append({"id": int(c["id"], 16), "fields": fields})
+    return json.dumps({"contacts": {"start": start, "count": len(contact_list),
+                                    "total": len(contact_list) if total is None else total,
+                                    "contact": contact_list}})
+
+
+def gzip_body(body):
+    """ gzip compressed copy of `body` """
+    buf = StringIO()
+    with GzipFile(fileobj=buf, mode="wb") as gzip_file:
+        gzip_file.write(body)
+    return buf.getvalue()
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """ Dispatches requests to the provider endpoints by path """
+
+    # Silence the default per-request stderr logging
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        if self.command == "POST":
+            length = int(self.headers.get("content-length") or 0)
+            if length:
+                query.update((k, v[0]) for k, v in parse_qs(self.rfile.read(length)).items())
+
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server.random() < server.error_rate:
+            return self.reply(503, "Service Unavailable", "text/plain")
+
+        parts = url.path.strip("/").split("/")
+        route = "_".join(parts[:2])
+        if parts[0] == "yahoo" and parts[1:2] == ["user"]:
+            route = "yahoo_contacts"
+        if parts[1:2] in (["photos"], ["picture"]):
+            # /<provider>/photos/<id>, every provider serves the same photos
+            return self.reply_photo(parts[2] if len(parts) > 2 else "")
+        handler = getattr(self, "handle_%s" % route, None)
+        if handler is None:
+            return self.reply(404, "Not Found", "text/plain")
+        handler(query, url.params)
+
+    def reply(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_photo(self, key):
+        """ Send a contact photo, or 304 when the client has this version """
+        etag = photo_etag(key)
+        if self.headers.get("if-none-match") == etag:
+            return self.reply(304, "", "image/png", [("ETag", etag)])
+        self.reply(200, fake_photo(key), "image/png", [("ETag", etag)])
+
+    def reply_feed(self, provider, projection, start, size, content_type):
+        """ Send a page of a contact feed, gzipped when the client accepts it """
+        gzipped = self.server.compression and "gzip" in self.headers.get("accept-encoding", "")
+        body = self.server.body(provider, projection, gzipped, start, size)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def handle_google_auth(self, query, params):
+        self.redirect("%s?%s" % (query.get("redirect_uri", "/"), urlencode({"code": "fake-google-code"})))
+
+    def handle_google_token(self, query, params):
+        self.reply(200, json.dumps({"access_token": GOOGLE_TOKEN, "token_type": "Bearer",
+                                    "expires_in": 3600}), "application/json")
+
+    def handle_google_contacts(self, query, params):
+        projection = None
+        match = re.search(r"entry\(([^)]*)\)", query.get("fields", ""))
+        if match:
+            projection = frozenset(match.group(1).split(","))
+        start = int(query.get("start-index", 1)) - 1
+        self.reply_feed("google", projection, start, int(query.get("max-results", 25)),
+                        "application/atom+xml; charset=UTF-8")
+
+    def handle_live_auth(self, query, params):
+        self.redirect("%s?%s" % (query.get("redirect_uri", "/"), urlencode({"code": "fake-live-code"})))
+
+    def handle_live_token(self, query, params):
+        self.reply(200, json.dumps({"access_token": LIVE_TOKEN, "token_type": "bearer",
+                                    "expires_in": 3600, "scope": "wl.basic wl.contacts_emails"}),
+                   "application/json")
+
+    def handle_live_contacts(self, query, params):
+        limit = int(query.get("limit", 0)) or None
+        self.reply_feed("live", None, int(query.get("offset", 0)), limit, "application/json; charset=UTF-8")
+
+    def handle_yahoo_get_request_token(self, query, params):
+        token = self.server.new_token()
+        self.server.callbacks[token] = query.get("oauth_callback", "oob")
+        self.reply(200, urlencode({
+            "oauth_token": token,
+            "oauth_token_secret": "%s-secret" % token,
+            "oauth_expires_in": 3600,
+            "xoauth_request_auth_url": "%s/yahoo/request_auth?oauth_token=%s" % (self.server.url, token),
+            "oauth_callback_confirmed": "true",
+        }), "application/x-www-form-urlencoded")
+
+    def handle_yahoo_request_auth(self, query, params):
+        token = query.get("oauth_token", "")
+        callback = self.server.callbacks.get(token, "/")
+        self.redirect("%s?%s" % (callback, urlencode({"oauth_token": token, "oauth_verifier": "fakeverifier"})))
+
+    def handle_yahoo_get_token(self, query, params):
+        token = self.server.new_token()
+        self.server.callbacks.pop(query.get("oauth_token"), None)
+        self.reply(200, urlencode({
+            "oauth_token": token,
+            "oauth_token_secret": "%s-secret" % token,
+            "oauth_expires_in": 3600,
+            "oauth_session_handle": "fake-session-handle",
+            "oauth_authorization_expires_in": 86400,
+            "xoauth_yahoo_guid": YAHOO_GUID,
+        }), "application/x-www-form-urlencoded")
+
+    def handle_yahoo_contacts(self, query, params):
+        projection = None
+        if params.startswith("out="):
+            projection = frozenset(params[4:].split(","))
+        count = query.get("count", "max")
+        count = None if count == "max" else int(count)
+        self.reply_feed("yahoo", projection, int(query.get("start", 0)), count, "application/json; charset=UTF-8")
+
+
+class FakeProviderServer(ThreadingMixIn, HTTPServer):
+    """ Threaded HTTP server standing in for all three providers
+
+    contacts -- number of contacts in every contact feed
+    latency -- seconds to sleep before answering any request
+    error_rate -- probability (0..1) of answering any request with a 503
+    seed -- seed for the generated contacts and the error injection
+    compression -- gzip contact feeds for clients accepting it
+    """
+    daemon_threads = True
+
+    feeds = {
+        "google": google_feed,
+        "live": live_feed,
+        "yahoo": yahoo_feed,
+    }
+
+    def __init__(self, host="127.0.0.1", port=0, contacts=100, latency=0.0, error_rate=0.0, seed=0,
+                 compression=True):
+        HTTPServer.__init__(self, (host, port), FakeProviderHandler)
+        self.contacts = contacts
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.compression = compression
+        self.callbacks = {}
+        self._bodies = {}
+        self._contacts = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._thread = None
+
+    def handle_error(self, request, client_address):
+        # clients running out of their deadline hang up mid response
+        if not isinstance(sys.exc_info()[1], socket.error):
+            HTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def endpoints(self, provider):
+        """ Endpoint overrides to pass to the given provider's importer """
+        base = "%s/%s" % (self.url, provider)
+        if provider == "google":
+            return {
+                "auth_url": "%s/auth" % base,
+                "token_url": "%s/token" % base,
+                "contacts_url": "%s/contacts" % base,
+            }
+        if provider == "live":
+            return {
+                "auth_url": "%s/auth" % base,
+                "token_url": "%s/token" % base,
+                "contacts_url": "%s/contacts?access_token=%%s&limit=1000" % base,
+                "picture_url": "%s/picture/%%s" % base,
+            }
+        if provider == "yahoo":
+            return {
+                "request_token_url": "%s/get_request_token" % base,
+                "request_auth_url": "%s/request_auth" % base,
+                "token_url": "%s/get_token" % base,
+                "contacts_url": "%s/user/%%s/contacts" % base,
+            }
+        raise ValueError("Unknown provider: %s" % provider)
+
+    def body(self, provider, projection=None, gzipped=False, start=0, size=None):
+        """ Rendered contact feed page for a provider, generated once and cached
+
+        projection -- the provider specific selection of contact fields
+        start, size -- offset and length of the page, all contacts by default
+        """
+        key = (provider, projection, gzipped, start, size)
+        body = self._bodies.get(key)
+        if body is None:
+            if gzipped:
+                body = gzip_body(self.body(provider, projection, False, start, size))
+            else:
+                contacts = self.contact_list()
+                page = contacts[start:] if size is None else contacts[start:start + size]
+                body = self.feeds[provider](page, projection, start, len(contacts),
+                                            photo_url="%s/%s/photos/%%s" % (self.url, provider)).encode("utf-8")
+            with self._lock:
+                body = self._bodies.setdefault(key, body)
+        return body
+
+    def contact_list(self):
+        """ The generated contacts every feed is rendered from """
+        if self._contacts is None:
+            contacts = fake_contacts(self.contacts, self.seed)
+            with self._lock:
+                if self._contacts is None:
+                    self._contacts = contacts
+        return self._contacts
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+    def new_token(self):
+        with self._lock:
+            self._counter += 1
+            return "faketoken%d" % self._counter
+
+    def start(self):
+        """ Serve requests from a background daemon thread """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class FakeRedis(object):
+    """ In-process stand-in for the subset of redis.StrictRedis the flow stores use """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._values = {}
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._values[name] = (value, time.time() + ex if ex else None)
+        return True
+
+    def get(self, name):
+        with self._lock:
+            value, expires = self._values.get(name, (None, None))
+            if expires is not None and expires <= time.time():
+                del self._values[name]
+                return None
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._values.pop(name, None) is not None for name in names)
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        # commands run under the client lock, as a MULTI/EXEC transaction would
+        with self.client._lock:
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Google, Live and Yahoo contact APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--contacts", type=int, default=100, help="contacts per feed")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a 503 response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-compression", dest="compression", action="store_false",
+                        help="never gzip contact feeds")
+    args = parser.parse_args(argv)
+
+    server = FakeProviderServer(args.host, args.port, args.contacts, args.latency, args.error_rate, args.seed,
+                                args.compression)
+    print("Serving fake providers on %s" % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
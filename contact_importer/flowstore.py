@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+""" Stores for the state of OAuth1 flows between their steps
+
+The Yahoo flow needs the request token secret of get_request_token again
+when the user comes back from Yahoo. A flow store keeps it keyed by the
+request token, so the callback can be handled by any process::
+
+    importer = YahooContactImporter(client_id, client_secret, redirect_url,
+                                    flow_store=SQLiteFlowStore("/var/lib/app/flows.db"))
+    flow = importer.start_flow()  # saved in the store
+    # ... in the callback, possibly on another node
+    flow = importer.resume_flow(oauth_token, oauth_verifier)
+
+Entries expire after `ttl` seconds so abandoned flows do not pile up, and
+are removed when read so a callback cannot be replayed.
+"""
+import heapq
+import json
+import threading
+from time import time
+
+from ._sqlite import ThreadLocalConnection
+
+# Yahoo request tokens are valid for an hour
+DEFAULT_TTL = 3600
+
+
+class FlowNotFound(KeyError):
+    """ Raised when a flow is unknown, expired or already resumed """
+
+
+class FlowStore(object):
+    """ Base class of the flow stores, states are dicts of JSON values """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+
+    def put(self, key, state, ttl=None):
+        raise NotImplementedError("Not implemented")
+
+    def get(self, key):
+        """ State stored under `key`, None when it is missing or expired """
+        raise NotImplementedError("Not implemented")
+
+    def pop(self, key):
+        """ Like get, removing the state from the store """
+        raise NotImplementedError("Not implemented")
+
+
+class MemoryFlowStore(FlowStore):
+    """ Flow store local to the process, for single node deployments and tests """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        super(MemoryFlowStore, self).__init__(ttl)
+        self._lock = threading.Lock()
+        self._states = {}
+        # (expires, key) of every put, purged lazily
+        self._expiry = []
+
+    def put(self, key, state, ttl=None):
+        expires = time() + (ttl or self.ttl)
+        with self._lock:
+            self._purge()
+            self._states[key] = (expires, state)
+            heapq.heappush(self._expiry, (expires, key))
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def pop(self, key):
+        with self._lock:
+            state = self._lookup(key)
+            self._states.pop(key, None)
+            return state
+
+    def __len__(self):
+        with self._lock:
+            self._purge()
+            return len(self._states)
+
+    def _lookup(self, key):
+        entry = self._states.get(key)
+        if entry is None or entry[0] <= time():
+            return None
+        return entry[1]
+
+    def _purge(self):
+        now = time()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, key = heapq.heappop(self._expiry)
+            entry = self._states.get(key)
+            # the key may have been put again since
+            if entry is not None and entry[0] == expires:
+                del self._states[key]
+
+
+class SQLiteFlowStore(FlowStore, ThreadLocalConnection):
+    """ Flow store in an SQLite database file, shared by the processes of a host """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        super(SQLiteFlowStore, self).__init__(ttl)
+        self.path = path
+        self._open_database(path)
+
+    def _create_schema(self, connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS flows "
+                           "(key TEXT PRIMARY KEY, state TEXT NOT NULL, expires REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS flows_expires ON flows (expires)")
+
+    def put(self, key, state, ttl=None):
+        now = time()
+        with self._connection() as connection:
+            connection.execute("DELETE FROM flows WHERE expires <= ?", (now,))
+            connection.execute("INSERT OR REPLACE INTO flows (key, state, expires) VALUES (?, ?, ?)",
+                               (key, json.dumps(state), now + (ttl or self.ttl)))
+
+    def get(self, key):
+        row = self._connection().execute("SELECT state FROM flows WHERE key = ? AND expires > ?",
+                                         (key, time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop(self, key):
+        with self._connection() as connection:
+            row = connection.execute("SELECT state FROM flows WHERE key = ? AND expires > ?",
+                                     (key, time())).fetchone()
+            deleted = connection.execute("DELETE FROM flows WHERE key = ?", (key,)).rowcount
+        # a concurrent pop may have taken it between the two statements
+        return json.loads(row[0]) if row and deleted else None
+
+
+class RedisFlowStore(FlowStore):
+    """ Flow store on a Redis server, shared by every node
+
+    client -- a redis.StrictRedis, or fakeserver.FakeRedis for local runs
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL, prefix="contact_importer:flow:"):
+        super(RedisFlowStore, self).__init__(ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def put(self, key, state, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(state), ex=max(1, int(ttl or self.ttl)))
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def pop(self, key):
+        pipeline = self.client.pipeline()
+        pipeline.get(self.prefix + key)
+        pipeline.delete(self.prefix + key)
+        value, deleted = pipeline.execute()
+        return json.loads(value) if value is not None and deleted else None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+""" Shared copies of the values repeated across the contacts of an import
+
+Parsers create a new object for every value they read, so a company, city,
+first name or birthday held by thousands of contacts is held thousands of
+times. Importers pass every parsed contact through an InternPool kept for
+the whole import, which replaces the value of each pooled field by the
+first equal value it has seen::
+
+    pool = InternPool(("first_name", "company", "addr_country"))
+    for contact in contacts:
+        pool.contact(contact)
+
+Unlike intern() the pool takes any hashable value (unicode, dates) and goes
+away with the import. See benchmarks/intern_memory.py for the savings.
+"""
+
+# distinct values a pool keeps, later ones are left as they are
+DEFAULT_MAX_VALUES = 100000
+
+
+class InternPool(object):
+    """ Pool of the values of `fields`, for the contacts of one import
+
+    max_values -- distinct values kept, bounding the pool on fields that
+                  turn out to have few repeats
+    """
+
+    def __init__(self, fields, max_values=DEFAULT_MAX_VALUES):
+        self.fields = tuple(fields)
+        self.max_values = max_values
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __call__(self, value):
+        """ The pooled copy of `value` """
+        values = self._values
+        pooled = values.get(value)
+        if pooled is not None:
+            return pooled
+        if len(values) < self.max_values:
+            values[value] = value
+        return value
+
+    def contact(self, contact):
+        """ Replace the values of the pooled fields of `contact`, returns it """
+        values = self._values
+        for field in self.fields:
+            value = contact.get(field)
+            if value is None:
+                continue
+            pooled = values.get(value)
+            if pooled is not None:
+                contact[field] = pooled
+            elif len(values) < self.max_values:
+                values[value] = value
+        return contact
+
+    def contacts(self, contacts):
+        """ contact() for every contact of a list, returns it """
+        for contact in contacts:
+            self.contact(contact)
+        return contacts
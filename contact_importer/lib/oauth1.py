@@ -240,7 +240,8 @@ class OAuthRequest(object):
 
     def get_normalized_http_url(self):
         """Parses the URL and rebuilds it to be scheme://host/path."""
-        parts = urlparse.urlparse(self.http_url)
+        # urlsplit keeps ;parameters as part of the path, they are signed too
+        parts = urlparse.urlsplit(self.http_url)
         scheme, netloc, path = parts[:3]
         # Exclude default port numbers.
         if scheme == 'http' and netloc[-3:] == ':80':
@@ -628,10 +629,10 @@ class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
         # HMAC object.
         try:
             import hashlib # 2.5
-            hashed = hmac.new(key, raw, hashlib.sha1)
+            hashed = hmac.new(_utf8_str(key), _utf8_str(raw), hashlib.sha1)
         except ImportError:
             import sha # Deprecated
-            hashed = hmac.new(key, raw, sha)
+            hashed = hmac.new(_utf8_str(key), _utf8_str(raw), sha)
 
         # Calculate the digest base 64.
         return binascii.b2a_base64(hashed.digest())[:-1]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+""" Instrumentation of the import flow
+
+Importers report every phase of a provider call to a metrics object:
+
+    timings -- "token" (token exchange), "fetch" (contact feed request up to
+               the response headers), "fetch_body" (reading and decompressing
+               the feed body), "decode" (XML/JSON decoding), "parse" (field
+               mapping), "sink" (writing to the sink of import_contacts),
+               "queue" (waiting for the scheduler), "photo" (photo downloads
+               of photos.PhotoFetcher)
+    counters -- "<phase>_bytes" (as transferred), "fetch_bytes_decoded"
+                (after decompression), "contacts", "retries", "parse_errors",
+                "deadline_exceeded", "circuit_opened", "circuit_rejected",
+                "resumed", "rejected", "photos_fetched", "photos_unchanged",
+                "photos_failed"
+
+By default importers use NULL_METRICS, which records nothing and costs one
+method call per phase.
+"""
+import threading
+from time import time
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+
+    def __init__(self, metrics, provider, phase):
+        self.metrics = metrics
+        self.provider = provider
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.timing(self.provider, self.phase, time() - self.start)
+        return False
+
+
+class NullMetrics(object):
+    """ Metrics sink that drops everything """
+    enabled = False
+
+    def timer(self, provider, phase):
+        return _NULL_TIMER
+
+    def timing(self, provider, phase, seconds):
+        pass
+
+    def incr(self, provider, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics(NullMetrics):
+    """ Base class for metrics sinks, subclasses implement timing and incr """
+    enabled = True
+
+    def timer(self, provider, phase):
+        """ Context manager reporting the duration of its block as `phase` """
+        return _Timer(self, provider, phase)
+
+    def timing(self, provider, phase, seconds):
+        raise NotImplementedError("Not implemented")
+
+    def incr(self, provider, name, value=1):
+        raise NotImplementedError("Not implemented")
+
+
+class MetricsCollector(Metrics):
+    """ Keeps every timing and counter in memory, per provider """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+
+    def timing(self, provider, phase, seconds):
+        with self._lock:
+            self.timings.setdefault((provider, phase), []).append(seconds)
+
+    def incr(self, provider, name, value=1):
+        with self._lock:
+            key = (provider, name)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        """ Count, total and max of every timing plus all counters """
+        with self._lock:
+            summary = {}
+            for (provider, phase), values in self.timings.items():
+                summary.setdefault(provider, {})[phase] = {
+                    "count": len(values),
+                    "total": sum(values),
+                    "max": max(values),
+                }
+            for (provider, name), value in self.counters.items():
+                summary.setdefault(provider, {})[name] = value
+            return summary
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.counters = {}
+
+
+class CallbackMetrics(Metrics):
+    """ Adapter forwarding to plain counter/histogram callables
+
+    counter(name, value) and histogram(name, seconds) receive dotted names
+    such as "contact_importer.google.fetch".
+    """
+
+    def __init__(self, counter, histogram, prefix="contact_importer"):
+        self.counter = counter
+        self.histogram = histogram
+        self.prefix = prefix
+
+    def timing(self, provider, phase, seconds):
+        self.histogram("%s.%s.%s" % (self.prefix, provider, phase), seconds)
+
+    def incr(self, provider, name, value=1):
+        self.counter("%s.%s.%s" % (self.prefix, provider, name), value)
+
+
+class StatsdMetrics(CallbackMetrics):
+    """ Adapter for statsd style clients (incr(name, count), timing(name, ms)) """
+
+    def __init__(self, client, prefix="contact_importer"):
+        super(StatsdMetrics, self).__init__(
+            counter=lambda name, value: client.incr(name, value),
+            histogram=lambda name, seconds: client.timing(name, seconds * 1000.0),
+            prefix=prefix,
+        )
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+""" Contact photos, downloaded concurrently into a content-addressed cache
+
+Importers map the photo of a contact (Google's photo link, the picture of a
+Live user, Yahoo's image field) to its "photo" URL. A PhotoFetcher downloads
+them after the import, or batch by batch in front of a sink, over the
+importer's pooled session and with the provider's authentication::
+
+    cache = PhotoCache("/var/cache/app/photos", max_size=512 * 1024 * 1024)
+    fetcher = PhotoFetcher(importer, cache, concurrency=8, per_host=4)
+    contacts = importer.import_contacts(access_token, fields=["email", "photo"])
+    fetcher.fetch(contacts, access_token)
+    path = cache.path(contacts[0]["photo_digest"])
+
+    # or as the photos come in
+    importer.import_contacts(access_token, fields=["email", "photo"],
+                             sink=fetcher.stage(sink, access_token))
+
+Every photo is stored once, in a file named by the SHA-1 of its bytes, and
+the least recently used ones are removed past `max_size`. The cache keeps
+the ETag of every URL: a photo whose etag in the feed (Google) is the cached
+one is not requested at all, the others are requested with If-None-Match,
+and neither a 304 nor a body hashing to a stored photo is written again.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+from time import time
+from urlparse import urlsplit
+
+from ._sqlite import ThreadLocalConnection
+from .deadline import Deadline
+from .scheduler import current_priority, priority
+
+# size of the cache when not given, in bytes
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class PhotoCache(ThreadLocalConnection):
+    """ Photos in the directory `directory`, indexed in an SQLite file in it
+
+    max_size -- bytes of photos kept, the least recently used ones are
+                removed beyond it (down to 90% of it)
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._open_database(os.path.join(directory, "index.sqlite"))
+        self._size = self.size()
+
+    def _create_schema(self, connection):
+        connection.execute("CREATE TABLE IF NOT EXISTS photos "
+                           "(url TEXT PRIMARY KEY, etag TEXT, digest TEXT NOT NULL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS blobs "
+                           "(digest TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)")
+
+    def path(self, digest):
+        """ File of the photo with SHA-1 `digest` """
+        return os.path.join(self.directory, digest[:2], digest[2:])
+
+    def size(self):
+        """ Bytes of photos in the cache """
+        row = self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return row[0]
+
+    def lookup(self, url):
+        """ (etag, digest) of the photo last stored for `url`, None when there is none """
+        return self._connection().execute(
+            "SELECT p.etag, p.digest FROM photos p JOIN blobs b ON b.digest = p.digest WHERE p.url = ?",
+            (url,)).fetchone()
+
+    def touch(self, url, etag, digest):
+        """ Record that `url` still is the photo `digest`, which was used now """
+        with self._connection() as connection:
+            connection.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (time(), digest))
+            connection.execute("INSERT OR REPLACE INTO photos (url, etag, digest) VALUES (?, ?, ?)",
+                               (url, etag, digest))
+
+    def store(self, url, etag, data):
+        """ Store the photo `data` of `url`, returns its digest and whether it was new """
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.path(digest)
+        with self._lock:
+            with self._connection() as connection:
+                added = connection.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, size, accessed) VALUES (?, ?, ?)",
+                    (digest, len(data), time())).rowcount
+                if added:
+                    self._write(path, data)
+                else:
+                    connection.execute("UPDATE blobs SET accessed = ? WHERE digest = ?", (time(), digest))
+                connection.execute("INSERT OR REPLACE INTO photos (url, etag, digest) VALUES (?, ?, ?)",
+                                   (url, etag, digest))
+            if added:
+                self._size += len(data)
+                if self._size > self.max_size:
+                    self._evict()
+        return digest, bool(added)
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # readers never see a partly written photo
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "wb") as photo_file:
+            photo_file.write(data)
+        os.rename(temporary, path)
+
+    def _evict(self):
+        # other processes may share the directory, start from the real size
+        self._size = self.size()
+        target = self.max_size * 0.9
+        with self._connection() as connection:
+            rows = connection.execute("SELECT digest, size FROM blobs ORDER BY accessed").fetchall()
+            for digest, size in rows:
+                if self._size <= target:
+                    break
+                connection.execute("DELETE FROM photos WHERE digest = ?", (digest,))
+                connection.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                try:
+                    os.remove(self.path(digest))
+                except OSError:
+                    pass
+                self._size -= size
+
+
+class PhotoFetcher(object):
+    """ Downloads the photos of contacts into a PhotoCache
+
+    importer -- the importer the contacts came from, its session, breaker,
+                scheduler and metrics are used for the downloads
+    concurrency -- downloads running at once
+    per_host -- downloads running at once against one host
+    """
+
+    def __init__(self, importer, cache, concurrency=8, per_host=4):
+        self.importer = importer
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def fetch(self, contacts, access_token=None, deadline=None):
+        """ Download the photos of `contacts`, setting their "photo_digest"
+
+        Returns the number of photos "fetched", "unchanged" (not requested,
+        304, or already stored) and "failed". Downloads not done by the
+        deadline (seconds or a Deadline) fail.
+        """
+        deadline = Deadline.coerce(deadline)
+        headers = self.importer.photo_headers(access_token) if access_token is not None else {}
+        # contacts sharing a photo URL share one download
+        urls = {}
+        for contact in contacts:
+            url = contact.get("photo")
+            if url:
+                urls.setdefault(url, []).append(contact)
+
+        counts = {"fetched": 0, "unchanged": 0, "failed": 0}
+        if not urls:
+            return counts
+        # the pool threads do not inherit the priority of this one
+        level = current_priority()
+        tasks = [(url, same[0].get("photo_etag"), headers, deadline, level) for url, same in urls.items()]
+        pool = ThreadPool(min(self.concurrency, len(tasks)))
+        try:
+            results = pool.map(self._download, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        metrics = self.importer.metrics
+        for task, (outcome, digest) in zip(tasks, results):
+            url = task[0]
+            counts[outcome] += 1
+            if digest is not None:
+                for contact in urls[url]:
+                    contact["photo_digest"] = digest
+        for outcome, count in counts.items():
+            if count:
+                metrics.incr(self.importer.name, "photos_%s" % outcome, count)
+        return counts
+
+    def stage(self, sink, access_token=None):
+        """ Sink downloading the photos of every batch before writing it to `sink` """
+        return PhotoStage(self, sink, access_token)
+
+    def _host_slot(self, host):
+        with self._lock:
+            semaphore = self._hosts.get(host)
+            if semaphore is None:
+                semaphore = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+        return semaphore
+
+    def _download(self, task):
+        """ (outcome, digest) of one photo URL, requested with the priority of the caller of fetch """
+        url, feed_etag, headers, deadline, level = task
+        with priority(level):
+            return self._download_photo(url, feed_etag, headers, deadline)
+
+    def _download_photo(self, url, feed_etag, headers, deadline):
+        cache = self.cache
+        cached = cache.lookup(url)
+        if cached is not None and feed_etag and cached[0] == feed_etag:
+            cache.touch(url, cached[0], cached[1])
+            return "unchanged", cached[1]
+
+        headers = dict(headers)
+        if cached is not None and cached[0]:
+            headers["If-None-Match"] = cached[0]
+        try:
+            with self._host_slot(urlsplit(url).netloc):
+                response = self.importer._request("GET", url, "photo", deadline, headers=headers)
+        except Exception:
+            return "failed", None
+        if response.status_code == 304 and cached is not None:
+            cache.touch(url, cached[0], cached[1])
+            return "unchanged", cached[1]
+        if response.status_code != 200:
+            return "failed", None
+        digest, added = cache.store(url, response.headers.get("etag") or feed_etag, response.content)
+        return "fetched" if added else "unchanged", digest
+
+
+class PhotoStage(object):
+    """ Sink passing batches on to `sink` once their photos are downloaded """
+
+    def __init__(self, fetcher, sink, access_token=None):
+        self.fetcher = fetcher
+        self.sink = sink
+        self.write_batch = getattr(sink, "write", sink)
+        self.access_token = access_token
+
+    def write(self, batch):
+        self.fetcher.fetch(batch, self.access_token)
+        self.write_batch(batch)
+
+    def flush(self):
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        # the import closes its sink (see contact_importer.sinks), pass it on
+        close = getattr(self.sink, "close", None) or getattr(self.sink, "flush", None)
+        if close is not None:
+            close()
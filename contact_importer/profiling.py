@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+""" Profiling of single import runs
+
+ImportProfiler runs one importer call under cProfile (and tracemalloc when
+available) and writes two files next to each other:
+
+    <path>.prof -- raw cProfile stats, for pstats, snakeviz and friends
+    <path>.json -- report with the hottest functions, the biggest allocations
+                   and the anonymized shape of every contact feed fetched
+
+The anonymized feeds keep the structure, sizes and markup of the original
+responses, so they can be fed straight back into parse_contacts to reproduce
+a pathological address book offline::
+
+    profiler = ImportProfiler("/tmp/import-1234")
+    contacts = profiler.run(importer, "import_contacts", access_token)
+"""
+import cProfile
+import json
+import pstats
+import re
+from StringIO import StringIO
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 without the pytracemalloc backport
+    tracemalloc = None
+
+# Values kept verbatim because parsers dispatch on them and they carry no
+# personal data: Yahoo field types and Google rel/scheme attributes.
+KEEP_KEYS = frozenset(["type", "rel", "primary", "scheme", "term"])
+
+# Parts of Yahoo dates, replaced by a valid date so they parse as before
+DATE_PARTS = {"day": "1", "month": "1", "year": "1970"}
+FIXED_DATE = "1970-01-01"
+
+_LETTERS = re.compile(r"[^\W\d_]", re.UNICODE)
+_DIGITS = re.compile(r"\d", re.UNICODE)
+_DATES = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def anonymize_text(value):
+    """ Replace letters with "x" and digits with "0", keeping punctuation
+
+    ISO dates become FIXED_DATE instead, so they stay valid dates.
+    """
+    return FIXED_DATE.join(_DIGITS.sub("0", _LETTERS.sub("x", part)) for part in _DATES.split(value))
+
+
+def anonymize_json(value, key=None):
+    """ Anonymized copy of a decoded JSON document, keys are left as is """
+    if isinstance(value, dict):
+        return dict((k, anonymize_json(v, k)) for k, v in value.items())
+    if isinstance(value, list):
+        return [anonymize_json(v, key) for v in value]
+    if isinstance(value, basestring):
+        if key in KEEP_KEYS:
+            return value
+        if key in DATE_PARTS:
+            return DATE_PARTS[key]
+        return anonymize_text(value)
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, long, float)):
+        # keep numbers valid as dates (birth_day, birth_month, ...)
+        return 1
+    return value
+
+
+def anonymize_xml(body):
+    """ Anonymized copy of an XML document, tags and attribute names are left as is """
+    from lxml import etree
+
+    parser = etree.XMLParser(recover=True)
+    root = etree.fromstring(body.encode("utf-8") if isinstance(body, unicode) else body, parser)
+    for elm in root.iter():
+        if elm.text:
+            elm.text = anonymize_text(elm.text)
+        if elm.tail:
+            elm.tail = anonymize_text(elm.tail)
+        for name, value in elm.attrib.items():
+            if name not in KEEP_KEYS:
+                elm.attrib[name] = anonymize_text(value)
+    return etree.tostring(root, encoding=unicode)
+
+
+def response_shape(content_type, body):
+    """ Anonymized copy of a contact feed body, a string parse_contacts accepts """
+    content_type = content_type or ""
+    if "json" in content_type:
+        try:
+            return json.dumps(anonymize_json(json.loads(body)))
+        except ValueError:
+            pass
+    if "xml" in content_type:
+        return anonymize_xml(body)
+    return anonymize_text(body.decode("utf-8", "replace"))
+
+
+class ImportProfiler(object):
+    """ Profiles one importer call and writes the report to `path`.prof/.json
+
+    top -- number of functions and allocation sites kept in the report
+    memory -- trace allocations with tracemalloc when it is available
+    """
+
+    def __init__(self, path, top=50, memory=True):
+        self.path = path
+        self.top = top
+        self.memory = memory and tracemalloc is not None
+        self.responses = []
+
+    def record_response(self, phase, response, body):
+        """ Called by the importer for every response it receives, with its decoded body """
+        if phase == "fetch":
+            content_type = response.headers.get("content-type")
+            self.responses.append({
+                "status": response.status_code,
+                "content_type": content_type,
+                "bytes": len(body),
+                "shape": response_shape(content_type, body),
+            })
+
+    def run(self, importer, method, *args, **kwargs):
+        """ Call importer.`method`(*args, **kwargs) under the profiler """
+        self.responses = []
+        profile = cProfile.Profile()
+        importer.profiler = self
+        if self.memory:
+            tracemalloc.start()
+        try:
+            result = profile.runcall(getattr(importer, method), *args, **kwargs)
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if self.memory:
+                tracemalloc.stop()
+            del importer.profiler
+
+        profile.dump_stats("%s.prof" % self.path)
+        report = {
+            "provider": importer.name,
+            "method": method,
+            "profile": self._format_stats(profile),
+            "responses": self.responses,
+        }
+        if self.memory:
+            report["memory"] = {
+                "peak": peak,
+                "top": [
+                    {"where": str(stat.traceback), "size": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:self.top]
+                ],
+            }
+        with open("%s.json" % self.path, "w") as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+        return result
+
+    def _format_stats(self, profile):
+        stream = StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        return stream.getvalue()
@@ -1,3 +1,42 @@
-from .google import GoogleContactImporter
-from .live import LiveContactImporter
-from .yahoo import YahooContactImporter
\ No newline at end of file
+""" Contact importers
+
+Provider modules (and their dependencies such as lxml or the OAuth1 library)
+are only imported when one of their importers is first accessed, so
+processes pay only for the providers they actually use.
+"""
+import sys
+import types
+from importlib import import_module
+
+# importer class name -> module defining it
+IMPORTERS = {
+    "FileContactImporter": "local",
+    "GoogleContactImporter": "google",
+    "LiveContactImporter": "live",
+    "YahooContactImporter": "yahoo",
+    "YahooFlow": "yahoo",
+}
+
+__all__ = sorted(IMPORTERS)
+
+
+class _LazyModule(types.ModuleType):
+    """ Package module resolving importer classes on first attribute access """
+
+    def __getattr__(self, name):
+        module = IMPORTERS.get(name)
+        if module is None:
+            raise AttributeError("module %r has no attribute %r" % (self.__name__, name))
+        importer = getattr(import_module(".%s" % module, self.__name__), name)
+        setattr(self, name, importer)
+        return importer
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(IMPORTERS))
+
+
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(globals())
+# keep the original module alive, Python 2 clears the globals of collected modules
+_module._original = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -1,10 +1,121 @@
+import threading
+from time import time
+
+from ..circuitbreaker import CircuitOpen
+from ..compression import Decompressor, accept_encoding
+from ..deadline import DeadlineExceeded
+from ..interning import InternPool
+from ..metrics import NULL_METRICS
+from ..scheduler import SchedulerFull
+from ..sinks import DEFAULT_BATCH_SIZE, Batcher
+
+# bytes read from the socket at a time when streaming a contact feed
+CHUNK_SIZE = 64 * 1024
+
+# connections kept open per host by the session of an importer
+POOL_SIZE = 20
+
+# profiling.ImportProfiler running in the current thread
+_profiling = threading.local()
+
+
+class ContactList(list):
+    """ Contacts returned by import_contacts
+
+    When the deadline passed before every page was fetched, `complete` is
+    False and `cursor` can be passed back to import_contacts to fetch the rest.
+    When the contacts went to a sink the list is empty and `written` is the
+    number of contacts written to it.
+    """
+    complete = True
+    cursor = None
+    written = None
+
 
 class BaseProvider(object):
+    """ Base class of the importers
+
+    Importers hold configuration only; everything specific to a user is
+    passed to and returned from their methods, so a single instance per
+    provider can be shared by all threads of a process.
+    """
+
+    # Short provider name used in metrics, e.g. "google"
+    name = None
 
-    def __init__(self, client_id, client_secret, redirect_url):
+    # Mapping of endpoint attribute name -> default URL. Subclasses fill it
+    # in and every entry can be overridden by a keyword argument of the same
+    # name, e.g. to point an importer at a local stand-in server.
+    endpoints = {}
+
+    # Contact fields whose values repeat across contacts (names, companies,
+    # places, dates), shared within an import when interning is on
+    interned_fields = ()
+
+    def __init__(self, client_id, client_secret, redirect_url, metrics=None, retries=0, timeout=None,
+                 breaker=None, archive=None, transport=None, scheduler=None, interning=True, **endpoints):
         self.client_id = client_id
         self.client_secret = client_secret
         self.redirect_url = redirect_url
+        self.metrics = metrics or NULL_METRICS
+        # how many times a request failing with a connection error or
+        # a 5xx response is repeated before giving up
+        self.retries = retries
+        # timeout in seconds of every request, None waits forever
+        self.timeout = timeout
+        # circuitbreaker.CircuitBreaker guarding the endpoints, usually
+        # shared by all importers of the process
+        self.breaker = breaker
+        # archive.ResponseArchive keeping the raw contact feeds
+        self.archive = archive
+        # object with the signature of requests.request sending the
+        # requests, e.g. a cassette.Cassette; the pooled session when None
+        self.transport = transport
+        # scheduler.ImportScheduler deciding when requests may run
+        self.scheduler = scheduler
+        # share equal values of interned_fields between the contacts of an import
+        self.interning = interning
+
+        for name, default in self.endpoints.items():
+            setattr(self, name, endpoints.pop(name, None) or default)
+        if endpoints:
+            raise TypeError("Unknown endpoints: %s" % ", ".join(sorted(endpoints)))
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """ requests.Session keeping connections to the provider open between requests
+
+        The importer is shared by all users of a process, so the session
+        never stores cookies.
+        """
+        if self._session is None:
+            import cookielib
+            import requests
+
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def profiler(self):
+        """ Set by profiling.ImportProfiler for the duration of a run in this thread """
+        return getattr(_profiling, "profiler", None)
+
+    @profiler.setter
+    def profiler(self, profiler):
+        _profiling.profiler = profiler
+
+    @profiler.deleter
+    def profiler(self):
+        _profiling.profiler = None
 
     def request_authorization(self, redirect_url):
         raise NotImplementedError("Not implemented")
@@ -17,4 +128,253 @@ class BaseProvider(object):
 
     def parse_contacts(self, access_token):
         raise NotImplementedError("Not implemented")
-    
+
+    def _intern_pool(self, fields=None):
+        """ interning.InternPool for the contacts of one import, None when interning is off """
+        if not self.interning:
+            return None
+        interned = [field for field in self.interned_fields if fields is None or field in fields]
+        return InternPool(interned) if interned else None
+
+    def photo_headers(self, access_token):
+        """ Headers authenticating the download of a contact's photo """
+        return {}
+
+    def _request(self, method, url, phase, deadline=None, **kwargs):
+        """ Send an HTTP request to the provider, reporting it as `phase`
+
+        With a deadline the request times out once it is spent, raising
+        DeadlineExceeded. With a breaker, requests to an endpoint whose
+        circuit is open fail with CircuitOpen without being sent. With a
+        scheduler the request first waits for its turn; a streamed response
+        keeps its slot until _release_slot is called.
+        """
+        if self.scheduler is None:
+            return self._send(method, url, phase, deadline, **kwargs)
+
+        timeout = None
+        if deadline is not None:
+            deadline.check()
+            timeout = deadline.timeout(self.scheduler.timeout)
+        with self.metrics.timer(self.name, "queue"):
+            try:
+                level = self.scheduler.acquire(self.name, self.client_id, timeout=timeout)
+            except SchedulerFull:
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("%s request not scheduled in time" % phase)
+                self.metrics.incr(self.name, "rejected")
+                raise
+        try:
+            response = self._send(method, url, phase, deadline, **kwargs)
+        except BaseException:
+            self.scheduler.release(self.name, level)
+            raise
+        if kwargs.get("stream"):
+            response._scheduler_level = level
+        else:
+            self.scheduler.release(self.name, level)
+        return response
+
+    def _release_slot(self, response):
+        """ Give back the scheduler slot held by a streamed response """
+        level = getattr(response, "_scheduler_level", None)
+        if level is not None:
+            del response._scheduler_level
+            self.scheduler.release(self.name, level)
+
+    def _send(self, method, url, phase, deadline=None, **kwargs):
+        import requests
+
+        metrics = self.metrics
+        transport = self.transport if self.transport is not None else self.session
+        attempt = 0
+        while True:
+            response = None
+            if deadline is not None:
+                deadline.check()
+                kwargs["timeout"] = deadline.timeout(self.timeout)
+            elif self.timeout is not None:
+                kwargs["timeout"] = self.timeout
+            if self.breaker is not None:
+                try:
+                    self.breaker.before(self.name, phase)
+                except CircuitOpen:
+                    metrics.incr(self.name, "circuit_rejected")
+                    raise
+            start = time()
+            with metrics.timer(self.name, phase):
+                try:
+                    response = transport.request(method, url, **kwargs)
+                except requests.Timeout:
+                    if deadline is not None and deadline.expired:
+                        # our budget ran out, not the provider's fault
+                        self._record_call(phase, None, start)
+                        raise DeadlineExceeded("%s request timed out" % phase)
+                    self._record_call(phase, False, start)
+                    if attempt >= self.retries:
+                        raise
+                except requests.ConnectionError:
+                    self._record_call(phase, False, start)
+                    if attempt >= self.retries:
+                        raise
+                except Exception:
+                    self._record_call(phase, None, start)
+                    raise
+            if response is not None:
+                self._record_call(phase, response.status_code < 500, start)
+            if response is not None and (response.status_code < 500 or attempt >= self.retries):
+                break
+            if response is not None:
+                response.close()
+            attempt += 1
+            metrics.incr(self.name, "retries")
+
+        # streamed bodies are accounted for by _iter_body
+        if not kwargs.get("stream"):
+            if metrics.enabled:
+                metrics.incr(self.name, "%s_bytes" % phase, len(response.content))
+            if self.profiler is not None:
+                self.profiler.record_response(phase, response, response.content)
+        return response
+
+    def _record_call(self, phase, ok, start):
+        """ Report the outcome of a request to the breaker, None when there is none """
+        if self.breaker is None:
+            return
+        if ok is None:
+            self.breaker.release(self.name, phase)
+        elif self.breaker.after(self.name, phase, ok, time() - start):
+            self.metrics.incr(self.name, "circuit_opened")
+
+    def circuit_state(self, phase):
+        """ State of the circuit of the "token" or "fetch" endpoint, None without a breaker """
+        if self.breaker is None:
+            return None
+        return self.breaker.state(self.name, phase)
+
+    def _fetch(self, url, headers=None, deadline=None, **kwargs):
+        """ GET a contact feed, returning an iterator over its decompressed body """
+        headers = dict(headers or {})
+        headers["Accept-Encoding"] = accept_encoding()
+        response = self._request("GET", url, "fetch", deadline, headers=headers, stream=True, **kwargs)
+        if response.status_code >= 400:
+            # an error page parsed as an empty feed would end the import early
+            response.close()
+            self._release_slot(response)
+            response.raise_for_status()
+        return self._iter_body(response, "fetch", deadline)
+
+    def _paginate(self, fetch_page, cursor, deadline=None, sink=None, batch_size=DEFAULT_BATCH_SIZE,
+                  checkpoint=None):
+        """ Collect pages until there are no more or the deadline passes
+
+        fetch_page(cursor, deadline) returns the contacts of the page at
+        `cursor` and the cursor of the next page (None on the last page).
+        With a sink (see contact_importer.sinks) the contacts are written to
+        it in batches of `batch_size` as the pages come in, and the sink is
+        closed at the end. With a checkpoint
+        (see contact_importer.checkpoint) the import resumes where the last
+        attempt stopped and saves its progress after every page.
+        """
+        contacts = ContactList()
+        batcher = Batcher(sink, batch_size) if sink is not None else None
+        emitted = 0
+        if checkpoint is not None:
+            saved = checkpoint.load(self.name)
+            if saved is not None:
+                cursor, emitted = saved
+                if batcher is None:
+                    contacts.extend(checkpoint.contacts(self.name))
+                self.metrics.incr(self.name, "resumed")
+        try:
+            while cursor is not None:
+                if deadline is not None and deadline.expired:
+                    break
+                try:
+                    page, next_cursor = fetch_page(cursor, deadline)
+                except DeadlineExceeded:
+                    break
+                if batcher is None:
+                    contacts.extend(page)
+                else:
+                    with self.metrics.timer(self.name, "sink"):
+                        batcher.extend(page)
+                        if checkpoint is not None:
+                            # the checkpoint must not run ahead of the sink: hand
+                            # the batch over and wait until the sink wrote it (a
+                            # ThreadedSink only queues it), raising its errors
+                            batcher.flush()
+                            flush = getattr(sink, "flush", None)
+                            if flush is not None:
+                                flush()
+                cursor = next_cursor
+                emitted += len(page)
+                if checkpoint is not None and cursor is not None:
+                    checkpoint.save(self.name, cursor, emitted, page if batcher is None else None)
+        except BaseException:
+            # the sink belongs to this import, do not leave it (or its thread) behind
+            if batcher is not None:
+                batcher.abort()
+            raise
+
+        if batcher is not None:
+            with self.metrics.timer(self.name, "sink"):
+                batcher.close()
+            contacts.written = batcher.written
+        if checkpoint is not None and cursor is None:
+            checkpoint.clear(self.name)
+
+        if cursor is not None:
+            self.metrics.incr(self.name, "deadline_exceeded")
+            contacts.complete = False
+            contacts.cursor = cursor
+        return contacts
+
+    def _iter_body(self, response, phase, deadline=None):
+        """ Yield the body of a streamed response, decompressing it as it arrives
+
+        Reports "<phase>_bytes" (as transferred), "<phase>_bytes_decoded" and
+        the time spent reading and decompressing as "<phase>_body".
+        """
+        metrics = self.metrics
+        decompressor = Decompressor(response.headers.get("content-encoding"))
+        profiled = [] if self.profiler is not None else None
+        archived = self.archive.recorder() if self.archive is not None else None
+        received = decoded = 0
+        elapsed = 0.0
+        try:
+            stream = response.raw.stream(CHUNK_SIZE, decode_content=False)
+            while True:
+                start = time()
+                try:
+                    chunk = next(stream, None)
+                except Exception:
+                    if deadline is not None and deadline.expired:
+                        raise DeadlineExceeded("%s body timed out" % phase)
+                    raise
+                data = decompressor.decompress(chunk) if chunk is not None else decompressor.flush()
+                elapsed += time() - start
+                if chunk is not None:
+                    received += len(chunk)
+                if data:
+                    decoded += len(data)
+                    if profiled is not None:
+                        profiled.append(data)
+                    if archived is not None:
+                        archived.write(data)
+                    yield data
+                if chunk is None:
+                    break
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("%s body not read in time" % phase)
+        finally:
+            response.close()
+            self._release_slot(response)
+            metrics.timing(self.name, "%s_body" % phase, elapsed)
+            metrics.incr(self.name, "%s_bytes" % phase, received)
+            metrics.incr(self.name, "%s_bytes_decoded" % phase, decoded)
+
+        if profiled is not None:
+            self.profiler.record_response(phase, response, "".join(profiled))
+        if archived is not None:
+            self.archive.append(self.name, phase, response, archived)
@@ -2,9 +2,10 @@
 """ Google Contact Importer module """
 
 from .base import BaseProvider
-from lxml import etree
+from ..deadline import Deadline
+from ..sinks import DEFAULT_BATCH_SIZE
 from urllib import urlencode
-import requests
+from time import time
 import json
 
 AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
@@ -12,13 +13,48 @@ TOKEN_URL = "https://accounts.google.com/o/oauth2/token"
 PERM_SCOPE = "https://www.google.com/m8/feeds/contacts/default/full"
 CONTACTS_URL = "https://www.google.com/m8/feeds/contacts/default/full?max-results=2000"
 
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+GD_NS = "{http://schemas.google.com/g/2005}"
+
+TOTAL_RESULTS_TAG = "{http://a9.com/-/spec/opensearch/1.1/}totalResults"
+ENTRY_TAG = ATOM_NS + "entry"
+EMAIL_TAG = GD_NS + "email"
+PHONE_TAG = GD_NS + "phoneNumber"
+LINK_TAG = ATOM_NS + "link"
+ETAG_ATTR = GD_NS + "etag"
+PHOTO_REL = "http://schemas.google.com/contacts/2008/rel#photo"
+# gd:name parts -> contact field
+NAME_FIELDS = {
+    GD_NS + "fullName": "full_name",
+    GD_NS + "givenName": "first_name",
+    GD_NS + "familyName": "last_name",
+}
+
+# contact field -> element it is read from, in partial response syntax
+FIELD_SELECTORS = {
+    "email": "gd:email",
+    "phone": "gd:phoneNumber",
+    "full_name": "gd:name",
+    "first_name": "gd:name",
+    "last_name": "gd:name",
+    "photo": "link",
+}
+
 
 class GoogleContactImporter(BaseProvider):
 
-    def __init__(self, client_id, client_secret, redirect_url):
-        super(GoogleContactImporter, self).__init__(client_id, client_secret, redirect_url)
-        self.auth_url = AUTH_URL
-        self.token_url = TOKEN_URL
+    name = "google"
+
+    interned_fields = ("first_name", "last_name")
+
+    endpoints = {
+        "auth_url": AUTH_URL,
+        "token_url": TOKEN_URL,
+        "contacts_url": CONTACTS_URL,
+    }
+
+    def __init__(self, client_id, client_secret, redirect_url, **kwargs):
+        super(GoogleContactImporter, self).__init__(client_id, client_secret, redirect_url, **kwargs)
 
     def request_authorization(self):
         auth_params = {
@@ -30,7 +66,7 @@ class GoogleContactImporter(BaseProvider):
 
         return "%s?%s" % (self.auth_url, urlencode(auth_params))
 
-    def request_access_token(self, code):
+    def request_access_token(self, code, deadline=None):
         access_token_params = {
             "code" : code,
             "client_id" : self.client_id,
@@ -42,42 +78,140 @@ class GoogleContactImporter(BaseProvider):
         content_length = len(urlencode(access_token_params))
         access_token_params['content-length'] = str(content_length)
 
-        response = requests.post(self.token_url, data=access_token_params, verify=False)
+        response = self._request("POST", self.token_url, "token", Deadline.coerce(deadline), data=access_token_params,
+                                 verify=False)
         data = json.loads(response.text)
         return data.get('access_token')
 
-    def import_contacts(self, access_token):
+    def import_contacts(self, access_token, fields=None, deadline=None, cursor=None, sink=None,
+                        batch_size=DEFAULT_BATCH_SIZE, checkpoint=None):
+        """ Fetch and parse the contacts of `access_token`
+
+        fields -- contact fields the caller needs, the feed is then cut down
+                  to the matching elements by Google (partial response)
+        deadline -- seconds (or a Deadline) the import may take, the contacts
+                    fetched until then are returned as an incomplete ContactList
+        cursor -- ContactList.cursor of an incomplete import to continue
+        sink -- callable or object with write(batch) receiving the contacts
+                `batch_size` at a time instead of returning them
+        checkpoint -- checkpoint.Checkpoint saving the progress after every
+                      page, resuming from it when an earlier attempt failed
+        """
         authorization_header = {
             "Authorization": "OAuth %s" % access_token, 
             "GData-Version": "3.0"
         }
-        response = requests.get(CONTACTS_URL, headers=authorization_header, verify=False)
-        return self.parse_contacts(response.text)
+        params = {}
+        if fields is not None:
+            selectors = sorted(set(FIELD_SELECTORS[field] for field in fields if field in FIELD_SELECTORS))
+            params["fields"] = "openSearch:totalResults,entry(%s)" % ",".join(selectors or ["id"])
+
+        pool = self._intern_pool(fields)
+
+        def fetch_page(start_index, deadline):
+            params["start-index"] = start_index
+            chunks = self._fetch(self.contacts_url, headers=authorization_header, deadline=deadline, params=params,
+                                 verify=False)
+            contacts, total = self._parse_feed(chunks, fields, pool)
+            next_index = start_index + len(contacts)
+            if total is None or not contacts or next_index > total:
+                return contacts, None
+            return contacts, next_index
+
+        # start-index is 1 based
+        return self._paginate(fetch_page, cursor or 1, Deadline.coerce(deadline), sink, batch_size,
+                              checkpoint)
+
+    def photo_headers(self, access_token):
+        return {
+            "Authorization": "OAuth %s" % access_token,
+            "GData-Version": "3.0"
+        }
 
-    def parse_contacts(self, contacts_xml=None):
+    def parse_contacts(self, contacts_xml=None, fields=None):
+        """ Parse an Atom feed given as a string or an iterable of byte chunks """
+        return self._parse_feed(contacts_xml, fields)[0]
+
+    def _parse_feed(self, contacts_xml, fields=None, pool=None):
+        """ Contacts of a feed and the total number of contacts it announces
+
+        pool -- interning.InternPool the contacts' values are shared through
+        """
+        from lxml import etree
+
+        if isinstance(contacts_xml, unicode):
+            contacts_xml = [contacts_xml.encode("utf-8")]
+        elif isinstance(contacts_xml, str):
+            contacts_xml = [contacts_xml]
+
+        metrics = self.metrics
         parser = etree.XMLParser(ns_clean=True, recover=True, encoding="utf-8")
-        root = etree.fromstring(contacts_xml.encode("utf-8"), parser)
-        elms = root.findall("{http://www.w3.org/2005/Atom}entry")
-        contacts = []
-        
-        for elm in elms:
-            contact = {}
-            children = elm.getchildren()
-            for child in children:
-                if child.tag == "{http://schemas.google.com/g/2005}email":
-                    if not 'email' in contact or child.attrib.get('primary'):
-                        contact['email'] = child.attrib.get('address')
-                elif child.tag == "{http://schemas.google.com/g/2005}phoneNumber":
-                    if not 'phone' in contact:
-                        contact['phone'] = "".join([x for x in child.itertext()])
-                elif child.tag == "{http://schemas.google.com/g/2005}name":
-                    for namechild in child.getchildren():
-                        if namechild.tag == "{http://schemas.google.com/g/2005}fullName":
-                            contact['full_name'] = "".join([x for x in namechild.itertext()])
-                        elif namechild.tag == "{http://schemas.google.com/g/2005}givenName":
-                            contact['first_name'] = "".join([x for x in namechild.itertext()])
-                        elif namechild.tag == "{http://schemas.google.com/g/2005}familyName":
-                            contact['last_name'] = "".join([x for x in namechild.itertext()])
-            contacts.append(contact)
+        elapsed = 0.0
+        # chunks are fed as they arrive, the whole document is never buffered
+        for chunk in contacts_xml:
+            start = time()
+            parser.feed(chunk)
+            elapsed += time() - start
+        start = time()
+        root = parser.close()
+        metrics.timing(self.name, "decode", elapsed + time() - start)
+        if parser.error_log:
+            metrics.incr(self.name, "parse_errors", len(parser.error_log))
+
+        with metrics.timer(self.name, "parse"):
+            contacts = self.extract_contacts(root, fields)
+            if pool is not None:
+                pool.contacts(contacts)
 
+        metrics.incr(self.name, "contacts", len(contacts))
+        total = root.findtext(TOTAL_RESULTS_TAG)
+        return contacts, int(total) if total else None
+
+    def extract_contacts(self, root, fields=None):
+        """ Map the <entry> elements below `root` to contact dicts
+
+        A single pass over the tree, filtered by tag in lxml, visits only the
+        elements we map (only those of `fields`, when given); every <entry>
+        starts a new contact.
+        """
+        if fields is None:
+            tags = (ENTRY_TAG, EMAIL_TAG, PHONE_TAG, LINK_TAG) + tuple(NAME_FIELDS)
+        else:
+            tags = [ENTRY_TAG]
+            if "email" in fields:
+                tags.append(EMAIL_TAG)
+            if "phone" in fields:
+                tags.append(PHONE_TAG)
+            if "photo" in fields:
+                tags.append(LINK_TAG)
+            tags.extend(tag for tag, field in NAME_FIELDS.items() if field in fields)
+
+        contacts = []
+        # elements before the first entry land in a throwaway dict
+        contact = {}
+        for elm in root.iter(*tags):
+            tag = elm.tag
+            if tag == ENTRY_TAG:
+                contact = {}
+                contacts.append(contact)
+            elif tag == EMAIL_TAG:
+                if not 'email' in contact or elm.get('primary'):
+                    contact['email'] = elm.get('address')
+            elif tag == PHONE_TAG:
+                if not 'phone' in contact:
+                    contact['phone'] = _text(elm)
+            elif tag == LINK_TAG:
+                # the photo link of a contact without a photo has no etag
+                if elm.get('rel') == PHOTO_REL and elm.get(ETAG_ATTR):
+                    contact['photo'] = elm.get('href')
+                    contact['photo_etag'] = elm.get(ETAG_ATTR)
+            else:
+                contact[NAME_FIELDS[tag]] = _text(elm)
         return contacts
+
+
+def _text(elm):
+    """ Text content of `elm`, joining descendants only when there are any """
+    if len(elm):
+        return "".join(elm.itertext())
+    return elm.text or ""
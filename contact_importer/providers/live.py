@@ -3,21 +3,61 @@
 from datetime import date
 
 from .base import BaseProvider
+from ..deadline import Deadline
+from ..sinks import DEFAULT_BATCH_SIZE
 from urllib import urlencode
-import requests
 import json
 
 AUTH_URL = "https://login.live.com/oauth20_authorize.srf"
 TOKEN_URL = "https://login.live.com/oauth20_token.srf"
 PERM_SCOPE = "wl.basic,wl.contacts_emails"
 CONTACTS_URL = "https://apis.live.net/v5.0/me/contacts?access_token=%s&limit=1000"
+PICTURE_URL = "https://apis.live.net/v5.0/%s/picture"
+
+# wl.emails type -> contact field, built once instead of for every contact
+EMAIL_KEYS = dict((kind, "email_%s" % kind) for kind in ("preferred", "account", "personal", "business", "other"))
+
+# contact field prefix -> part of the user object it is mapped from
+FIELD_GROUPS = (
+    ("raw", "raw"),
+    ("name", "name"),
+    ("first_name", "name"),
+    ("last_name", "name"),
+    ("company", "work"),
+    ("title", "work"),
+    ("email", "emails"),
+    ("birth_date", "birth"),
+    ("addr_", "addresses"),
+    ("phone", "phones"),
+    ("photo", "user_id"),
+)
+
+
+def field_groups(fields):
+    """ Parts of the user object needed for `fields`, None meaning all of them """
+    if fields is None:
+        return None
+    return set(group for field in fields for prefix, group in FIELD_GROUPS if field.startswith(prefix))
 
 
 class LiveContactImporter(BaseProvider):
+
+    name = "live"
+
+    interned_fields = (
+        "name", "first_name", "last_name", "company", "title", "birth_date",
+        "addr_city", "addr_state", "addr_country", "addr_private_city", "addr_private_state", "addr_private_country",
+    )
+
+    endpoints = {
+        "auth_url": AUTH_URL,
+        "token_url": TOKEN_URL,
+        "contacts_url": CONTACTS_URL,
+        "picture_url": PICTURE_URL,
+    }
+
     def __init__(self, *args, **kwargs):
         super(LiveContactImporter, self).__init__(*args, **kwargs)
-        self.auth_url = AUTH_URL
-        self.token_url = TOKEN_URL
         self.perm_scope = PERM_SCOPE
 
     def request_authorization(self):
@@ -30,7 +70,7 @@ class LiveContactImporter(BaseProvider):
 
         return "%s?%s" % (self.auth_url, urlencode(auth_params))
 
-    def request_access_token(self, code):
+    def request_access_token(self, code, deadline=None):
         access_token_params = {
             "code": code,
             "client_id": self.client_id,
@@ -42,189 +82,244 @@ class LiveContactImporter(BaseProvider):
         content_length = len(urlencode(access_token_params))
         access_token_params['content-length'] = str(content_length)
 
-        response = requests.post(self.token_url, data=access_token_params)
+        response = self._request("POST", self.token_url, "token", Deadline.coerce(deadline), data=access_token_params)
         data = json.loads(response.text)
         return data.get('access_token')
 
-    def import_contacts(self, access_token):
+    def import_contacts(self, access_token, fields=None, deadline=None, cursor=None, sink=None,
+                        batch_size=DEFAULT_BATCH_SIZE, checkpoint=None):
+        """ Fetch and parse the contacts of `access_token`
+
+        fields -- contact fields the caller needs, Live has no partial
+                  responses so the others are just not mapped
+        deadline -- seconds (or a Deadline) the import may take, the contacts
+                    fetched until then are returned as an incomplete ContactList
+        cursor -- ContactList.cursor of an incomplete import to continue
+        sink -- callable or object with write(batch) receiving the contacts
+                `batch_size` at a time instead of returning them
+        checkpoint -- checkpoint.Checkpoint saving the progress after every
+                      page, resuming from it when an earlier attempt failed
+        """
         authorization_header = {
             "Authorization": "OAuth %s" % access_token,
             "GData-Version": "3.0"
         }
-        response = requests.get(CONTACTS_URL % access_token)
-        return self.parse_contacts(response.text)
 
-    def parse_contacts(self, contacts_json):
-        contacts_list = json.loads(contacts_json)
-        contacts = []
+        pool = self._intern_pool(fields)
+
+        def fetch_page(offset, deadline):
+            chunks = self._fetch(self.contacts_url % access_token, deadline=deadline, params={"offset": offset})
+            contacts, paging = self._parse_document(chunks, fields, pool)
+            if not paging.get('next') or not contacts:
+                return contacts, None
+            return contacts, offset + len(contacts)
+
+        return self._paginate(fetch_page, cursor or 0, Deadline.coerce(deadline), sink, batch_size,
+                              checkpoint)
+
+    def parse_contacts(self, contacts_json, fields=None):
+        """ Parse a contacts document given as a string or an iterable of byte chunks """
+        return self._parse_document(contacts_json, fields)[0]
+
+    def _parse_document(self, contacts_json, fields=None, pool=None):
+        """ Contacts of a document and its paging links
+
+        pool -- interning.InternPool the contacts' values are shared through
+        """
+        if not isinstance(contacts_json, basestring):
+            # there is no incremental JSON decoder, only the decompressed
+            # document is held in memory
+            contacts_json = "".join(contacts_json)
+
+        metrics = self.metrics
+        with metrics.timer(self.name, "decode"):
+            contacts_list = json.loads(contacts_json)
+
+        with metrics.timer(self.name, "parse"):
+            groups = field_groups(fields)
+            contacts = [self.parse_contact(c_in, groups) for c_in in contacts_list['data']]
+            if pool is not None:
+                pool.contacts(contacts)
+
+        metrics.incr(self.name, "contacts", len(contacts))
+        return contacts, contacts_list.get('paging') or {}
+
+    def parse_contact(self, c_in, groups=None):
         # c_in is dump of user object
         # (doc addr: http://msdn.microsoft.com/en-us/library/hh243648.aspx#user )
-        for c_in in contacts_list['data']:
-            contact = {}
+        # groups are the parts of it to map (see field_groups), None means all
+        contact = {}
 
+        if groups is None or 'raw' in groups:
             contact['raw'] = c_in
 
-            # First basic fields
+        # First basic fields
+        if groups is None or 'name' in groups:
             contact['name'] = c_in.pop('name', '')
             contact['first_name'] = c_in.pop('first_name', '')
             contact['last_name'] = c_in.pop('last_name', '')
 
-            # work is dump of wl.workprofile object
-            # ( doc addr: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlworkprofile )
-            work = c_in.pop('work', '')
-
-            # If we got any work
-            if work:
-                # this should be an array, but we never meet it have more than one object
-                # and you can not add more than one company name or work position name
-                # in https://people.live.com/
-                work = work[0]
-
-                employer = work.pop('employer', {})
-                # if we got employer in work
-                if employer:
-                    name = employer.pop('name', {})
-                    # we should got name too, but we don't trust external api
-                    if name:
-                        contact['company'] = name
-                position = work.pop('position', {})
-                # if we got position in work
-                if position:
-                    name = position.pop('name', {})
-                    # we should got name too, but we don't trust external api
-                    if name:
-                        contact['title'] = name
-
-
-            # emails is a dump of wl.emails object
-            # (dregionoc addr: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlemails )
-            emails = c_in.pop('emails', {})
-
-            # Set preferred email address
-            if emails and 'preferred' in emails and emails['preferred'] and '@' in emails['preferred']:
-                contact['email'] = emails['preferred']
-
-            # Provide all existing email fields if they're provided
-            if emails:
-                # for every type
-                for k, v in emails.iteritems():
-                    # if v have value and have @ inside
-                    if v and '@' in v:
-                        # if standard email is not set yet
-                        if not contact.get('email'):
-                            # set it
-                            contact['email'] = v
-                        # fill "special" emails
-                        contact['email_%s' % k] = v
-
-            # if there are birth_day, birth_month and birth_year and they are not empty
-            if 'birth_day' in c_in and c_in['birth_day'] and 'birth_month' in c_in and c_in['birth_month'] \
-                    and 'birth_year' in c_in and c_in['birth_year']:
-                # create birth date
-                contact['birth_date'] = date(
-                    year=c_in.pop('birth_year'),
-                    month=c_in.pop('birth_month'),
-                    day=c_in.pop('birth_day'),
-                )
-
-            # addresses is dump of two wl.postaladresses objects "personal" and "business"
-            # (docs addrs: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlpostaladdresses )
-            addresses = c_in.pop('addresses', {})
-
-            # If we got any addresses
-            if addresses:
-                # we will try proccess first business
-                business = addresses.pop('business', {})
-                # but only if it exist
-                # TODO: Change this "if" into extractor function
-                if business:
-                    # if street exists and have value
-                    if 'street' in business and business['street']:
-                        # make street
-                        contact['addr_street'] = business.pop('street')
-                        # if street_2 exists and have value
-                        if 'street_2' in business and business['street_2']:
-                            # we pack two fields into one universal
-                            contact['addr_street'] = "%s\n%s" % (contact['addr_street'], business.pop('street_2'))
-                    # TODO: Change it into loop and map
-                    # if city exists and have value
-                    if 'city' in business and business['city']:
-                        # just fill our field by it
-                        contact['addr_city'] = business.pop('city')
-                    # if state exists and have value
-                    if 'state' in business and business['state']:
-                        # just fill our field by it
-                        contact['addr_state'] = business.pop('state')
-                    # if postal_code exists and have value
-                    if 'postal_code' in business and business['postal_code']:
-                        # just fill our field by it
-                        contact['addr_post_code'] = business.pop('postal_code')
-                    # if region exists and have value
-                    if 'region' in business and business['region']:
-                        # just fill our field by it, in interface it's translated to region/country
-                        contact['addr_country'] = business.pop('region')
-
-                # we will try proccess personal
-                personal = addresses.pop('personal', {})
-                # but only if it exist
-                # TODO: Change this "if" into extractor function
-                if personal:
-                    # if street exists and have value
-                    if 'street' in personal and personal['street']:
-                        # make street
-                        contact['addr_private_street'] = personal.pop('street')
-                        # if street_2 exists and have value
-                        if 'street_2' in personal and personal['street_2']:
-                            # we pack two fields into one universal
-                            contact['addr_private_street'] = "%s\n%s" % (contact['addr_private_street'], personal.pop('street_2'))
-                    # TODO: Change it into loop and map
-                    # if city exists and have value
-                    if 'city' in personal and personal['city']:
-                        # just fill our field by it
-                        contact['addr_private_city'] = personal.pop('city')
-                    # if state exists and have value
-                    if 'state' in personal and personal['state']:
-                        # just fill our field by it
-                        contact['addr_private_state'] = personal.pop('state')
-                    # if postal_code exists and have value
-                    if 'postal_code' in personal and personal['postal_code']:
-                        # just fill our field by it
-                        contact['addr_private_post_code'] = personal.pop('postal_code')
-                    # if region exists and have value
-                    if 'region' in personal and personal['region']:
-                        # just fill our field by it, in interface it's translated to region/country
-                        contact['addr_private_country'] = personal.pop('region')
-
-            # phones is dump of wl.phone_numbers object: three strings personal, business, mobile
-            # (docs addrs: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlphone_numbers )
-            phones = c_in.pop('phones', {})
-
-            # If we got any phones
-            if phones:
-                # if personal exists and have value
-                if 'personal' in phones and phones['personal']:
+        # only contacts who are Live users themselves have a picture
+        # read, not popped: raw keeps user_id as it always did
+        user_id = c_in.get('user_id') if groups is None or 'user_id' in groups else None
+        if user_id:
+            contact['photo'] = self.picture_url % user_id
+
+        # work is dump of wl.workprofile object
+        # ( doc addr: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlworkprofile )
+        work = c_in.pop('work', '') if groups is None or 'work' in groups else ''
+
+        # If we got any work
+        if work:
+            # this should be an array, but we never meet it have more than one object
+            # and you can not add more than one company name or work position name
+            # in https://people.live.com/
+            work = work[0]
+
+            employer = work.pop('employer', {})
+            # if we got employer in work
+            if employer:
+                name = employer.pop('name', {})
+                # we should got name too, but we don't trust external api
+                if name:
+                    contact['company'] = name
+            position = work.pop('position', {})
+            # if we got position in work
+            if position:
+                name = position.pop('name', {})
+                # we should got name too, but we don't trust external api
+                if name:
+                    contact['title'] = name
+
+
+        # emails is a dump of wl.emails object
+        # (dregionoc addr: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlemails )
+        emails = c_in.pop('emails', {}) if groups is None or 'emails' in groups else {}
+
+        # Set preferred email address
+        if emails and 'preferred' in emails and emails['preferred'] and '@' in emails['preferred']:
+            contact['email'] = emails['preferred']
+
+        # Provide all existing email fields if they're provided
+        if emails:
+            # for every type
+            for k, v in emails.iteritems():
+                # if v have value and have @ inside
+                if v and '@' in v:
+                    # if standard email is not set yet
+                    if not contact.get('email'):
+                        # set it
+                        contact['email'] = v
+                    # fill "special" emails, under keys shared by all contacts
+                    contact[EMAIL_KEYS.get(k) or 'email_%s' % k] = v
+
+        # if there are birth_day, birth_month and birth_year and they are not empty
+        if (groups is None or 'birth' in groups) \
+                and 'birth_day' in c_in and c_in['birth_day'] and 'birth_month' in c_in and c_in['birth_month'] \
+                and 'birth_year' in c_in and c_in['birth_year']:
+            # create birth date
+            contact['birth_date'] = date(
+                year=c_in.pop('birth_year'),
+                month=c_in.pop('birth_month'),
+                day=c_in.pop('birth_day'),
+            )
+
+        # addresses is dump of two wl.postaladresses objects "personal" and "business"
+        # (docs addrs: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlpostaladdresses )
+        addresses = c_in.pop('addresses', {}) if groups is None or 'addresses' in groups else {}
+
+        # If we got any addresses
+        if addresses:
+            # we will try proccess first business
+            business = addresses.pop('business', {})
+            # but only if it exist
+            # TODO: Change this "if" into extractor function
+            if business:
+                # if street exists and have value
+                if 'street' in business and business['street']:
+                    # make street
+                    contact['addr_street'] = business.pop('street')
+                    # if street_2 exists and have value
+                    if 'street_2' in business and business['street_2']:
+                        # we pack two fields into one universal
+                        contact['addr_street'] = "%s\n%s" % (contact['addr_street'], business.pop('street_2'))
+                # TODO: Change it into loop and map
+                # if city exists and have value
+                if 'city' in business and business['city']:
+                    # just fill our field by it
+                    contact['addr_city'] = business.pop('city')
+                # if state exists and have value
+                if 'state' in business and business['state']:
+                    # just fill our field by it
+                    contact['addr_state'] = business.pop('state')
+                # if postal_code exists and have value
+                if 'postal_code' in business and business['postal_code']:
+                    # just fill our field by it
+                    contact['addr_post_code'] = business.pop('postal_code')
+                # if region exists and have value
+                if 'region' in business and business['region']:
+                    # just fill our field by it, in interface it's translated to region/country
+                    contact['addr_country'] = business.pop('region')
+
+            # we will try proccess personal
+            personal = addresses.pop('personal', {})
+            # but only if it exist
+            # TODO: Change this "if" into extractor function
+            if personal:
+                # if street exists and have value
+                if 'street' in personal and personal['street']:
+                    # make street
+                    contact['addr_private_street'] = personal.pop('street')
+                    # if street_2 exists and have value
+                    if 'street_2' in personal and personal['street_2']:
+                        # we pack two fields into one universal
+                        contact['addr_private_street'] = "%s\n%s" % (contact['addr_private_street'], personal.pop('street_2'))
+                # TODO: Change it into loop and map
+                # if city exists and have value
+                if 'city' in personal and personal['city']:
                     # just fill our field by it
-                    contact['phone_private'] = phones.pop('personal')
-                # if business exists and have value
-                if 'business' in phones and phones['business']:
+                    contact['addr_private_city'] = personal.pop('city')
+                # if state exists and have value
+                if 'state' in personal and personal['state']:
                     # just fill our field by it
-                    contact['phone'] = phones.pop('business')
-                # if personal exists and have value
-                if 'mobile' in phones and phones['mobile']:
+                    contact['addr_private_state'] = personal.pop('state')
+                # if postal_code exists and have value
+                if 'postal_code' in personal and personal['postal_code']:
                     # just fill our field by it
-                    contact['phone_mobile'] = phones.pop('mobile')
-
-            # New contact have:
-            # name, first_name, last_name, email (strings)
-            # Can have (you must check if they really exist):
-            # email_preferred, email_account, email_personal, email_business (strings)
-            # birth_day (datetime.date)
-            # addr_street, addr_city, addr_state, addr_post_code, addr_country (strings)
-            # addr_private_street, addr_private_city, addr_private_state, (strings)
-            # addr_private_post_code, addr_private_country (strings)
-            # phone_private, phone, phone_mobile (strings)
-            # company, title (strings)
-            # raw (string)
-            contacts.append(contact)
-
-        return contacts
+                    contact['addr_private_post_code'] = personal.pop('postal_code')
+                # if region exists and have value
+                if 'region' in personal and personal['region']:
+                    # just fill our field by it, in interface it's translated to region/country
+                    contact['addr_private_country'] = personal.pop('region')
+
+        # phones is dump of wl.phone_numbers object: three strings personal, business, mobile
+        # (docs addrs: http://msdn.microsoft.com/en-us/library/hh243646.aspx#wlphone_numbers )
+        phones = c_in.pop('phones', {}) if groups is None or 'phones' in groups else {}
+
+        # If we got any phones
+        if phones:
+            # if personal exists and have value
+            if 'personal' in phones and phones['personal']:
+                # just fill our field by it
+                contact['phone_private'] = phones.pop('personal')
+            # if business exists and have value
+            if 'business' in phones and phones['business']:
+                # just fill our field by it
+                contact['phone'] = phones.pop('business')
+            # if personal exists and have value
+            if 'mobile' in phones and phones['mobile']:
+                # just fill our field by it
+                contact['phone_mobile'] = phones.pop('mobile')
+
+        # New contact have:
+        # name, first_name, last_name, email (strings)
+        # Can have (you must check if they really exist):
+        # email_preferred, email_account, email_personal, email_business (strings)
+        # birth_day (datetime.date)
+        # addr_street, addr_city, addr_state, addr_post_code, addr_country (strings)
+        # addr_private_street, addr_private_city, addr_private_state, (strings)
+        # addr_private_post_code, addr_private_country (strings)
+        # phone_private, phone, phone_mobile (strings)
+        # company, title (strings)
+        # raw (string)
+        return contact
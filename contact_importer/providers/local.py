@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+""" Local File Contact Importer module
+
+Imports the address books users export from their mail clients: vCard
+files (.vcf, versions 2.1 to 4.0) and the CSV exports of Google Contacts and
+Outlook. Files are memory-mapped and tokenized line by line, so memory use
+does not depend on their size, and contacts come out in the same shape as
+those of the Google, Live and Yahoo importers.
+"""
+import codecs
+import csv
+import datetime
+import mmap
+import os
+import re
+from itertools import chain, imap
+from time import time
+
+from .base import BaseProvider, ContactList
+from ..sinks import DEFAULT_BATCH_SIZE, Batcher
+
+VCARD_EXTENSIONS = (".vcf", ".vcard")
+
+# vCard property -> contact fields it is mapped to
+VCARD_FIELDS = {
+    "FN": ("full_name",),
+    "N": ("first_name", "last_name"),
+    "EMAIL": ("email",),
+    "TEL": ("phone",),
+    "ORG": ("company",),
+    "TITLE": ("title",),
+    "NOTE": ("notes",),
+    "BDAY": ("birthday",),
+}
+
+# CSV column (lower case) -> contact field, Google Contacts and Outlook exports
+CSV_COLUMNS = {
+    "name": "full_name",
+    "given name": "first_name",
+    "family name": "last_name",
+    "e-mail 1 - value": "email",
+    "phone 1 - value": "phone",
+    "organization 1 - name": "company",
+    "organization 1 - title": "title",
+    "notes": "notes",
+    "birthday": "birthday",
+    "first name": "first_name",
+    "last name": "last_name",
+    "e-mail address": "email",
+    "mobile phone": "phone",
+    "business phone": "phone",
+    "home phone": "phone",
+    "company": "company",
+    "job title": "title",
+}
+
+_VCARD_ESCAPES = re.compile(r"\\(.)")
+# separator of structured values (N, ORG), unless escaped
+_COMPONENTS = re.compile(r"(?<!\\);")
+_QP_ESCAPES = re.compile(r"=([0-9A-Fa-f]{2})")
+_BIRTHDAY_FORMATS = ("%Y-%m-%d", "%Y%m%d", "%m/%d/%Y", "%d.%m.%Y")
+
+
+def _unescape(value):
+    if "\\" not in value:
+        return value
+    return _VCARD_ESCAPES.sub(lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def _parse_birthday(value):
+    value = value.strip()[:10]
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        # the usual YYYY-MM-DD, without the cost of strptime
+        try:
+            return datetime.datetime(int(value[:4]), int(value[5:7]), int(value[8:]))
+        except ValueError:
+            return None
+    for birthday_format in _BIRTHDAY_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, birthday_format)
+        except ValueError:
+            pass
+    return None
+
+
+def _iter_lines(path):
+    """ Lines of the file at `path`, read through a memory map """
+    with open(path, "rb") as contacts_file:
+        if not os.fstat(contacts_file.fileno()).st_size:
+            return
+        mapped = mmap.mmap(contacts_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            readline = mapped.readline
+            line = readline()
+            if line.startswith("\xef\xbb\xbf"):
+                line = line[3:]
+            while line:
+                yield line
+                line = readline()
+        finally:
+            mapped.close()
+
+
+class FileContactImporter(BaseProvider):
+    """ Importer for vCard and CSV address book exports
+
+    No OAuth is involved, the client arguments are accepted only for the
+    importer registry and ignored.
+
+    encoding -- character set of files that do not declare one
+    """
+
+    name = "file"
+
+    interned_fields = ("first_name", "last_name", "company", "title", "birthday")
+
+    def __init__(self, client_id=None, client_secret=None, redirect_url=None, encoding="utf-8", **kwargs):
+        super(FileContactImporter, self).__init__(client_id, client_secret, redirect_url, **kwargs)
+        self.encoding = encoding
+
+    def import_contacts(self, path, fields=None, sink=None, batch_size=DEFAULT_BATCH_SIZE):
+        """ Parse the vCard or CSV file at `path`
+
+        fields -- contact fields the caller needs, the others are not mapped
+        sink -- callable or object with write(batch) receiving the contacts
+                `batch_size` at a time instead of returning them
+        """
+        contacts = ContactList()
+        if sink is None:
+            contacts.extend(self.iter_contacts(path, fields))
+        else:
+            batcher = Batcher(sink, batch_size)
+            try:
+                batcher.extend(self.iter_contacts(path, fields))
+            except BaseException:
+                batcher.abort()
+                raise
+            batcher.close()
+            contacts.written = batcher.written
+        return contacts
+
+    def iter_contacts(self, path, fields=None):
+        """ Contacts of the file at `path`, one at a time """
+        lines = _iter_lines(path)
+        first = next(lines, "")
+        lines = chain((first,), lines)
+        if path.lower().endswith(VCARD_EXTENSIONS) or first.lstrip().upper().startswith("BEGIN:VCARD"):
+            contacts = self._timed(self.parse_vcards(lines, fields))
+        else:
+            contacts = self._timed(self.parse_csv(lines, fields))
+        pool = self._intern_pool(fields)
+        return contacts if pool is None else imap(pool.contact, contacts)
+
+    def parse_contacts(self, contacts_data, fields=None):
+        """ Parse a vCard or CSV document given as a string """
+        if isinstance(contacts_data, unicode):
+            contacts_data = contacts_data.encode(self.encoding)
+        if contacts_data.startswith("\xef\xbb\xbf"):
+            contacts_data = contacts_data[3:]
+        lines = iter(contacts_data.splitlines(True))
+        if contacts_data.lstrip().upper().startswith("BEGIN:VCARD"):
+            return list(self._timed(self.parse_vcards(lines, fields)))
+        return list(self._timed(self.parse_csv(lines, fields)))
+
+    def _timed(self, contacts):
+        # reading and parsing are interleaved, report them together as "parse"
+        metrics = self.metrics
+        elapsed = 0.0
+        count = 0
+        try:
+            while True:
+                start = time()
+                contact = next(contacts, None)
+                elapsed += time() - start
+                if contact is None:
+                    break
+                count += 1
+                yield contact
+        finally:
+            metrics.timing(self.name, "parse", elapsed)
+            metrics.incr(self.name, "contacts", count)
+
+    def parse_vcards(self, lines, fields=None):
+        """ Contacts of the vCards in an iterable of lines """
+        wanted = None
+        if fields is not None:
+            wanted = set(prop for prop, prop_fields in VCARD_FIELDS.items() if set(prop_fields) & set(fields))
+
+        card = None
+        for line in _unfold(lines):
+            name, sep, value = line.partition(":")
+            if not sep:
+                continue
+            params = name.split(";")
+            prop = params[0].upper()
+            if "." in prop:
+                # drop the group, e.g. item1.EMAIL
+                prop = prop.rsplit(".", 1)[1]
+            if prop == "BEGIN":
+                card = {}
+            elif card is None:
+                continue
+            elif prop == "END":
+                if fields is not None:
+                    for field in list(card):
+                        if field not in fields:
+                            del card[field]
+                yield card
+                card = None
+            elif prop in VCARD_FIELDS and (wanted is None or prop in wanted):
+                self._vcard_property(card, prop, params[1:], value)
+
+    def _vcard_property(self, card, prop, params, value):
+        """ Map one property of a vCard to the contact being built """
+        encoding = self.encoding
+        preferred = False
+        for param in params:
+            key, _, param_value = param.partition("=")
+            key = key.upper()
+            param_value = param_value.strip('"')
+            if key == "ENCODING" and param_value.upper() == "QUOTED-PRINTABLE" or key == "QUOTED-PRINTABLE":
+                value = _QP_ESCAPES.sub(lambda match: chr(int(match.group(1), 16)), value)
+            elif key == "CHARSET":
+                encoding = param_value
+            elif key == "PREF" or "PREF" in param_value.upper().split(","):
+                preferred = True
+        try:
+            value = _decoder(encoding)(value)[0]
+        except (LookupError, UnicodeDecodeError):
+            value = _decoder(self.encoding)(value, "replace")[0]
+
+        if prop == "N":
+            parts = [_unescape(part) for part in _COMPONENTS.split(value)] + ["", ""]
+            card.setdefault("last_name", parts[0])
+            card.setdefault("first_name", parts[1])
+        elif prop == "BDAY":
+            birthday = _parse_birthday(value)
+            if birthday is not None:
+                card["birthday"] = birthday
+            else:
+                self.metrics.incr(self.name, "parse_errors")
+        else:
+            if prop == "ORG":
+                # organization name;unit;...
+                value = _COMPONENTS.split(value)[0]
+            value = _unescape(value)
+            field = VCARD_FIELDS[prop][0]
+            if value and (field not in card or preferred and prop in ("EMAIL", "TEL")):
+                card[field] = value
+
+    def parse_csv(self, lines, fields=None):
+        """ Contacts of a Google Contacts or Outlook CSV export in an iterable of lines """
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+        # (column index, field), the first non-empty column of a field wins
+        columns = []
+        for index, column in enumerate(header):
+            field = CSV_COLUMNS.get(column.strip().lower())
+            if field is not None and (fields is None or field in fields):
+                columns.append((index, field))
+
+        encoding = self.encoding
+        for row in reader:
+            contact = {}
+            for index, field in columns:
+                if index < len(row) and row[index] and field not in contact:
+                    value = row[index].decode(encoding, "replace")
+                    if field == "birthday":
+                        value = _parse_birthday(value)
+                        if value is None:
+                            self.metrics.incr(self.name, "parse_errors")
+                            continue
+                    contact[field] = value
+            if contact:
+                yield contact
+
+
+def _unfold(lines):
+    """ Content lines of a vCard, joining folded lines and quoted-printable soft breaks """
+    pending = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if pending is not None:
+            if line[:1] in (" ", "\t"):
+                pending += line[1:]
+                continue
+            if pending.endswith("=") and "QUOTED-PRINTABLE" in pending.partition(":")[0].upper():
+                pending = pending[:-1] + line
+                continue
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+
+_decoders = {}
+
+
+def _decoder(encoding):
+    """ Decoding function of `encoding`, looked up once """
+    decoder = _decoders.get(encoding)
+    if decoder is None:
+        decoder = _decoders[encoding] = codecs.lookup(encoding).decode
+    return decoder
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+""" Registry of importers keyed by provider name
+
+Besides the bundled providers the registry picks up every importer
+advertised by an installed distribution under the "contact_importer.providers"
+entry point group, e.g. in setup.py::
+
+    entry_points={
+        "contact_importer.providers": [
+            "carddav = carddav_importer:CardDAVContactImporter",
+        ],
+    }
+
+Importer classes are only imported when first looked up, and configured
+importer instances are cached, so dispatching many jobs by name does not
+resolve classes or rebuild importers over and over::
+
+    importer = get_importer("google", client_id, client_secret, redirect_url)
+"""
+import threading
+from importlib import import_module
+
+ENTRY_POINT_GROUP = "contact_importer.providers"
+
+BUILTIN_PROVIDERS = {
+    "file": "contact_importer.providers.local:FileContactImporter",
+    "google": "contact_importer.providers.google:GoogleContactImporter",
+    "live": "contact_importer.providers.live:LiveContactImporter",
+    "yahoo": "contact_importer.providers.yahoo:YahooContactImporter",
+}
+
+
+def _resolve(spec):
+    """ Turn a class, an entry point or a "module:Class" string into a class """
+    if isinstance(spec, basestring):
+        module, _, attr = spec.partition(":")
+        return getattr(import_module(module), attr)
+    if hasattr(spec, "load") and not isinstance(spec, type):
+        return spec.load()
+    return spec
+
+
+class ProviderRegistry(object):
+    """ Maps provider names to importer classes and caches configured importers
+
+    entry_points -- also load importers from the `group` entry point group
+    """
+
+    def __init__(self, group=ENTRY_POINT_GROUP, entry_points=True):
+        self.group = group
+        self._specs = dict(BUILTIN_PROVIDERS)
+        # names registered explicitly, these win over entry points
+        self._registered = set()
+        self._classes = {}
+        self._importers = {}
+        self._lock = threading.Lock()
+        self._entry_points_loaded = not entry_points
+
+    def register(self, name, importer):
+        """ Register an importer class (or a "module:Class" string) under `name` """
+        with self._lock:
+            self._specs[name] = importer
+            self._registered.add(name)
+            self._classes.pop(name, None)
+            for key in [key for key in self._importers if key[0] == name]:
+                del self._importers[key]
+
+    def names(self):
+        self._load_entry_points()
+        return sorted(self._specs)
+
+    def get_class(self, name):
+        """ Importer class registered under `name` """
+        importer_class = self._classes.get(name)
+        if importer_class is None:
+            self._load_entry_points()
+            try:
+                spec = self._specs[name]
+            except KeyError:
+                raise KeyError("Unknown provider: %s" % name)
+            importer_class = self._classes[name] = _resolve(spec)
+        return importer_class
+
+    def get(self, name, client_id, client_secret, redirect_url, **kwargs):
+        """ Configured importer for `name`, built once per distinct configuration
+
+        Importers keep no per-user state, so the cached instance is shared by
+        all users; YahooContactImporter keeps each authorization in the
+        YahooFlow returned by start_flow().
+        """
+        try:
+            key = (name, client_id, client_secret, redirect_url, tuple(sorted(kwargs.items())))
+            importer = self._importers.get(key)
+        except TypeError:
+            # unhashable configuration, nothing to cache it by
+            return self.create(name, client_id, client_secret, redirect_url, **kwargs)
+
+        if importer is None:
+            importer = self.create(name, client_id, client_secret, redirect_url, **kwargs)
+            with self._lock:
+                importer = self._importers.setdefault(key, importer)
+        return importer
+
+    def create(self, name, client_id, client_secret, redirect_url, **kwargs):
+        """ New importer for `name`, bypassing the cache """
+        return self.get_class(name)(client_id, client_secret, redirect_url, **kwargs)
+
+    def clear(self):
+        """ Drop all cached importers """
+        with self._lock:
+            self._importers.clear()
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        with self._lock:
+            if self._entry_points_loaded:
+                return
+            try:
+                from pkg_resources import iter_entry_points
+            except ImportError:
+                entry_points = []
+            else:
+                entry_points = iter_entry_points(self.group)
+            for entry_point in entry_points:
+                if entry_point.name not in self._registered:
+                    self._specs[entry_point.name] = entry_point
+                    self._classes.pop(entry_point.name, None)
+            self._entry_points_loaded = True
+
+
+registry = ProviderRegistry()
+
+
+def get_importer(name, client_id, client_secret, redirect_url, **kwargs):
+    """ Cached, configured importer for `name` from the default registry """
+    return registry.get(name, client_id, client_secret, redirect_url, **kwargs)
+
+
+def register(name, importer):
+    """ Register an importer under `name` in the default registry """
+    registry.register(name, importer)
@@ -1,16 +1,14 @@
 # -*- coding: utf-8 -*-
 """ Yahoo Contact Importer module """
 import datetime
+from time import time
 
 from .base import BaseProvider
-from ..lib import oauth1 as oauth
+from ..deadline import Deadline
+from ..sinks import DEFAULT_BATCH_SIZE
 from urllib import urlencode
 from urlparse import parse_qs
-from uuid import uuid4 as uuid
 from collections import OrderedDict
-from time import time
-from hashlib import md5
-import requests
 import json
 
 
@@ -19,137 +17,343 @@ REQUEST_AUTH_URL = "https://api.login.yahoo.com/oauth/v2/request_auth"
 TOKEN_URL = "https://api.login.yahoo.com/oauth/v2/get_token"
 CONTACTS_URL = "https://social.yahooapis.com/v1/user/%s/contacts"
 
+# contact field -> Yahoo contact field types it is mapped from
+FIELD_TYPES = {
+    "first_name": ("name",),
+    "last_name": ("name",),
+    "notes": ("note",),
+    "birthday": ("birthday",),
+    "email": ("email", "yahooid"),
+    "phone": ("phone",),
+    "company": ("company",),
+    "title": ("jobTitle",),
+    "photo": ("image",),
+}
+
+
+def field_types(fields):
+    """ Yahoo field types needed for `fields`, None meaning all of them """
+    if fields is None:
+        return None
+    return set(field_type for field in fields for field_type in FIELD_TYPES.get(field, ()))
+
+
+class YahooFlow(object):
+    """ State of one Yahoo authorization, from the request token to the access token
+
+    The importer itself keeps no per-user state, so one instance can serve
+    any number of concurrent flows. Flows are plain values that can be
+    stored between the steps with to_dict/from_dict.
+    """
+    attributes = ("oauth_token", "oauth_token_secret", "oauth_verifier", "oauth_yahoo_guid")
+
+    def __init__(self, oauth_token=None, oauth_token_secret=None, oauth_verifier=None, oauth_yahoo_guid=None):
+        self.oauth_token = oauth_token
+        self.oauth_token_secret = oauth_token_secret
+        self.oauth_verifier = oauth_verifier
+        self.oauth_yahoo_guid = oauth_yahoo_guid
+        # time the request token was fetched, not part of the stored state
+        self.fetched = None
+
+    def to_dict(self):
+        return dict((name, getattr(self, name)) for name in self.attributes)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**dict((name, data.get(name)) for name in cls.attributes))
+
 
 class YahooContactImporter(BaseProvider):
+    """ Yahoo OAuth1 importer
+
+    Every step takes the YahooFlow it belongs to::
+
+        flow = importer.start_flow()
+        redirect(importer.request_authorization(flow))
+        # ... callback with oauth_token and oauth_verifier
+        flow.oauth_verifier = oauth_verifier
+        importer.get_token(flow)
+        contacts = importer.import_contacts(flow)
+
+    With a flow_store (see contact_importer.flowstore) start_flow saves the
+    flow and the callback can be handled by any process with resume_flow.
+
+    Without a flow the steps keep the state on the importer as before
+    (get_request_token, oauth_verifier attribute, ...), which ties the
+    instance to a single user.
+    """
+
+    name = "yahoo"
+
+    interned_fields = ("first_name", "last_name", "company", "title", "birthday")
+
+    endpoints = {
+        "request_token_url": REQUEST_TOKEN_URL,
+        "request_auth_url": REQUEST_AUTH_URL,
+        "token_url": TOKEN_URL,
+        "contacts_url": CONTACTS_URL,
+    }
 
     def __init__(self, *args, **kwargs):
+        # flowstore.FlowStore keeping flows between start_flow and resume_flow
+        self.flow_store = kwargs.pop("flow_store", None)
         super(YahooContactImporter, self).__init__(*args, **kwargs)
-        self.request_token_url = REQUEST_TOKEN_URL
-        self.request_auth_url = REQUEST_AUTH_URL
-        self.token_url = TOKEN_URL
-        self.oauth_timestamp = int(time())
-        self.oauth_nonce = md5("%s%s" % (uuid(), self.oauth_timestamp)).hexdigest()
+        # tokenpool.RequestTokenPool set up by prewarm
+        self.token_pool = None
+
+    def prewarm(self, size=10, max_age=1800):
+        """ Keep `size` request tokens ready for start_flow, fetched in the background
+
+        Tokens older than `max_age` seconds are dropped, see tokenpool.RequestTokenPool.
+        """
+        from ..tokenpool import RequestTokenPool
+
+        if self.token_pool is None:
+            self.token_pool = RequestTokenPool(self._request_token, size, max_age).start()
+        return self.token_pool
+
+    def start_flow(self, deadline=None):
+        """ Get a request token, returning the YahooFlow of a new authorization
+
+        The token comes from the pool when the importer is prewarmed and it
+        is not empty, otherwise it is fetched right away.
+        """
+        flow = None
+        if self.token_pool is not None:
+            flow = self.token_pool.take()
+            if flow is not None and self.flow_store is not None and self._flow_ttl(flow) <= 0:
+                # too old to be stored, the token would expire before the callback
+                flow = None
+            self.metrics.incr(self.name, "token_pool_hits" if flow is not None else "token_pool_misses")
+        if flow is None:
+            flow = self._request_token(deadline)
+        if self.flow_store is not None:
+            self.flow_store.put(flow.oauth_token, flow.to_dict(), self._flow_ttl(flow))
+        return flow
+
+    def _flow_ttl(self, flow):
+        """ Seconds the flow store keeps `flow`, counted from the fetch of its request token """
+        return self.flow_store.ttl - (time() - flow.fetched)
+
+    def _request_token(self, deadline=None):
+        from ..lib import oauth1 as oauth
 
-    def get_request_token(self):
         request_params = dict(
             oauth_consumer_key=self.client_id,
-            oauth_nonce=self.oauth_nonce,
+            oauth_nonce=oauth.generate_nonce(),
             oauth_signature_method="plaintext",
             oauth_signature=self.client_secret + "&",
-            oauth_timestamp=self.oauth_timestamp,
+            oauth_timestamp=oauth.generate_timestamp(),
             oauth_version="1.0",
             oauth_callback=self.redirect_url
         )
 
         request_url = "%s?%s" % (self.request_token_url, urlencode(request_params))
-        response = requests.post(request_url)
+        response = self._request("POST", request_url, "token", Deadline.coerce(deadline))
         query_string = parse_qs(response.text)
-        self.oauth_token = query_string["oauth_token"][0]
-        self.oauth_token_secret = query_string["oauth_token_secret"][0]
+        flow = YahooFlow(oauth_token=query_string["oauth_token"][0],
+                         oauth_token_secret=query_string["oauth_token_secret"][0])
+        flow.fetched = time()
+        return flow
+
+    def resume_flow(self, oauth_token, oauth_verifier):
+        """ Flow started by start_flow for the callback of `oauth_token`, from the flow store
+
+        Raises flowstore.FlowNotFound when it is unknown, expired or already resumed.
+        """
+        from ..flowstore import FlowNotFound
+
+        if self.flow_store is None:
+            raise ValueError("resume_flow needs a flow_store")
+        state = self.flow_store.pop(oauth_token)
+        if state is None:
+            raise FlowNotFound(oauth_token)
+        flow = YahooFlow.from_dict(state)
+        flow.oauth_verifier = oauth_verifier
+        return flow
 
-    def request_authorization(self):
-        request_params = dict(oauth_token=self.oauth_token)
+    def get_request_token(self, deadline=None):
+        """ start_flow keeping the flow state on the importer """
+        flow = self.start_flow(deadline)
+        self.oauth_token = flow.oauth_token
+        self.oauth_token_secret = flow.oauth_token_secret
+        return flow
+
+    def request_authorization(self, flow=None):
+        flow = flow or self
+        request_params = dict(oauth_token=flow.oauth_token)
         return "%s?%s" % (self.request_auth_url, urlencode(request_params))
 
-    def get_token(self):
+    def get_token(self, flow=None, deadline=None):
+        """ Exchange the authorized request token of `flow` for an access token
+
+        The flow (the importer itself when None) is updated and returned.
+        """
+        from ..lib import oauth1 as oauth
+
+        flow = flow or self
         request_params = dict(
             oauth_consumer_key=self.client_id,
             oauth_signature_method="plaintext",
-            oauth_nonce=self.oauth_nonce,
-            oauth_signature=self.client_secret + "&" + self.oauth_token_secret,
-            oauth_timestamp=self.oauth_timestamp,
-            oauth_verifier=self.oauth_verifier,
+            oauth_nonce=oauth.generate_nonce(),
+            oauth_signature=self.client_secret + "&" + flow.oauth_token_secret,
+            oauth_timestamp=oauth.generate_timestamp(),
+            oauth_verifier=flow.oauth_verifier,
             oauth_version="1.0",
-            oauth_token=self.oauth_token
+            oauth_token=flow.oauth_token
         )
         request_url = "%s?%s" % (self.token_url, urlencode(request_params))
-        response = requests.post(request_url)
+        response = self._request("POST", request_url, "token", Deadline.coerce(deadline))
         response_query = parse_qs(response.text)
         
-        self.oauth_token = response_query["oauth_token"][0]
-        self.oauth_token_secret = response_query["oauth_token_secret"][0]
-        self.oauth_yahoo_guid = response_query["xoauth_yahoo_guid"][0]
+        flow.oauth_token = response_query["oauth_token"][0]
+        flow.oauth_token_secret = response_query["oauth_token_secret"][0]
+        flow.oauth_yahoo_guid = response_query["xoauth_yahoo_guid"][0]
+        return flow
 
-    def import_contacts(self):
-        request_url = CONTACTS_URL % self.oauth_yahoo_guid
+    def import_contacts(self, flow=None, fields=None, deadline=None, cursor=None, sink=None,
+                        batch_size=DEFAULT_BATCH_SIZE, checkpoint=None):
+        """ Fetch and parse the contacts of the authorized user
 
-        request_params = dict(
-            oauth_consumer_key=self.client_id,
-            oauth_nonce=self.oauth_nonce,
-            oauth_signature_method="HMAC-SHA1",
-            oauth_timestamp=str(self.oauth_timestamp),
-            oauth_token=self.oauth_token,
-            oauth_version="1.0",
-            count="max",
-            format="json"
-        )
+        flow -- YahooFlow holding the access token, the importer itself when None
+        fields -- contact fields the caller needs, Yahoo then only returns
+                  the matching field types (out matrix parameter)
+        deadline -- seconds (or a Deadline) the import may take, the contacts
+                    fetched until then are returned as an incomplete ContactList
+        cursor -- ContactList.cursor of an incomplete import to continue
+        sink -- callable or object with write(batch) receiving the contacts
+                `batch_size` at a time instead of returning them
+        checkpoint -- checkpoint.Checkpoint saving the progress after every
+                      page, resuming from it when an earlier attempt failed
+        """
+        from ..lib import oauth1 as oauth
 
-        request_params_new = OrderedDict(sorted(request_params.items(), key=lambda t: t[0]))
+        flow = flow or self
+        request_url = self.contacts_url % flow.oauth_yahoo_guid
+        # with a sink, pages of a batch keep memory bounded
+        count = str(batch_size) if sink is not None else "max"
+        types = field_types(fields)
+        if types is not None:
+            request_url = "%s;out=%s" % (request_url, ",".join(sorted(types)))
 
         consumer = oauth.OAuthConsumer(key=self.client_id, secret=self.client_secret)
-        token = oauth.OAuthToken(key=self.oauth_token, secret=self.oauth_token_secret)
-        request = oauth.OAuthRequest(http_method="GET", http_url=request_url, parameters=request_params)
-        signature = request.build_signature(oauth.OAuthSignatureMethod_HMAC_SHA1(), consumer, token)
+        token = oauth.OAuthToken(key=flow.oauth_token, secret=flow.oauth_token_secret)
+
+        pool = self._intern_pool(fields)
+
+        def fetch_page(start, deadline):
+            # every page is a separate signed request, it needs its own nonce
+            request_params = dict(
+                oauth_consumer_key=self.client_id,
+                oauth_nonce=oauth.generate_nonce(),
+                oauth_signature_method="HMAC-SHA1",
+                oauth_timestamp=str(oauth.generate_timestamp()),
+                oauth_token=flow.oauth_token,
+                oauth_version="1.0",
+                count=count,
+                format="json",
+                start=str(start)
+            )
+
+            request_params_new = OrderedDict(sorted(request_params.items(), key=lambda t: t[0]))
+
+            request = oauth.OAuthRequest(http_method="GET", http_url=request_url, parameters=request_params)
+            signature = request.build_signature(oauth.OAuthSignatureMethod_HMAC_SHA1(), consumer, token)
+
+            request_params_new['oauth_signature'] = signature
+            request_params_new['count'] = count
+            request_params_new['format'] = "json"
+
+            chunks = self._fetch(request_url, deadline=deadline, params=request_params_new)
+            contacts, page = self._parse_document(chunks, fields, pool)
+            next_start = int(page.get('start', start)) + int(page.get('count', 0))
+            if not page.get('count') or next_start >= int(page.get('total', 0)):
+                return contacts, None
+            return contacts, next_start
+
+        return self._paginate(fetch_page, cursor or 0, Deadline.coerce(deadline), sink, batch_size,
+                              checkpoint)
+
+    def parse_contacts(self, contacts_json, fields=None):
+        """ Parse a contacts document given as a string or an iterable of byte chunks """
+        return self._parse_document(contacts_json, fields)[0]
 
-        request_params_new['oauth_signature'] = signature
-        request_params_new['count'] = "max"
-        request_params_new['format'] = "json"
+    def _parse_document(self, contacts_json, fields=None, pool=None):
+        """ Contacts of a document and its start/count/total paging values
 
-        response = requests.get(request_url, params=request_params_new)
-        return self.parse_contacts(response.text)
+        pool -- interning.InternPool the contacts' values are shared through
+        """
+        if not isinstance(contacts_json, basestring):
+            # there is no incremental JSON decoder, only the decompressed
+            # document is held in memory
+            contacts_json = "".join(contacts_json)
 
-    def parse_contacts(self, contacts_json):
-        contacts = json.loads(contacts_json)
+        metrics = self.metrics
+        with metrics.timer(self.name, "decode"):
+            contacts = json.loads(contacts_json)
         contacts_list = []
 
-        for contact in contacts['contacts']['contact']:
-            parsed_contact = {}
-            for field in contact['fields']:
-                field_type = field['type']
-                field_value = field['value']
+        with metrics.timer(self.name, "parse"):
+            types = field_types(fields)
+            for contact in contacts['contacts']['contact']:
+                parsed_contact = self.parse_contact(contact, types)
+                if parsed_contact:
+                    # New contact have:
+                    # first_name, last_name, email (strings)
+                    # Can have (you must check if they really exist):
+                    # notes, birthday, phone, company
+                    if pool is not None:
+                        pool.contact(parsed_contact)
+                    contacts_list.append(parsed_contact)
 
-                if field_type == "name" and field_value:
-                    parsed_contact['last_name'] = field_value.get('familyName', '')
-                    parsed_contact['first_name'] = field_value.get('givenName', '')
+        metrics.incr(self.name, "contacts", len(contacts_list))
+        return contacts_list, contacts['contacts']
 
-                if field_type == "note" and field_value:
-                    parsed_contact['notes'] = field_value
+    def parse_contact(self, contact, types=None):
+        # types are the field types to map (see field_types), None means all
+        parsed_contact = {}
+        for field in contact['fields']:
+            field_type = field['type']
+            if types is not None and field_type not in types:
+                continue
+            field_value = field['value']
 
-                try:
-                    if field_type == "birthday" and field_value:
-                        day = int(field_value['day'])
-                        month = int(field_value['month'])
-                        year = int(field_value['year'])
-                        parsed_contact["birthday"] = datetime.datetime(year=year, month=month, day=day)
-                except ValueError:
-                    # This can happend, do no stop importing procedure.
-                    pass
-                except TypeError:
-                    # This can happend, do no stop importing procedure.
-                    pass
+            if field_type == "name" and field_value:
+                parsed_contact['last_name'] = field_value.get('familyName', '')
+                parsed_contact['first_name'] = field_value.get('givenName', '')
 
-                if field_type == "email" and field_value:
-                    parsed_contact['email'] = field_value
+            if field_type == "note" and field_value:
+                parsed_contact['notes'] = field_value
 
-                if field_type == "yahooid" and field_value and not "@" in field_value:
-                    parsed_contact['email'] = field_value + "@yahoo.com"
+            try:
+                if field_type == "birthday" and field_value:
+                    day = int(field_value['day'])
+                    month = int(field_value['month'])
+                    year = int(field_value['year'])
+                    parsed_contact["birthday"] = datetime.datetime(year=year, month=month, day=day)
+            except ValueError:
+                # This can happend, do no stop importing procedure.
+                self.metrics.incr(self.name, "parse_errors")
+            except TypeError:
+                # This can happend, do no stop importing procedure.
+                self.metrics.incr(self.name, "parse_errors")
 
-                if field_type == "phone" and field_value:
-                    parsed_contact['phone'] = field_value
+            if field_type == "email" and field_value:
+                parsed_contact['email'] = field_value
 
-                if field_type == "company" and field_value:
-                    parsed_contact['company'] = field_value
+            if field_type == "yahooid" and field_value and not "@" in field_value:
+                parsed_contact['email'] = field_value + "@yahoo.com"
 
-                if field_type == "jobTitle" and field_value:
-                    parsed_contact['title'] = field_value
+            if field_type == "phone" and field_value:
+                parsed_contact['phone'] = field_value
 
-            if parsed_contact:
-                # New contact have:
-                # first_name, last_name, email (strings)
-                # Can have (you must check if they really exist):
-                # notes, birthday, phone, company
-                contacts_list.append(parsed_contact)
+            if field_type == "company" and field_value:
+                parsed_contact['company'] = field_value
 
-        return contacts_list
+            if field_type == "jobTitle" and field_value:
+                parsed_contact['title'] = field_value
 
+            if field_type == "image" and isinstance(field_value, dict) and field_value.get('imageUrl'):
+                parsed_contact['photo'] = field_value['imageUrl']
 
+        return parsed_contact
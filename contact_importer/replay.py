@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+""" Re-parse archived contact feeds with the current parsers
+
+Feeds every body of a ResponseArchive through the parse_contacts of its
+provider's importer, spread over all cores, and optionally writes the
+contacts out as JSON lines::
+
+    python -m contact_importer.replay /var/lib/app/feeds --provider live --output /tmp/contacts
+
+Every worker process reads the bodies it parses straight from the segment
+files, only index entries and counters travel between processes.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from time import time
+
+from .archive import ResponseArchive, read_body
+
+# importers of the worker process, by provider name
+_importers = {}
+
+
+def _importer(provider):
+    importer = _importers.get(provider)
+    if importer is None:
+        from .providers.registry import registry
+
+        importer = _importers[provider] = registry.get_class(provider)(None, None, None)
+    return importer
+
+
+def replay_task(task):
+    """ Parse the bodies of one batch of index entries, in a worker process
+
+    task -- (segment path, entries, fields, output directory or None)
+    Returns (responses, contacts, bytes, errors).
+    """
+    segment, entries, fields, output = task
+    contacts_count = size = errors = 0
+    out = None
+    if output is not None:
+        name = "%s-%d.jsonl" % (os.path.basename(segment)[:-len(".seg")], entries[0]["offset"])
+        out = open(os.path.join(output, name), "w")
+    try:
+        with open(segment, "rb") as segment_file:
+            for entry in entries:
+                body = read_body(segment_file, entry)
+                size += len(body)
+                try:
+                    contacts = _importer(entry["provider"]).parse_contacts(body, fields=fields)
+                except Exception:
+                    errors += 1
+                    continue
+                contacts_count += len(contacts)
+                if out is not None:
+                    for contact in contacts:
+                        out.write(json.dumps(contact, default=str) + "\n")
+    finally:
+        if out is not None:
+            out.close()
+    return len(entries), contacts_count, size, errors
+
+
+def replay(archive, provider=None, fields=None, output=None, processes=None, batch=200):
+    """ Re-parse the bodies of `archive` (a ResponseArchive or its path) in `processes` workers
+
+    Returns a dict of totals: responses, contacts, bytes, errors, seconds.
+    """
+    if not isinstance(archive, ResponseArchive):
+        archive = ResponseArchive(archive)
+    if output is not None and not os.path.isdir(output):
+        os.makedirs(output)
+
+    tasks = []
+    for segment in archive.segments():
+        entries = archive.entries(segment, provider)
+        for start in range(0, len(entries), batch):
+            tasks.append((segment, entries[start:start + batch], fields, output))
+
+    totals = {"responses": 0, "contacts": 0, "bytes": 0, "errors": 0}
+    started = time()
+    pool = multiprocessing.Pool(processes)
+    try:
+        for responses, contacts, size, errors in pool.imap_unordered(replay_task, tasks):
+            totals["responses"] += responses
+            totals["contacts"] += contacts
+            totals["bytes"] += size
+            totals["errors"] += errors
+    finally:
+        pool.close()
+        pool.join()
+    totals["seconds"] = time() - started
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-parse archived contact feeds with the current parsers")
+    parser.add_argument("archive", help="archive directory")
+    parser.add_argument("--provider", help="only replay the feeds of this provider")
+    parser.add_argument("--fields", help="comma separated contact fields to map")
+    parser.add_argument("--output", help="directory to write the contacts to, as JSON lines")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--batch", type=int, default=200, help="responses per worker task")
+    args = parser.parse_args(argv)
+
+    fields = args.fields.split(",") if args.fields else None
+    totals = replay(args.archive, args.provider, fields, args.output, args.processes, args.batch)
+    seconds = totals["seconds"] or 1e-9
+    print("%(responses)d responses, %(contacts)d contacts, %(errors)d errors in %(seconds).2fs" % totals)
+    print("%.1f MB/s, %.0f contacts/s" % (totals["bytes"] / seconds / 1024 / 1024, totals["contacts"] / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+""" Scheduling of provider requests between interactive and batch imports
+
+An ImportScheduler shared by the importers of a process limits how many
+requests run against every provider at once and decides who goes next:
+
+    * interactive requests always go before queued batch requests, and batch
+      requests may only use part of the capacity (`batch_concurrency`), so
+      some is left for users waiting on a page;
+    * within a priority class, the importers' client ids share a provider by
+      weighted fair queuing, a client with weight 2 getting twice the turns;
+    * admission control rejects requests with SchedulerFull when too many
+      are queued, or when they waited longer than `timeout`.
+
+Requests are interactive unless made inside ``priority(BATCH)``::
+
+    scheduler = ImportScheduler(concurrency=10, batch_concurrency=6)
+    importer = GoogleContactImporter(client_id, client_secret, redirect_url, scheduler=scheduler)
+
+    with priority(BATCH):
+        importer.import_contacts(access_token)
+"""
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+INTERACTIVE = 0
+BATCH = 1
+
+_context = threading.local()
+
+
+@contextmanager
+def priority(level):
+    """ Make the requests of this thread run with priority `level` """
+    previous = getattr(_context, "priority", INTERACTIVE)
+    _context.priority = level
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def current_priority():
+    return getattr(_context, "priority", INTERACTIVE)
+
+
+class SchedulerFull(RuntimeError):
+    """ Raised when a request is not admitted, or not scheduled in time """
+
+
+class _Waiter(object):
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class _Provider(object):
+    """ Running requests and queues of one provider """
+
+    def __init__(self, levels):
+        self.running = 0
+        self.running_batch = 0
+        # per priority: heap of (tag, sequence, waiter)
+        self.queues = [[] for _ in range(levels)]
+        self.queued = [0] * levels
+        # weighted fair queuing: virtual time per priority, finish tag per client
+        self.virtual_time = [0.0] * levels
+        self.finish = {}
+
+
+class ImportScheduler(object):
+    """ Admission and ordering of the requests of all importers
+
+    concurrency -- requests running at once per provider, an int or a dict
+                   of provider name -> int
+    batch_concurrency -- how many of those batch requests may use, all by default
+    weights -- dict of client id -> weight in the fair queuing, 1 by default
+    max_queued -- requests waiting per provider and priority before new ones
+                  are rejected
+    timeout -- seconds a request may wait for its turn, None waits forever
+    """
+
+    def __init__(self, concurrency=10, batch_concurrency=None, weights=None, max_queued=1000, timeout=None):
+        self.concurrency = concurrency
+        self.batch_concurrency = batch_concurrency
+        self.weights = weights or {}
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._sequence = itertools.count()
+
+    def _limits(self, provider):
+        if isinstance(self.concurrency, dict):
+            limit = self.concurrency.get(provider, 10)
+        else:
+            limit = self.concurrency
+        batch_limit = limit if self.batch_concurrency is None else min(limit, self.batch_concurrency)
+        return limit, batch_limit
+
+    def acquire(self, provider, client_id, level=None, timeout=None):
+        """ Wait for the turn of a request, returns the priority it runs with
+
+        Raises SchedulerFull when the queue is full or `timeout` (default:
+        the scheduler's) passes first.
+        """
+        level = current_priority() if level is None else level
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            state = self._providers.get(provider)
+            if state is None:
+                state = self._providers[provider] = _Provider(BATCH + 1)
+            # nobody queued ahead and a slot free: run right away
+            if not any(state.queued[:level + 1]) and self._can_run(provider, state, level):
+                self._start(state, level)
+                return level
+            if state.queued[level] >= self.max_queued:
+                raise SchedulerFull("%s queue full" % provider)
+
+            weight = self.weights.get(client_id, 1.0)
+            tag = max(state.virtual_time[level], state.finish.get((level, client_id), 0.0)) + 1.0 / weight
+            state.finish[(level, client_id)] = tag
+            waiter = _Waiter()
+            heapq.heappush(state.queues[level], (tag, next(self._sequence), waiter))
+            state.queued[level] += 1
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if not waiter.granted:
+                waiter.cancelled = True
+                state.queued[level] -= 1
+                raise SchedulerFull("%s request not scheduled within %ss" % (provider, timeout))
+        return level
+
+    def release(self, provider, level):
+        """ Called when a request started by acquire is done """
+        with self._lock:
+            state = self._providers[provider]
+            state.running -= 1
+            if level == BATCH:
+                state.running_batch -= 1
+            self._dispatch(provider, state)
+
+    @contextmanager
+    def slot(self, provider, client_id, level=None, timeout=None):
+        """ acquire and release around a block """
+        level = self.acquire(provider, client_id, level, timeout)
+        try:
+            yield level
+        finally:
+            self.release(provider, level)
+
+    def queued(self, provider):
+        """ Number of requests waiting for `provider`, per priority """
+        with self._lock:
+            state = self._providers.get(provider)
+            return list(state.queued) if state is not None else [0] * (BATCH + 1)
+
+    def _can_run(self, provider, state, level):
+        limit, batch_limit = self._limits(provider)
+        if state.running >= limit:
+            return False
+        return level != BATCH or state.running_batch < batch_limit
+
+    def _start(self, state, level):
+        state.running += 1
+        if level == BATCH:
+            state.running_batch += 1
+
+    def _dispatch(self, provider, state):
+        # strict priority: a batch request only starts with no interactive one queued
+        for level, queue in enumerate(state.queues):
+            while queue and self._can_run(provider, state, level):
+                tag, _, waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                state.queued[level] -= 1
+                state.virtual_time[level] = tag
+                waiter.granted = True
+                self._start(state, level)
+                waiter.event.set()
+            if state.queued[level]:
+                return
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+""" Sinks receiving imported contacts in batches
+
+import_contacts(..., sink=sink) pushes the contacts to `sink` as pages are
+parsed instead of returning them all at once. A sink is a callable taking a
+list of contacts, or an object with a write(batch) method and optionally
+flush() and close() methods.
+
+A sink with close() belongs to the import it is passed to: the import
+closes it when it ends, whether it succeeded or failed, so pass a new one
+(e.g. a new ThreadedSink) to every import. A sink with only flush() is
+flushed at the end and can be reused.
+
+Writes are synchronous: a slow sink holds the import back, so at most one
+page and one batch are in memory. ThreadedSink moves the writes to a
+background thread so they overlap with the network reads::
+
+    sink = ThreadedSink(lambda batch: Contact.objects.bulk_create(map(Contact, batch)))
+    importer.import_contacts(access_token, sink=sink, batch_size=1000)
+"""
+import threading
+from Queue import Queue
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class Batcher(object):
+    """ Collects contacts and writes them to `sink` `batch_size` at a time """
+
+    def __init__(self, sink, batch_size=DEFAULT_BATCH_SIZE):
+        self.sink = sink
+        self.write = getattr(sink, "write", sink)
+        self.batch_size = batch_size
+        self.batch = []
+        self.written = 0
+
+    def extend(self, contacts):
+        batch = self.batch
+        for contact in contacts:
+            batch.append(contact)
+            if len(batch) >= self.batch_size:
+                self.flush()
+                batch = self.batch
+
+    def flush(self):
+        """ Write the pending contacts """
+        if self.batch:
+            batch, self.batch = self.batch, []
+            self.write(batch)
+            self.written += len(batch)
+
+    def close(self):
+        """ Write the pending contacts and close the sink, or flush it when it can not be closed """
+        self.flush()
+        close = getattr(self.sink, "close", None) or getattr(self.sink, "flush", None)
+        if close is not None:
+            close()
+
+    def abort(self):
+        """ Drop the pending contacts and close the sink, after the import failed """
+        self.batch = []
+        close = getattr(self.sink, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                # the error of the import is the one reported
+                pass
+
+
+class ThreadedSink(object):
+    """ Writes batches to `sink` in a background thread
+
+    max_pending -- batches queued before write() blocks, bounding memory
+                   and slowing the import down to the pace of the sink
+
+    An exception raised by the sink is raised again by the next write() or
+    flush(), later batches are dropped.
+    """
+
+    def __init__(self, sink, max_pending=2):
+        self.write_batch = getattr(sink, "write", sink)
+        self.sink = sink
+        self._queue = Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="contact-sink")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, batch):
+        self._raise()
+        self._queue.put(batch)
+
+    def flush(self):
+        """ Wait until every queued batch is written """
+        self._queue.join()
+        self._raise()
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        """ Flush and stop the thread """
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._error is None:
+                    self.write_batch(batch)
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+""" Pool of pre-fetched OAuth1 request tokens
+
+Fetching a request token is a blocking round trip at the very start of the
+Yahoo authorization. A RequestTokenPool fetches them ahead of time in a
+background thread and hands them out instantly, dropping the ones that are
+too old to still be accepted::
+
+    importer = YahooContactImporter(client_id, client_secret, redirect_url)
+    importer.prewarm(size=20)
+    flow = importer.start_flow()  # served from the pool
+"""
+import logging
+import threading
+from collections import deque
+from time import time
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class RequestTokenPool(object):
+    """ Keeps up to `size` fresh request tokens fetched with `fetch`
+
+    fetch -- callable returning a new flow (e.g. YahooFlow) with its request token
+    size -- number of tokens kept ready
+    max_age -- seconds after which a token is dropped, well below its lifetime
+               (Yahoo request tokens are valid for an hour)
+    retry_interval -- seconds to wait before fetching again after an error,
+                      doubled on every consecutive error up to max_age
+    """
+
+    def __init__(self, fetch, size=10, max_age=1800, retry_interval=1.0):
+        self.fetch = fetch
+        self.size = size
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._tokens = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def __len__(self):
+        with self._condition:
+            self._evict()
+            return len(self._tokens)
+
+    def take(self):
+        """ A pre-fetched flow, None when the pool is empty """
+        with self._condition:
+            self._evict()
+            flow = self._tokens.popleft()[1] if self._tokens else None
+            self._condition.notify()
+            return flow
+
+    def start(self):
+        """ Start filling the pool in a daemon thread """
+        with self._condition:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name="request-token-pool")
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+
+    def _evict(self):
+        oldest = time() - self.max_age
+        while self._tokens and self._tokens[0][0] <= oldest:
+            self._tokens.popleft()
+
+    def _run(self):
+        errors = 0
+        while True:
+            with self._condition:
+                while self._running:
+                    self._evict()
+                    if len(self._tokens) < self.size:
+                        break
+                    # sleep until a token is taken or the oldest one expires
+                    self._condition.wait(self._tokens[0][0] + self.max_age - time())
+                if not self._running:
+                    return
+
+            try:
+                flow = self.fetch()
+            except Exception:
+                errors += 1
+                logger.warning("Could not fetch a request token", exc_info=True)
+                with self._condition:
+                    if self._running:
+                        self._condition.wait(min(self.retry_interval * 2 ** (errors - 1), self.max_age))
+                continue
+
+            errors = 0
+            with self._condition:
+                self._tokens.append((time(), flow))
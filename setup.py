@@ -29,5 +29,10 @@ setup(name='contact_importer',
       ],
       entry_points="""
       # -*- Entry points: -*-
+      [contact_importer.providers]
+      file = contact_importer.providers.local:FileContactImporter
+      google = contact_importer.providers.google:GoogleContactImporter
+      live = contact_importer.providers.live:LiveContactImporter
+      yahoo = contact_importer.providers.yahoo:YahooContactImporter
       """,
       )
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+""" Tests of contact_importer """
+import shutil
+import tempfile
+import unittest
+
+from contact_importer.fakeserver import FakeProviderServer
+from contact_importer.providers.registry import registry
+
+
+class ProviderTestCase(unittest.TestCase):
+    """ Runs a FakeProviderServer with `contacts` contacts for every test
+
+    When `provider` is set, setUp also builds an importer for it against the
+    server (`importer_class`, or the registered one) and gets its access token.
+    Every test gets a temporary `directory`.
+    """
+    contacts = 20
+    provider = None
+    importer_class = None
+
+    def setUp(self):
+        self.server = FakeProviderServer(contacts=self.contacts).start()
+        self.addCleanup(self.server.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        if self.provider is not None:
+            self.importer = self.make_importer()
+            self.access_token = self.importer.request_access_token("code")
+
+    def make_importer(self, provider=None, importer_class=None, **kwargs):
+        """ Importer of `provider` (the test's one by default) using the fake server """
+        if provider is None:
+            provider = self.provider
+            importer_class = importer_class or self.importer_class
+        importer_class = importer_class or registry.get_class(provider)
+        kwargs.update(self.server.endpoints(provider))
+        return importer_class("id", "secret", "http://localhost/cb", **kwargs)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+""" Archive of raw contact feeds """
+import json
+import os
+import unittest
+
+from contact_importer.archive import ResponseArchive, scrub_url
+from contact_importer.fakeserver import LIVE_TOKEN
+from contact_importer.replay import replay
+
+from tests import ProviderTestCase
+
+
+class ScrubUrlTest(unittest.TestCase):
+
+    def test_credentials_are_removed(self):
+        self.assertEqual(scrub_url("https://apis.live.net/v5.0/me/contacts?access_token=secret&limit=1000&offset=0"),
+                         "https://apis.live.net/v5.0/me/contacts?limit=1000&offset=0")
+        self.assertEqual(scrub_url("https://social.yahooapis.com/v1/user/GUID/contacts"
+                                   "?oauth_token=token&oauth_signature=sig&start=0"),
+                         "https://social.yahooapis.com/v1/user/GUID/contacts?start=0")
+
+    def test_url_without_credentials_is_unchanged(self):
+        url = "https://www.google.com/m8/feeds/contacts/default/full?max-results=2000&start-index=1"
+        self.assertEqual(scrub_url(url), url)
+
+
+class ResponseArchiveTest(ProviderTestCase):
+    contacts = 60
+
+    def setUp(self):
+        super(ResponseArchiveTest, self).setUp()
+        self.archive = ResponseArchive(os.path.join(self.directory, "feeds"), segment_size=4096)
+        self.addCleanup(self.archive.close)
+
+    def import_contacts(self, provider, **kwargs):
+        importer = self.make_importer(provider, archive=self.archive)
+        return importer.import_contacts(importer.request_access_token("code"), **kwargs)
+
+    def test_feeds_are_archived_and_replayed(self):
+        google = self.import_contacts("google")
+        live = self.import_contacts("live")
+        self.archive.close()
+
+        entries = list(self.archive)
+        # Google pages of 25 contacts, one Live document
+        self.assertEqual([entry["provider"] for entry, body in entries], ["google"] * 3 + ["live"])
+        self.assertGreater(len(self.archive.segments()), 1)
+        for entry, body in entries:
+            self.assertEqual(entry["size"], len(body))
+            self.assertNotIn(LIVE_TOKEN, entry["url"])
+
+        totals = replay(self.archive.path, processes=2, batch=1)
+        self.assertEqual((totals["responses"], totals["contacts"], totals["errors"]), (4, 120, 0))
+        self.assertEqual(len(google) + len(live), 120)
+
+    def test_replay_of_one_provider_to_files(self):
+        self.import_contacts("google")
+        self.import_contacts("live")
+        output = os.path.join(self.directory, "contacts")
+        totals = replay(self.archive, provider="live", fields=["email"], output=output, processes=1)
+        self.assertEqual(totals["contacts"], 60)
+
+        contacts = []
+        for name in os.listdir(output):
+            with open(os.path.join(output, name)) as contacts_file:
+                contacts.extend(json.loads(line) for line in contacts_file)
+        self.assertEqual(len(contacts), 60)
+        self.assertTrue(all("email" in contact and "name" not in contact for contact in contacts))
+
+
+if __name__ == "__main__":
+    unittest.main()
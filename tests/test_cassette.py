@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+""" Recording and replaying provider calls """
+import base64
+import json
+import os
+import unittest
+
+from contact_importer.cassette import Cassette, UnmatchedRequest, request_key
+from contact_importer.fakeserver import LIVE_TOKEN
+from contact_importer.providers import LiveContactImporter, YahooContactImporter
+
+from tests import ProviderTestCase
+
+
+class CassetteTest(ProviderTestCase):
+
+    def setUp(self):
+        super(CassetteTest, self).setUp()
+        self.path = os.path.join(self.directory, "cassette.json")
+
+    def run_flows(self, transport):
+        # credentials distinct enough to be looked for in the recording
+        live = LiveContactImporter("client", "client-secret", "http://localhost/cb", transport=transport,
+                                   **self.server.endpoints("live"))
+        contacts = live.import_contacts(live.request_access_token("auth-code"))
+        yahoo = YahooContactImporter("client", "client-secret", "http://localhost/cb", transport=transport,
+                                     **self.server.endpoints("yahoo"))
+        flow = yahoo.start_flow()
+        flow.oauth_verifier = "fakeverifier"
+        yahoo.get_token(flow)
+        return len(contacts), len(yahoo.import_contacts(flow))
+
+    def test_recorded_cassette_holds_no_secrets_and_replays(self):
+        with Cassette(self.path, mode="record") as cassette:
+            recorded = self.run_flows(cassette)
+
+        with open(self.path) as cassette_file:
+            interactions = json.load(cassette_file)["interactions"]
+        recorded_text = "".join(
+            (interaction["key"] + interaction["url"]).encode("utf-8") + base64.b64decode(interaction["body"])
+            for interaction in interactions)
+        for secret in ("client-secret", "auth-code", LIVE_TOKEN, "faketoken", "fakeverifier", "oauth_signature="):
+            self.assertNotIn(secret, recorded_text)
+
+        self.assertEqual(self.run_flows(Cassette(self.path)), recorded)
+
+    def test_unmatched_requests_and_once_mode(self):
+        cassette = Cassette(self.path, mode="once")
+        self.assertEqual(cassette.mode, "record")
+        with cassette:
+            self.run_flows(cassette)
+        self.assertEqual(Cassette(self.path, mode="once").mode, "replay")
+
+        replayed = Cassette(self.path)
+        self.run_flows(replayed)
+        # every recorded response is handed out once
+        self.assertRaises(UnmatchedRequest, self.run_flows, replayed)
+
+    def test_older_cassettes_are_refused(self):
+        with open(self.path, "w") as cassette_file:
+            json.dump({"interactions": []}, cassette_file)
+        self.assertRaises(ValueError, Cassette, self.path)
+        self.assertRaises(ValueError, Cassette, self.path, mode="rewind")
+
+
+class RequestKeyTest(unittest.TestCase):
+
+    def test_volatile_and_secret_parameters_are_ignored(self):
+        first = request_key("post", "http://yahoo/get_token?oauth_nonce=1&oauth_timestamp=2&b=2&a=1",
+                            data={"code": "secret", "grant_type": "authorization_code"})
+        second = request_key("POST", "http://yahoo/get_token?a=1&oauth_nonce=3",
+                             params={"b": "2"}, data="grant_type=authorization_code&code=other")
+        self.assertEqual(first, second)
+        self.assertEqual(first, "POST http://yahoo/get_token?a=1&b=2 grant_type=authorization_code")
+
+
+if __name__ == "__main__":
+    unittest.main()
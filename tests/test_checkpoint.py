@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+""" Resuming imports from a checkpoint """
+import os
+import unittest
+
+from contact_importer.checkpoint import CheckpointStore
+from contact_importer.metrics import MetricsCollector
+from contact_importer.providers import GoogleContactImporter
+from contact_importer.sinks import ThreadedSink
+
+from tests import ProviderTestCase
+
+
+class FailingSink(object):
+    """ Collects batches, failing once on the write number `fail_on` """
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.writes = 0
+        self.contacts = []
+
+    def __call__(self, batch):
+        self.writes += 1
+        if self.writes == self.fail_on:
+            raise IOError("sink unavailable")
+        self.contacts.extend(batch)
+
+
+class FailingImporter(GoogleContactImporter):
+    """ Fails the contact feed request number `fail_on` """
+    fail_on = None
+    fetches = 0
+
+    def _fetch(self, url, headers=None, deadline=None, **kwargs):
+        self.fetches += 1
+        if self.fetches == self.fail_on:
+            raise IOError("connection reset")
+        return super(FailingImporter, self)._fetch(url, headers, deadline, **kwargs)
+
+
+class CheckpointTest(ProviderTestCase):
+    contacts = 200
+    provider = "google"
+
+    def setUp(self):
+        super(CheckpointTest, self).setUp()
+        self.checkpoints = CheckpointStore(os.path.join(self.directory, "checkpoints.db"))
+
+    def test_resumed_import_returns_every_contact(self):
+        metrics = MetricsCollector()
+        importer = self.make_importer(importer_class=FailingImporter, metrics=metrics)
+        importer.fail_on = 3
+        checkpoint = self.checkpoints.job("account")
+        with self.assertRaises(IOError):
+            importer.import_contacts(self.access_token, checkpoint=checkpoint)
+        # two pages of 25 contacts were saved
+        self.assertEqual(checkpoint.load("google"), (51, 50))
+
+        contacts = importer.import_contacts(self.access_token, checkpoint=checkpoint)
+        self.assertTrue(contacts.complete)
+        self.assertEqual(len(set(contact["email"] for contact in contacts)), 200)
+        self.assertEqual(importer.fetches, 3 + 6)
+        self.assertEqual(metrics.counters[("google", "resumed")], 1)
+        self.assertIsNone(checkpoint.load("google"))
+        self.assertEqual(list(checkpoint.contacts("google")), [])
+
+    def test_purge(self):
+        checkpoint = self.checkpoints.job("account")
+        checkpoint.save("google", 26, 25, [{"email": "jane@example.com"}])
+        self.assertEqual(self.checkpoints.purge(3600), 0)
+        self.assertEqual(self.checkpoints.purge(-1), 1)
+        self.assertIsNone(checkpoint.load("google"))
+        self.assertEqual(list(checkpoint.contacts("google")), [])
+
+    def test_threaded_sink_failure_is_not_checkpointed(self):
+        sink = FailingSink(fail_on=2)
+        checkpoint = self.checkpoints.job("account")
+        with self.assertRaises(IOError):
+            self.importer.import_contacts(self.access_token, sink=ThreadedSink(sink), batch_size=100,
+                                          checkpoint=checkpoint)
+
+        result = self.importer.import_contacts(self.access_token, sink=ThreadedSink(sink), batch_size=100,
+                                               checkpoint=checkpoint)
+        self.assertTrue(result.complete)
+        emails = set(contact["email"] for contact in sink.contacts)
+        self.assertEqual(len(emails), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
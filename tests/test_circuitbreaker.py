@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+""" Circuit breakers for provider endpoints """
+import time
+import unittest
+
+from contact_importer.circuitbreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from contact_importer.fakeserver import FakeProviderServer
+from contact_importer.metrics import MetricsCollector
+
+from tests import ProviderTestCase
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_rate=0.5, slow_call=1.0, window=4, min_calls=4, reset_timeout=0.05,
+                                      trial_calls=2)
+
+    def call(self, ok=True, seconds=0.1):
+        self.breaker.before("live", "fetch")
+        return self.breaker.after("live", "fetch", ok, seconds)
+
+    def open(self):
+        for ok in (True, True, False):
+            self.assertFalse(self.call(ok))
+        self.assertTrue(self.call(ok=True, seconds=2.0))
+        self.assertEqual(self.breaker.state("live", "fetch"), OPEN)
+
+    def test_opens_on_failures_and_slow_calls(self):
+        self.open()
+        with self.assertRaises(CircuitOpen) as raised:
+            self.breaker.before("live", "fetch")
+        self.assertGreater(raised.exception.retry_after, 0)
+        # endpoints and providers have circuits of their own
+        self.assertEqual(self.breaker.state("live", "token"), CLOSED)
+        self.assertEqual(self.breaker.state("google", "fetch"), CLOSED)
+
+    def test_needs_min_calls(self):
+        for _ in range(3):
+            self.assertFalse(self.call(ok=False))
+        self.assertEqual(self.breaker.state("live", "fetch"), CLOSED)
+
+    def test_half_open_trials_close_it(self):
+        self.open()
+        time.sleep(0.06)
+        self.assertEqual(self.breaker.state("live", "fetch"), HALF_OPEN)
+        self.breaker.before("live", "fetch")
+        self.breaker.before("live", "fetch")
+        # only trial_calls requests go through at once
+        self.assertRaises(CircuitOpen, self.breaker.before, "live", "fetch")
+        self.breaker.after("live", "fetch", True, 0.1)
+        self.assertEqual(self.breaker.state("live", "fetch"), HALF_OPEN)
+        self.breaker.after("live", "fetch", True, 0.1)
+        self.assertEqual(self.breaker.state("live", "fetch"), CLOSED)
+
+    def test_failed_trial_opens_it_again(self):
+        self.open()
+        time.sleep(0.06)
+        self.assertTrue(self.call(ok=False))
+        self.assertEqual(self.breaker.state("live", "fetch"), OPEN)
+
+    def test_released_trial_is_given_back(self):
+        self.open()
+        time.sleep(0.06)
+        self.breaker.before("live", "fetch")
+        self.breaker.before("live", "fetch")
+        self.breaker.release("live", "fetch")
+        self.breaker.before("live", "fetch")
+
+
+class ImporterBreakerTest(ProviderTestCase):
+
+    def test_failing_endpoint_fails_fast(self):
+        server = FakeProviderServer(contacts=10, error_rate=1.0).start()
+        self.addCleanup(server.stop)
+        metrics = MetricsCollector()
+        breaker = CircuitBreaker(min_calls=3, window=3)
+        importer = self.make_importer("live", metrics=metrics, breaker=breaker)
+        importer.token_url = server.endpoints("live")["token_url"]
+        for _ in range(3):
+            self.assertRaises(ValueError, importer.request_access_token, "code")
+        self.assertEqual(importer.circuit_state("token"), OPEN)
+        self.assertRaises(CircuitOpen, importer.request_access_token, "code")
+        self.assertEqual(metrics.counters[("live", "circuit_opened")], 1)
+        self.assertEqual(metrics.counters[("live", "circuit_rejected")], 1)
+        self.assertEqual(importer.circuit_state("fetch"), CLOSED)
+
+
+if __name__ == "__main__":
+    unittest.main()
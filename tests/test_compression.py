@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+""" Compressed transfer of the contact feeds """
+import unittest
+import zlib
+
+from contact_importer.compression import Decompressor, accept_encoding
+from contact_importer.fakeserver import FakeProviderServer, gzip_body
+from contact_importer.metrics import MetricsCollector
+
+from tests import ProviderTestCase
+
+BODY = "".join('{"email": "contact%d@example.com"}' % i for i in range(2000))
+
+
+def decompress(decompressor, body, size=100):
+    parts = [decompressor.decompress(body[i:i + size]) for i in range(0, len(body), size)]
+    return "".join(parts) + decompressor.flush()
+
+
+class DecompressorTest(unittest.TestCase):
+
+    def test_gzip(self):
+        self.assertEqual(decompress(Decompressor("gzip"), gzip_body(BODY)), BODY)
+
+    def test_deflate_wrapped_and_raw(self):
+        self.assertEqual(decompress(Decompressor("deflate"), zlib.compress(BODY)), BODY)
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.assertEqual(decompress(Decompressor("Deflate"), raw.compress(BODY) + raw.flush()), BODY)
+
+    def test_identity_and_unknown_encodings_pass_through(self):
+        self.assertEqual(decompress(Decompressor(None), BODY), BODY)
+        self.assertEqual(decompress(Decompressor("compress"), BODY), BODY)
+
+    def test_gzip_is_always_offered(self):
+        self.assertIn("gzip", accept_encoding())
+
+
+class CompressedFeedTest(ProviderTestCase):
+    contacts = 200
+
+    def fetch(self, server):
+        metrics = MetricsCollector()
+        importer = self.make_importer("google", metrics=metrics)
+        importer.contacts_url = server.endpoints("google")["contacts_url"]
+        contacts = importer.import_contacts(importer.request_access_token("code"))
+        counters = metrics.counters
+        return contacts, counters[("google", "fetch_bytes")], counters[("google", "fetch_bytes_decoded")]
+
+    def test_feed_is_transferred_compressed(self):
+        plain_server = FakeProviderServer(contacts=self.contacts, compression=False).start()
+        self.addCleanup(plain_server.stop)
+        plain, plain_bytes, plain_decoded = self.fetch(plain_server)
+        gzipped, gzipped_bytes, _ = self.fetch(self.server)
+
+        self.assertEqual([contact["email"] for contact in gzipped], [contact["email"] for contact in plain])
+        self.assertEqual(plain_bytes, plain_decoded)
+        self.assertLess(gzipped_bytes, plain_bytes / 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+""" Imports bounded by a deadline """
+import time
+import unittest
+
+from contact_importer.deadline import Deadline, DeadlineExceeded
+from contact_importer.fakeserver import FakeProviderServer
+
+from tests import ProviderTestCase
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_timeout_fits_in_the_budget(self):
+        deadline = Deadline(10)
+        self.assertLessEqual(deadline.timeout(), 10)
+        self.assertEqual(deadline.timeout(2), 2)
+        self.assertIs(Deadline.coerce(deadline), deadline)
+        self.assertIsNone(Deadline.coerce(None))
+
+    def test_spent_budget_raises(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining(), 0.0)
+        # requests rejects a timeout of 0
+        self.assertRaises(DeadlineExceeded, deadline.timeout)
+        self.assertRaises(DeadlineExceeded, deadline.check)
+
+
+class PartialImportTest(ProviderTestCase):
+    contacts = 200
+
+    def setUp(self):
+        super(PartialImportTest, self).setUp()
+        # 25 contacts a page, 50ms a page
+        self.slow_server = FakeProviderServer(contacts=self.contacts, latency=0.05).start()
+        self.addCleanup(self.slow_server.stop)
+        self.importer = self.make_importer("google")
+        self.importer.contacts_url = self.slow_server.endpoints("google")["contacts_url"]
+        self.access_token = self.importer.request_access_token("code")
+
+    def test_partial_results_and_resume(self):
+        partial = self.importer.import_contacts(self.access_token, deadline=0.12)
+        self.assertFalse(partial.complete)
+        self.assertTrue(0 < len(partial) < 200)
+        self.assertEqual(partial.cursor, len(partial) + 1)
+
+        rest = self.importer.import_contacts(self.access_token, cursor=partial.cursor)
+        self.assertTrue(rest.complete)
+        self.assertIsNone(rest.cursor)
+        emails = [contact["email"] for contact in partial + rest]
+        self.assertEqual(len(set(emails)), 200)
+
+    def test_expired_deadline_returns_nothing(self):
+        contacts = self.importer.import_contacts(self.access_token, deadline=Deadline(0))
+        self.assertEqual(list(contacts), [])
+        self.assertEqual(contacts.cursor, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+""" Changes between two imports of the same address book """
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from contact_importer.diff import SnapshotStore, content_hash, diff, identity_key
+
+
+class DiffTest(unittest.TestCase):
+
+    def test_identity_key(self):
+        self.assertEqual(identity_key({"email": " Jane@Example.com", "phone": "1"}), u"email:jane@example.com")
+        self.assertEqual(identity_key({"phone": "+1 (555) 0100"}), u"phone:15550100")
+        self.assertEqual(identity_key({"first_name": "Jane", "last_name": "Doe"}), u"name:jane doe")
+
+    def test_content_hash(self):
+        contact = {"email": "jane@example.com", "first_name": u"J\xfcrgen", "birthday": datetime.date(1984, 2, 29)}
+        self.assertEqual(content_hash(contact), content_hash(dict(contact, raw={"updated_time": "now"})))
+        self.assertNotEqual(content_hash(contact), content_hash(dict(contact, first_name=u"Jurgen")))
+
+    def test_added_changed_removed(self):
+        jane = {"email": "jane@example.com", "phone": "1"}
+        bob = {"email": "bob@example.com"}
+        carol = {"email": "carol@example.com"}
+        first = diff(None, [jane, bob])
+        self.assertEqual(first.added, [jane, bob])
+        self.assertTrue(first)
+
+        changed_jane = dict(jane, phone="2")
+        changes = diff(first.snapshot, [changed_jane, carol])
+        self.assertEqual(changes.added, [carol])
+        self.assertEqual(changes.changed, [changed_jane])
+        self.assertEqual(changes.removed, [u"email:bob@example.com"])
+        self.assertFalse(diff(changes.snapshot, [changed_jane, carol]))
+
+    def test_duplicate_keys(self):
+        contacts = [{"full_name": "Jane", "phone": ""}, {"full_name": "Jane"}, {"full_name": "Jane", "n": "3"}]
+        snapshot = diff(None, contacts).snapshot
+        self.assertEqual(sorted(snapshot), [u"name:jane", u"name:jane#2", u"name:jane#3"])
+        changes = diff(snapshot, contacts[:2])
+        self.assertEqual((changes.added, changes.changed, changes.removed), ([], [], [u"name:jane#3"]))
+
+    def test_many_duplicates(self):
+        contacts = [{"full_name": "Jane", "n": str(n)} for n in range(5000)]
+        self.assertEqual(len(diff(None, contacts).snapshot), 5000)
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = SnapshotStore(os.path.join(self.directory, "snapshots.db"))
+
+    def test_diff_against_the_last_import(self):
+        contacts = [{"email": "contact%d@example.com" % n} for n in range(100)]
+        self.assertEqual(len(self.store.diff("account", contacts).added), 100)
+        self.assertFalse(self.store.diff("account", contacts))
+        self.assertEqual(len(self.store.diff("other", contacts).added), 100)
+
+        changes = self.store.diff("account", contacts[1:], save=False)
+        self.assertEqual(changes.removed, [u"email:contact0@example.com"])
+        self.assertEqual(len(self.store.load("account")), 100)
+
+        self.store.delete("account")
+        self.assertIsNone(self.store.load("account"))
+
+
+if __name__ == "__main__":
+    unittest.main()
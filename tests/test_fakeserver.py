@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+""" Import flows against the local stand-in server """
+import unittest
+
+from contact_importer.fakeserver import FakeProviderServer
+
+from tests import ProviderTestCase
+
+
+class FakeServerFlowTest(ProviderTestCase):
+    contacts = 120
+
+    def test_google_flow(self):
+        importer = self.make_importer("google")
+        contacts = importer.import_contacts(importer.request_access_token("code"))
+        self.assertEqual(len(contacts), 120)
+        self.assertEqual(len(set(contact["email"] for contact in contacts)), 120)
+
+    def test_live_flow(self):
+        importer = self.make_importer("live")
+        contacts = importer.import_contacts(importer.request_access_token("code"))
+        self.assertEqual(len(contacts), 120)
+
+    def test_yahoo_flow(self):
+        importer = self.make_importer("yahoo")
+        flow = importer.start_flow()
+        flow.oauth_verifier = "fakeverifier"
+        importer.get_token(flow)
+        self.assertEqual(len(importer.import_contacts(flow)), 120)
+
+    def test_errors_are_injected(self):
+        import requests
+
+        server = FakeProviderServer(contacts=10, error_rate=1.0).start()
+        self.addCleanup(server.stop)
+        importer = self.make_importer("google")
+        access_token = importer.request_access_token("code")
+        importer.contacts_url = server.endpoints("google")["contacts_url"]
+        with self.assertRaises(requests.HTTPError):
+            importer.import_contacts(access_token)
+
+
+if __name__ == "__main__":
+    unittest.main()
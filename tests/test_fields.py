@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+""" Fetching only the contact fields the caller needs """
+import unittest
+
+from contact_importer.metrics import MetricsCollector
+
+from tests import ProviderTestCase
+
+
+class FieldsTest(ProviderTestCase):
+    contacts = 40
+
+    def fetched(self, provider, fields):
+        """ Contacts imported from `provider` with `fields`, and the bytes of their feed """
+        metrics = MetricsCollector()
+        importer = self.make_importer(provider, metrics=metrics)
+        if provider == "yahoo":
+            access_token = importer.start_flow()
+            access_token.oauth_verifier = "fakeverifier"
+            importer.get_token(access_token)
+        else:
+            access_token = importer.request_access_token("code")
+        contacts = importer.import_contacts(access_token, fields=fields)
+        return contacts, metrics.counters[(provider, "fetch_bytes_decoded")]
+
+    def check_projection(self, provider, shrinks=True):
+        everything, full_size = self.fetched(provider, None)
+        emails, size = self.fetched(provider, ["email"])
+        self.assertEqual(len(emails), 40)
+        # Live adds the addresses the preferred one was picked from (email_personal, ...)
+        for contact in emails:
+            self.assertEqual([key for key in contact if not key.startswith("email")], [])
+        self.assertEqual([contact["email"] for contact in emails], [contact["email"] for contact in everything])
+        if shrinks:
+            self.assertLess(size, full_size / 2)
+
+    def test_google_partial_response(self):
+        self.check_projection("google")
+
+    def test_yahoo_out_parameter(self):
+        self.check_projection("yahoo")
+
+    def test_live_maps_only_the_fields(self):
+        # Live has no partial response, only the mapping is cut down
+        self.check_projection("live", shrinks=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
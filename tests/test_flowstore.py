@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+""" Stores for the state of OAuth1 flows between their steps """
+import os
+import time
+import unittest
+
+from contact_importer.fakeserver import FakeRedis
+from contact_importer.flowstore import FlowNotFound, MemoryFlowStore, RedisFlowStore, SQLiteFlowStore
+
+from tests import ProviderTestCase
+
+
+class FlowStoreTests(object):
+    """ Tests run against every flow store, mixed into a TestCase """
+
+    # whether expiries below a second are honoured
+    fine_ttl = True
+
+    def make_store(self, ttl=60):
+        raise NotImplementedError("Not implemented")
+
+    def test_pop_removes_the_state(self):
+        store = self.make_store()
+        store.put("token", {"oauth_token_secret": "secret"})
+        self.assertEqual(store.get("token"), {"oauth_token_secret": "secret"})
+        self.assertEqual(store.pop("token"), {"oauth_token_secret": "secret"})
+        self.assertIsNone(store.pop("token"))
+        self.assertIsNone(store.get("token"))
+        self.assertIsNone(store.pop("unknown"))
+
+    def test_states_expire(self):
+        if not self.fine_ttl:
+            self.skipTest("expiries are whole seconds")
+        store = self.make_store(ttl=0.05)
+        store.put("token", {"n": 1})
+        store.put("longer", {"n": 2}, ttl=60)
+        time.sleep(0.06)
+        self.assertIsNone(store.get("token"))
+        self.assertIsNone(store.pop("token"))
+        self.assertEqual(store.pop("longer"), {"n": 2})
+
+    def test_put_again_replaces(self):
+        store = self.make_store(ttl=0.05)
+        store.put("token", {"n": 1})
+        store.put("token", {"n": 2}, ttl=60)
+        time.sleep(0.06)
+        self.assertEqual(store.get("token"), {"n": 2})
+
+
+class MemoryFlowStoreTest(FlowStoreTests, unittest.TestCase):
+
+    def make_store(self, ttl=60):
+        return MemoryFlowStore(ttl)
+
+    def test_expired_states_are_purged(self):
+        store = self.make_store(ttl=0.05)
+        for n in range(10):
+            store.put("token%d" % n, {"n": n})
+        time.sleep(0.06)
+        store.put("fresh", {})
+        self.assertEqual(len(store), 1)
+
+
+class SQLiteFlowStoreTest(FlowStoreTests, ProviderTestCase):
+
+    def make_store(self, ttl=60):
+        return SQLiteFlowStore(os.path.join(self.directory, "flows.db"), ttl)
+
+    def test_shared_by_two_stores(self):
+        self.make_store().put("token", {"n": 1})
+        self.assertEqual(self.make_store().pop("token"), {"n": 1})
+
+
+class RedisFlowStoreTest(FlowStoreTests, unittest.TestCase):
+    fine_ttl = False
+
+    def make_store(self, ttl=60):
+        return RedisFlowStore(FakeRedis(), ttl)
+
+    def test_put_again_replaces(self):
+        store = self.make_store()
+        store.put("token", {"n": 1})
+        store.put("token", {"n": 2})
+        self.assertEqual(store.get("token"), {"n": 2})
+
+
+class ResumeFlowTest(ProviderTestCase):
+
+    def test_callback_resumes_the_flow_once(self):
+        store = MemoryFlowStore()
+        flow = self.make_importer("yahoo", flow_store=store).start_flow()
+        # the callback, handled by another importer sharing the store
+        importer = self.make_importer("yahoo", flow_store=store)
+        resumed = importer.resume_flow(flow.oauth_token, "fakeverifier")
+        self.assertEqual(resumed.oauth_token_secret, flow.oauth_token_secret)
+        self.assertEqual(resumed.oauth_verifier, "fakeverifier")
+        importer.get_token(resumed)
+        self.assertEqual(len(importer.import_contacts(resumed)), 20)
+
+        self.assertRaises(FlowNotFound, importer.resume_flow, flow.oauth_token, "fakeverifier")
+
+    def test_resume_needs_a_flow_store(self):
+        self.assertRaises(ValueError, self.make_importer("yahoo").resume_flow, "token", "fakeverifier")
+
+
+if __name__ == "__main__":
+    unittest.main()
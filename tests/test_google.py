@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+""" Extraction of Google Atom entries """
+import unittest
+
+from contact_importer.providers import GoogleContactImporter
+
+FEED = """<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns='http://www.w3.org/2005/Atom' xmlns:gd='http://schemas.google.com/g/2005'
+      xmlns:openSearch='http://a9.com/-/spec/opensearch/1.1/'>
+  <openSearch:totalResults>2</openSearch:totalResults>
+  <gd:email address='feed@example.com'/>
+  <entry>
+    <gd:name><gd:fullName>Jane Doe</gd:fullName><gd:givenName>Jane</gd:givenName>
+      <gd:familyName>Doe</gd:familyName></gd:name>
+    <gd:email address='jane@example.org'/>
+    <gd:email address='jane@example.com' primary='true'/>
+    <gd:email address='jane@example.net'/>
+    <gd:phoneNumber>+1 555 0100</gd:phoneNumber>
+    <gd:phoneNumber>+1 555 0199</gd:phoneNumber>
+    <link rel='http://schemas.google.com/contacts/2008/rel#photo' href='http://photos/1' gd:etag='"e1"'/>
+  </entry>
+  <entry>
+    <gd:name><gd:fullName>Bob <b>the</b> Builder</gd:fullName></gd:name>
+    <gd:email address='bob@example.com'/>
+    <link rel='http://schemas.google.com/contacts/2008/rel#photo' href='http://photos/2'/>
+    <link rel='self' href='http://self/2' gd:etag='"s2"'/>
+  </entry>
+</feed>"""
+
+
+class ExtractContactsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.importer = GoogleContactImporter("id", "secret", "http://localhost/cb")
+
+    def test_all_fields(self):
+        jane, bob = self.importer.parse_contacts(FEED)
+        self.assertEqual(jane, {
+            "full_name": "Jane Doe",
+            "first_name": "Jane",
+            "last_name": "Doe",
+            "email": "jane@example.com",
+            "phone": "+1 555 0100",
+            "photo": "http://photos/1",
+            "photo_etag": '"e1"',
+        })
+        # no etag on the photo link, no photo
+        self.assertEqual(bob, {"full_name": "Bob the Builder", "email": "bob@example.com"})
+
+    def test_selected_fields(self):
+        contacts = self.importer.parse_contacts(FEED, fields=["email", "last_name"])
+        self.assertEqual(contacts, [{"email": "jane@example.com", "last_name": "Doe"},
+                                    {"email": "bob@example.com"}])
+
+    def test_feed_given_in_chunks(self):
+        chunks = [FEED[i:i + 7] for i in range(0, len(FEED), 7)]
+        self.assertEqual(self.importer.parse_contacts(chunks), self.importer.parse_contacts(FEED))
+
+
+if __name__ == "__main__":
+    unittest.main()
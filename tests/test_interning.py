@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+""" Sharing the values repeated across the contacts of an import """
+import datetime
+import unittest
+
+from contact_importer.interning import InternPool
+
+from tests import ProviderTestCase
+
+
+class InternPoolTest(unittest.TestCase):
+
+    def test_equal_values_are_shared(self):
+        pool = InternPool(("company", "birthday"))
+        first = pool.contact({"company": u"".join([u"Ac", u"me"]), "birthday": datetime.date(1984, 2, 29),
+                              "email": "@".join(["jane", "example.com"])})
+        second = pool.contact({"company": u"".join([u"Acm", u"e"]), "birthday": datetime.date(1984, 2, 29),
+                               "email": "@".join(["jane", "example.com"]), "title": None})
+        self.assertIs(second["company"], first["company"])
+        self.assertIs(second["birthday"], first["birthday"])
+        self.assertIsNot(second["email"], first["email"])
+        self.assertIsNone(second["title"])
+        self.assertEqual(len(pool), 2)
+
+    def test_pool_is_bounded(self):
+        pool = InternPool(("company",), max_values=2)
+        pool.contacts([{"company": u"company %d" % n} for n in range(5)])
+        self.assertEqual(len(pool), 2)
+        value = u"".join([u"company ", u"4"])
+        self.assertIs(pool(value), value)
+        kept = u"".join([u"company ", u"0"])
+        self.assertIsNot(pool(kept), kept)
+
+
+class ImportInterningTest(ProviderTestCase):
+    contacts = 100
+
+    def test_imports_share_values(self):
+        importer = self.make_importer("live")
+        contacts = importer.import_contacts(importer.request_access_token("code"))
+        names = dict((id(contact["first_name"]), contact["first_name"]) for contact in contacts)
+        # ten distinct first names in the stand-in feed
+        self.assertEqual(len(names), 10)
+
+    def test_interning_can_be_turned_off(self):
+        importer = self.make_importer("live", interning=False)
+        self.assertIsNone(importer._intern_pool())
+        contacts = importer.import_contacts(importer.request_access_token("code"))
+        self.assertGreater(len(set(id(contact["first_name"]) for contact in contacts)), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
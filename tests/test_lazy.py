@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+""" Lazy import of the provider modules """
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADED = """
+import sys
+import contact_importer.providers as providers
+loaded = lambda: sorted(name for name in %r if name in sys.modules)
+print(" ".join(loaded()) or "-")
+providers.GoogleContactImporter
+print(" ".join(loaded()) or "-")
+"""
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def modules_loaded(self, *modules):
+        """ Modules of `modules` loaded after importing the package, then after the Google importer """
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.check_output([sys.executable, "-c", LOADED % (modules,)], env=env)
+        return [line.split() for line in output.splitlines()]
+
+    def test_providers_are_imported_on_first_access(self):
+        before, after = self.modules_loaded("contact_importer.providers.google", "contact_importer.providers.live",
+                                            "contact_importer.providers.yahoo", "lxml", "requests")
+        self.assertEqual(before, ["-"])
+        self.assertIn("contact_importer.providers.google", after)
+        self.assertNotIn("contact_importer.providers.live", after)
+        self.assertNotIn("contact_importer.providers.yahoo", after)
+        self.assertNotIn("requests", after)
+
+    def test_unknown_name(self):
+        import contact_importer.providers as providers
+
+        self.assertIn("YahooFlow", dir(providers))
+        with self.assertRaises(AttributeError):
+            providers.AolContactImporter
+
+
+if __name__ == "__main__":
+    unittest.main()
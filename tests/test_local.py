@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" Importing vCard and CSV address book exports """
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from contact_importer.providers import FileContactImporter
+
+VCARDS = (
+    "\xef\xbb\xbfBEGIN:VCARD\r\n"
+    "VERSION:3.0\r\n"
+    "FN:Jane Doe\r\n"
+    "N:Doe;Jane;;;\r\n"
+    "EMAIL;TYPE=HOME:jane@home.example.com\r\n"
+    "item1.EMAIL;TYPE=INTERNET,PREF:jane@example.com\r\n"
+    "TEL;TYPE=CELL:+1 555 0100\r\n"
+    "ORG:Acme\\, Inc.;Research\r\n"
+    "NOTE:First line\\nsecond line and a very long one, folded\r\n"
+    "  over two lines\r\n"
+    "BDAY:1984-02-29\r\n"
+    "END:VCARD\r\n"
+    "BEGIN:VCARD\r\n"
+    "VERSION:2.1\r\n"
+    "N;CHARSET=ISO-8859-1;ENCODING=QUOTED-PRINTABLE:M=FCller;J=FCrgen\r\n"
+    "TITLE;ENCODING=QUOTED-PRINTABLE:Head of =\r\n"
+    "Sales\r\n"
+    "BDAY:not a date\r\n"
+    "END:VCARD\r\n"
+)
+
+GOOGLE_CSV = (
+    "Name,Given Name,Family Name,Birthday,E-mail 1 - Value,Phone 1 - Value,Organization 1 - Name\r\n"
+    "Jane Doe,Jane,Doe,1984-02-29,jane@example.com,+1 555 0100,Acme\r\n"
+    "Bob,Bob,,,bob@example.com,,\r\n"
+    ",,,,,,\r\n"
+)
+
+OUTLOOK_CSV = (
+    "First Name,Last Name,E-mail Address,Mobile Phone,Business Phone,Birthday\r\n"
+    "J\xc3\xbcrgen,M\xc3\xbcller,juergen@example.de,,+49 30 1234,03/01/1970\r\n"
+)
+
+
+class FileContactImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.importer = FileContactImporter()
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as export:
+            export.write(data)
+        return path
+
+    def test_vcards(self):
+        jane, juergen = self.importer.import_contacts(self.write("contacts.vcf", VCARDS))
+        self.assertEqual(jane, {
+            "full_name": u"Jane Doe",
+            "first_name": u"Jane",
+            "last_name": u"Doe",
+            "email": u"jane@example.com",
+            "phone": u"+1 555 0100",
+            "company": u"Acme, Inc.",
+            "notes": u"First line\nsecond line and a very long one, folded over two lines",
+            "birthday": datetime.datetime(1984, 2, 29),
+        })
+        self.assertEqual(juergen, {"first_name": u"J\xfcrgen", "last_name": u"M\xfcller", "title": u"Head of Sales"})
+
+    def test_vcard_fields(self):
+        contacts = self.importer.import_contacts(self.write("contacts.vcf", VCARDS), fields=["email", "last_name"])
+        self.assertEqual(contacts, [{"email": u"jane@example.com", "last_name": u"Doe"}, {"last_name": u"M\xfcller"}])
+
+    def test_google_csv(self):
+        jane, bob = self.importer.import_contacts(self.write("google.csv", GOOGLE_CSV))
+        self.assertEqual(jane, {"full_name": u"Jane Doe", "first_name": u"Jane", "last_name": u"Doe",
+                                "birthday": datetime.datetime(1984, 2, 29), "email": u"jane@example.com",
+                                "phone": u"+1 555 0100", "company": u"Acme"})
+        self.assertEqual(bob, {"full_name": u"Bob", "first_name": u"Bob", "email": u"bob@example.com"})
+
+    def test_outlook_csv(self):
+        contacts = self.importer.import_contacts(self.write("outlook.csv", OUTLOOK_CSV))
+        self.assertEqual(contacts, [{"first_name": u"J\xfcrgen", "last_name": u"M\xfcller",
+                                     "email": u"juergen@example.de", "phone": u"+49 30 1234",
+                                     "birthday": datetime.datetime(1970, 3, 1)}])
+
+    def test_sink_and_parse_contacts(self):
+        batches = []
+        result = self.importer.import_contacts(self.write("export", VCARDS), sink=batches.append, batch_size=1)
+        self.assertEqual(result.written, 2)
+        self.assertEqual(batches, [[contact] for contact in self.importer.parse_contacts(VCARDS)])
+
+    def test_empty_file(self):
+        self.assertEqual(self.importer.import_contacts(self.write("empty.csv", "")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
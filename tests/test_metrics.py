@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+""" Timings and counters reported by the importers """
+import unittest
+
+from contact_importer.fakeserver import FakeProviderServer
+from contact_importer.metrics import CallbackMetrics, MetricsCollector
+
+from tests import ProviderTestCase
+
+
+class MetricsTest(ProviderTestCase):
+    contacts = 50
+
+    def test_import_reports_every_phase(self):
+        metrics = MetricsCollector()
+        importer = self.make_importer("google", metrics=metrics)
+        importer.import_contacts(importer.request_access_token("code"))
+
+        summary = metrics.summary()["google"]
+        self.assertEqual(summary["token"]["count"], 1)
+        pages = summary["fetch"]["count"]
+        for phase in ("fetch_body", "decode", "parse"):
+            self.assertEqual(summary[phase]["count"], pages, phase)
+        self.assertEqual(summary["contacts"], 50)
+        self.assertGreater(summary["fetch_bytes_decoded"], summary["fetch_bytes"])
+
+        metrics.reset()
+        self.assertEqual(metrics.summary(), {})
+
+    def test_retries_are_counted(self):
+        server = FakeProviderServer(contacts=10, error_rate=1.0).start()
+        self.addCleanup(server.stop)
+        metrics = MetricsCollector()
+        importer = self.make_importer("google", metrics=metrics, retries=2)
+        importer.token_url = server.endpoints("google")["token_url"]
+        with self.assertRaises(ValueError):
+            importer.request_access_token("code")
+        self.assertEqual(metrics.counters[("google", "retries")], 2)
+        self.assertEqual(len(metrics.timings[("google", "token")]), 3)
+
+    def test_callback_names(self):
+        calls = []
+        metrics = CallbackMetrics(lambda name, value: calls.append((name, value)),
+                                  lambda name, seconds: calls.append((name, "timing")))
+        metrics.incr("live", "contacts", 3)
+        with metrics.timer("live", "fetch"):
+            pass
+        self.assertEqual(calls, [("contact_importer.live.contacts", 3), ("contact_importer.live.fetch", "timing")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+""" Downloading contact photos """
+import os
+import shutil
+import tempfile
+import unittest
+
+from contact_importer.fakeserver import fake_photo
+from contact_importer.photos import PhotoCache, PhotoFetcher
+from contact_importer.providers import GoogleContactImporter
+from contact_importer.scheduler import BATCH, INTERACTIVE, current_priority, priority
+
+from tests import ProviderTestCase
+
+
+class RecordingImporter(GoogleContactImporter):
+    """ Records the priority every request is made with """
+
+    def _request(self, method, url, phase, deadline=None, **kwargs):
+        if phase == "photo":
+            self.priorities.append(current_priority())
+        return super(RecordingImporter, self)._request(method, url, phase, deadline, **kwargs)
+
+
+class PhotoFetcherTest(ProviderTestCase):
+    contacts = 30
+    provider = "google"
+    importer_class = RecordingImporter
+
+    def setUp(self):
+        super(PhotoFetcherTest, self).setUp()
+        self.importer.priorities = []
+        self.fetcher = PhotoFetcher(self.importer, PhotoCache(self.directory))
+
+    def test_downloads_keep_the_priority_of_the_caller(self):
+        contacts = self.importer.import_contacts(self.access_token, fields=["email", "photo"])
+        with priority(BATCH):
+            counts = self.fetcher.fetch(contacts, self.access_token)
+        self.assertEqual(counts["fetched"], 20)
+        self.assertEqual(set(self.importer.priorities), set([BATCH]))
+
+        self.importer.priorities = []
+        for contact in contacts:
+            contact.pop("photo_etag", None)
+        self.fetcher.fetch(contacts, self.access_token)
+        self.assertEqual(set(self.importer.priorities), set([INTERACTIVE]))
+
+    def test_unchanged_photos_are_not_downloaded_again(self):
+        contacts = self.importer.import_contacts(self.access_token, fields=["email", "photo"])
+        self.assertEqual(self.fetcher.fetch(contacts, self.access_token), {"fetched": 20, "unchanged": 0, "failed": 0})
+        path = self.fetcher.cache.path(contacts[0]["photo_digest"])
+        with open(path, "rb") as photo:
+            self.assertEqual(photo.read(), fake_photo("00000000"))
+
+        # the etag of the feed matches: no request at all
+        self.importer.priorities = []
+        self.assertEqual(self.fetcher.fetch(contacts, self.access_token)["unchanged"], 20)
+        self.assertEqual(self.importer.priorities, [])
+
+        # no etag in the feed: conditional requests answered with 304
+        for contact in contacts:
+            contact.pop("photo_etag", None)
+        self.assertEqual(self.fetcher.fetch(contacts, self.access_token)["unchanged"], 20)
+        self.assertEqual(len(self.importer.priorities), 20)
+
+    def test_stage_fetches_every_batch(self):
+        batches = []
+        result = self.importer.import_contacts(self.access_token, fields=["email", "photo"], batch_size=10,
+                                               sink=self.fetcher.stage(batches.append, self.access_token))
+        self.assertEqual(result.written, 30)
+        self.assertEqual(sum(1 for batch in batches for contact in batch if "photo_digest" in contact), 20)
+
+
+class PhotoCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_equal_photos_are_stored_once(self):
+        cache = PhotoCache(self.directory)
+        digest, added = cache.store("http://photos/1", '"1"', "photo")
+        self.assertEqual(cache.store("http://photos/2", None, "photo"), (digest, False))
+        self.assertTrue(added)
+        self.assertEqual(cache.size(), 5)
+        self.assertEqual(cache.lookup("http://photos/2"), (None, digest))
+        self.assertIsNone(cache.lookup("http://photos/3"))
+
+    def test_least_recently_used_photos_are_evicted(self):
+        cache = PhotoCache(self.directory, max_size=300)
+        old, _ = cache.store("http://photos/old", None, "o" * 100)
+        used, _ = cache.store("http://photos/used", None, "u" * 100)
+        cache.store("http://photos/new", None, "n" * 100)
+        cache.touch("http://photos/old", None, old)
+        cache.store("http://photos/newer", None, "m" * 100)
+
+        self.assertLessEqual(cache.size(), 270)
+        self.assertIsNone(cache.lookup("http://photos/used"))
+        self.assertFalse(os.path.exists(cache.path(used)))
+        self.assertEqual(cache.lookup("http://photos/old"), (None, old))
+        # a new cache on the same directory sees the same photos
+        self.assertEqual(PhotoCache(self.directory).size(), cache.size())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+""" Profiling single import runs """
+import json
+import os
+import unittest
+
+from contact_importer.profiling import ImportProfiler, anonymize_text
+
+from tests import ProviderTestCase
+
+
+class ImportProfilerTest(ProviderTestCase):
+    contacts = 20
+
+    def check_shape_parses(self, provider):
+        importer = self.make_importer(provider)
+        path = os.path.join(self.directory, provider)
+        contacts = ImportProfiler(path, top=5).run(importer, "import_contacts", importer.request_access_token("code"))
+        self.assertIsNone(importer.profiler)
+        self.assertTrue(os.path.exists(path + ".prof"))
+        with open(path + ".json") as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["provider"], provider)
+        shape = report["responses"][0]["shape"]
+        for contact in contacts:
+            self.assertNotIn(contact["email"], shape)
+
+        parsed = importer.parse_contacts(shape)
+        self.assertEqual(len(parsed), len(contacts))
+        self.assertEqual(sorted(parsed[0]), sorted(contacts[0]))
+
+    def test_google_shape_parses(self):
+        self.check_shape_parses("google")
+
+    def test_live_shape_parses(self):
+        self.check_shape_parses("live")
+
+    def test_anonymized_dates_stay_valid(self):
+        self.assertEqual(anonymize_text(u"Jane, born 1984-02-29"), u"xxxx, xxxx 1970-01-01")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+""" Registry of importers and their entry points """
+import unittest
+
+import pkg_resources
+
+from contact_importer.providers.base import BaseProvider
+from contact_importer.providers.registry import ProviderRegistry
+
+
+class CardDAVContactImporter(BaseProvider):
+    name = "carddav"
+
+
+class OtherImporter(BaseProvider):
+    name = "other"
+
+
+class FakeEntryPoint(object):
+
+    def __init__(self, name, importer):
+        self.name = name
+        self.importer = importer
+
+    def load(self):
+        return self.importer
+
+
+class ProviderRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.iter_entry_points = pkg_resources.iter_entry_points
+        self.entry_points = []
+        pkg_resources.iter_entry_points = lambda group: iter(self.entry_points)
+
+    def tearDown(self):
+        pkg_resources.iter_entry_points = self.iter_entry_points
+
+    def test_bundled_providers(self):
+        registry = ProviderRegistry(entry_points=False)
+        self.assertEqual(registry.names(), ["file", "google", "live", "yahoo"])
+        self.assertEqual(registry.get_class("google").__name__, "GoogleContactImporter")
+        with self.assertRaises(KeyError):
+            registry.get_class("aol")
+
+    def test_importers_are_cached_per_configuration(self):
+        registry = ProviderRegistry(entry_points=False)
+        registry.register("carddav", CardDAVContactImporter)
+        importer = registry.get("carddav", "id", "secret", "http://localhost/cb")
+        self.assertIsInstance(importer, CardDAVContactImporter)
+        self.assertIs(registry.get("carddav", "id", "secret", "http://localhost/cb"), importer)
+        self.assertIsNot(registry.get("carddav", "id", "other", "http://localhost/cb"), importer)
+        # unhashable configuration is not cached
+        self.assertIsNot(registry.get("carddav", "id", "secret", "http://localhost/cb", retries=[1]),
+                         registry.get("carddav", "id", "secret", "http://localhost/cb", retries=[1]))
+
+        registry.register("carddav", OtherImporter)
+        self.assertIsInstance(registry.get("carddav", "id", "secret", "http://localhost/cb"), OtherImporter)
+
+    def test_entry_points(self):
+        self.entry_points = [FakeEntryPoint("carddav", CardDAVContactImporter),
+                             FakeEntryPoint("other", CardDAVContactImporter)]
+        registry = ProviderRegistry()
+        registry.register("other", OtherImporter)
+        self.assertIn("carddav", registry.names())
+        self.assertIs(registry.get_class("carddav"), CardDAVContactImporter)
+        # explicit registrations win over entry points
+        self.assertIs(registry.get_class("other"), OtherImporter)
+
+
+if __name__ == "__main__":
+    unittest.main()
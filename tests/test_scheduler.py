@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+""" Scheduling of interactive and batch requests """
+import threading
+import time
+import unittest
+
+from contact_importer.scheduler import BATCH, INTERACTIVE, ImportScheduler, SchedulerFull, current_priority, priority
+
+from tests import ProviderTestCase
+
+
+class ImportSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.order = []
+        self.threads = []
+
+    def queue(self, scheduler, client_id, level, name):
+        """ Start a request of `client_id` in a new thread, returning once it is queued """
+        queued = sum(scheduler.queued("google"))
+
+        def run():
+            with scheduler.slot("google", client_id, level):
+                self.order.append(name)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        while sum(scheduler.queued("google")) == queued:
+            time.sleep(0.001)
+
+    def run_queued(self, scheduler, level):
+        scheduler.release("google", level)
+        for thread in self.threads:
+            thread.join()
+
+    def test_interactive_requests_go_first(self):
+        scheduler = ImportScheduler(concurrency=1)
+        scheduler.acquire("google", "app", BATCH)
+        self.queue(scheduler, "app", BATCH, "batch 1")
+        self.queue(scheduler, "app", BATCH, "batch 2")
+        self.queue(scheduler, "app", INTERACTIVE, "interactive 1")
+        self.queue(scheduler, "app", INTERACTIVE, "interactive 2")
+        self.assertEqual(scheduler.queued("google"), [2, 2])
+        self.run_queued(scheduler, BATCH)
+        self.assertEqual(self.order, ["interactive 1", "interactive 2", "batch 1", "batch 2"])
+
+    def test_weighted_fair_queuing(self):
+        scheduler = ImportScheduler(concurrency=1, weights={"big": 2})
+        scheduler.acquire("google", "big", INTERACTIVE)
+        for _ in range(6):
+            self.queue(scheduler, "big", INTERACTIVE, "big")
+        for _ in range(6):
+            self.queue(scheduler, "small", INTERACTIVE, "small")
+        self.run_queued(scheduler, INTERACTIVE)
+        # queued last, "small" still gets every third turn
+        self.assertEqual(self.order[:6].count("small"), 2)
+        self.assertEqual(self.order[:9].count("small"), 3)
+
+    def test_batch_requests_leave_capacity_to_interactive_ones(self):
+        scheduler = ImportScheduler(concurrency=2, batch_concurrency=1, timeout=0.01)
+        scheduler.acquire("google", "app", BATCH)
+        self.assertRaises(SchedulerFull, scheduler.acquire, "google", "app", BATCH)
+        self.assertEqual(scheduler.acquire("google", "app", INTERACTIVE), INTERACTIVE)
+        self.assertEqual(scheduler.queued("google"), [0, 0])
+
+    def test_full_queue_rejects(self):
+        scheduler = ImportScheduler(concurrency=1, max_queued=1)
+        scheduler.acquire("google", "app", INTERACTIVE)
+        self.queue(scheduler, "app", INTERACTIVE, "queued")
+        self.assertRaises(SchedulerFull, scheduler.acquire, "google", "app", INTERACTIVE)
+        self.run_queued(scheduler, INTERACTIVE)
+        self.assertEqual(self.order, ["queued"])
+
+    def test_priority_context(self):
+        self.assertEqual(current_priority(), INTERACTIVE)
+        with priority(BATCH):
+            self.assertEqual(current_priority(), BATCH)
+        self.assertEqual(current_priority(), INTERACTIVE)
+
+
+class ScheduledImportTest(ProviderTestCase):
+    contacts = 60
+
+    def test_import_through_the_scheduler(self):
+        scheduler = ImportScheduler(concurrency=1)
+        importer = self.make_importer("google", scheduler=scheduler)
+        access_token = importer.request_access_token("code")
+        with priority(BATCH):
+            contacts = importer.import_contacts(access_token)
+        self.assertEqual(len(contacts), 60)
+        # every slot, streamed feeds included, was given back
+        scheduler.acquire("google", "id", BATCH, timeout=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
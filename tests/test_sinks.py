@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+""" Sinks receiving imported contacts """
+import threading
+import unittest
+
+from contact_importer.sinks import ThreadedSink
+
+from tests import ProviderTestCase
+
+
+class RecordingSink(object):
+    """ Sink object recording every call made to it """
+
+    def __init__(self):
+        self.calls = []
+
+    def write(self, batch):
+        self.calls.append(("write", len(batch)))
+
+    def flush(self):
+        self.calls.append(("flush",))
+
+
+class BatchTest(ProviderTestCase):
+    contacts = 60
+    provider = "google"
+
+    def test_contacts_are_written_in_batches(self):
+        sink = RecordingSink()
+        result = self.importer.import_contacts(self.access_token, sink=sink, batch_size=25)
+        self.assertEqual(list(result), [])
+        self.assertEqual(result.written, 60)
+        self.assertEqual(sink.calls, [("write", 25), ("write", 25), ("write", 10), ("flush",)])
+
+
+class ThreadedSinkTest(ProviderTestCase):
+    contacts = 60
+    provider = "google"
+
+    def sink_threads(self):
+        return [thread for thread in threading.enumerate() if thread.name == "contact-sink"]
+
+    def test_slow_sink_holds_the_import_back(self):
+        release = threading.Event()
+        written = []
+
+        def write(batch):
+            release.wait()
+            written.append(len(batch))
+
+        sink = ThreadedSink(write, max_pending=1)
+        sink.write([1])
+        sink.write([2])
+        # the thread holds one batch and the queue another, the next write blocks
+        blocked = threading.Thread(target=sink.write, args=([3],))
+        blocked.start()
+        blocked.join(0.05)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join()
+        sink.close()
+        self.assertEqual(written, [1, 1, 1])
+
+    def test_import_stops_the_sink_thread(self):
+        contacts = []
+        for _ in range(5):
+            result = self.importer.import_contacts(self.access_token, sink=ThreadedSink(contacts.extend),
+                                                   batch_size=20)
+            self.assertEqual(result.written, 60)
+        self.assertEqual(len(contacts), 300)
+        self.assertEqual(self.sink_threads(), [])
+
+    def test_failed_import_stops_the_sink_thread(self):
+        def fail(batch):
+            raise IOError("sink unavailable")
+
+        with self.assertRaises(IOError):
+            self.importer.import_contacts(self.access_token, sink=ThreadedSink(fail), batch_size=20)
+        self.assertEqual(self.sink_threads(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
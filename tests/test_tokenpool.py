@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+""" Pool of pre-fetched request tokens """
+import itertools
+import threading
+import time
+import unittest
+
+from contact_importer.flowstore import MemoryFlowStore
+from contact_importer.metrics import MetricsCollector
+from contact_importer.tokenpool import RequestTokenPool
+
+from tests import ProviderTestCase
+
+
+def wait_for(condition, timeout=2.0):
+    """ Poll `condition` until it holds, False when it did not in time """
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class RequestTokenPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with self.lock:
+            return next(self.counter)
+
+    def start(self, pool):
+        self.addCleanup(pool.stop)
+        return pool.start()
+
+    def test_pool_is_kept_full(self):
+        pool = self.start(RequestTokenPool(self.fetch, size=3))
+        self.assertTrue(wait_for(lambda: len(pool) == 3))
+        self.assertEqual([pool.take() for _ in range(3)], [0, 1, 2])
+        self.assertTrue(wait_for(lambda: len(pool) == 3))
+        self.assertEqual(pool.take(), 3)
+
+    def test_empty_pool(self):
+        self.assertIsNone(RequestTokenPool(self.fetch).take())
+
+    def test_old_tokens_are_dropped(self):
+        pool = self.start(RequestTokenPool(self.fetch, size=2, max_age=0.05))
+        self.assertTrue(wait_for(lambda: len(pool) == 2))
+        time.sleep(0.06)
+        self.assertGreaterEqual(pool.take(), 2)
+
+    def test_fetch_errors_are_retried(self):
+        attempts = []
+
+        def fetch():
+            attempts.append(time.time())
+            if len(attempts) < 3:
+                raise IOError("provider down")
+            return "token"
+
+        pool = self.start(RequestTokenPool(fetch, size=1, retry_interval=0.01))
+        self.assertTrue(wait_for(lambda: len(pool) == 1))
+        self.assertEqual(pool.take(), "token")
+        # the interval doubles after every consecutive error
+        self.assertGreaterEqual(attempts[2] - attempts[1], 0.02)
+
+    def test_stop_ends_the_thread(self):
+        pool = RequestTokenPool(self.fetch, size=1).start()
+        pool.stop()
+        self.assertNotIn("request-token-pool", [thread.name for thread in threading.enumerate()])
+
+
+class PrewarmTest(ProviderTestCase):
+
+    def test_start_flow_takes_pooled_tokens(self):
+        metrics = MetricsCollector()
+        importer = self.make_importer("yahoo", metrics=metrics)
+        pool = importer.prewarm(size=2)
+        self.addCleanup(pool.stop)
+        self.assertTrue(wait_for(lambda: len(pool) == 2))
+
+        flow = importer.start_flow()
+        flow.oauth_verifier = "fakeverifier"
+        importer.get_token(flow)
+        self.assertEqual(len(importer.import_contacts(flow)), 20)
+        self.assertEqual(metrics.counters[("yahoo", "token_pool_hits")], 1)
+        self.assertNotIn(("yahoo", "token_pool_misses"), metrics.counters)
+
+    def test_stored_flows_expire_with_their_token(self):
+        store = MemoryFlowStore(ttl=0.1)
+        importer = self.make_importer("yahoo", flow_store=store)
+        pool = importer.prewarm(size=1)
+        self.addCleanup(pool.stop)
+        self.assertTrue(wait_for(lambda: len(pool) == 1))
+        time.sleep(0.06)
+
+        flow = importer.start_flow()
+        self.assertIsNotNone(store.get(flow.oauth_token))
+        # stored when its token was 60ms old, it has 40ms left
+        time.sleep(0.05)
+        self.assertIsNone(store.get(flow.oauth_token))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+""" Yahoo authorizations kept in YahooFlow values """
+import threading
+import unittest
+
+from contact_importer.providers import YahooFlow
+
+from tests import ProviderTestCase
+
+
+class YahooFlowTest(ProviderTestCase):
+    contacts = 30
+
+    def setUp(self):
+        super(YahooFlowTest, self).setUp()
+        self.importer = self.make_importer("yahoo")
+
+    def authorize(self, flow):
+        flow.oauth_verifier = "fakeverifier"
+        return self.importer.get_token(flow)
+
+    def test_flows_do_not_share_state(self):
+        first = self.importer.start_flow()
+        second = self.importer.start_flow()
+        self.assertNotEqual(first.oauth_token, second.oauth_token)
+        self.assertIn("oauth_token=%s" % first.oauth_token, self.importer.request_authorization(first))
+
+        self.authorize(second)
+        self.assertEqual(second.oauth_yahoo_guid, "FAKEYAHOOGUID")
+        self.assertIsNone(first.oauth_yahoo_guid)
+        self.assertFalse(hasattr(self.importer, "oauth_token"))
+
+    def test_flow_round_trips_through_a_dict(self):
+        flow = self.authorize(self.importer.start_flow())
+        copy = YahooFlow.from_dict(flow.to_dict())
+        self.assertEqual(copy.to_dict(), flow.to_dict())
+        self.assertEqual(len(self.importer.import_contacts(copy)), 30)
+
+    def test_concurrent_flows_on_one_importer(self):
+        results = []
+
+        def run():
+            flow = self.authorize(self.importer.start_flow())
+            results.append(len(self.importer.import_contacts(flow)))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [30] * 8)
+
+    def test_state_on_the_importer(self):
+        self.importer.get_request_token()
+        self.importer.oauth_verifier = "fakeverifier"
+        self.importer.get_token()
+        self.assertEqual(len(self.importer.import_contacts()), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()